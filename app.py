@@ -104,12 +104,8 @@ if __name__ == "__main__":
 import sys
 import os
 from datetime import datetime
-import json
 import argparse
-# Importando a nova janela
-from ui.main_window import App 
-from core.automation import executar_envio, contador_execucao
-from core.db import db
+import multiprocessing
 
 if getattr(sys, 'frozen', False):
     BASE_DIR = os.path.dirname(sys.executable)
@@ -122,55 +118,69 @@ def ensure_profile_dir():
     os.makedirs(PROFILE_DIR, exist_ok=True)
 
 def run_gui():
+    # Importado aqui para o modo --servico rodar em máquinas sem interface gráfica
+    from ui.main_window import App
     ensure_profile_dir()
     app = App()
     app.mainloop()
 
 if __name__ == "__main__":
+    # Necessário no .exe para o pool de processos do pré-processamento de mídia
+    multiprocessing.freeze_support()
+
     # Usando argparse para capturar os argumentos de forma limpa
     parser = argparse.ArgumentParser(description="WhatsApp Automation App")
-    parser.add_argument("--auto", help="Caminho do arquivo JSON de configuração")
+    # O caminho depois de --auto (tarefas antigas, que apontavam para task_<id>.json) é ignorado
+    parser.add_argument("--auto", nargs="?", const=True,
+                        help="Executa o agendamento --task_id (os dados vêm do banco)")
     parser.add_argument("--task_id", type=int, help="ID da tarefa no banco de dados")
+    parser.add_argument("--importar", metavar="ARQUIVO",
+                        help="Importa agendamentos de um CSV/JSONL e sai")
+    parser.add_argument("--servico", action="store_true",
+                        help="Roda só o serviço de agendamento (sem interface), disparando os jobs do banco")
+    parser.add_argument("--trabalhador", action="store_true",
+                        help="Roda um processo de envio extra que puxa jobs da mesma fila do serviço")
+    parser.add_argument("--perfil", metavar="PASTA",
+                        help="Perfil do Chrome (conta) usado por --servico/--trabalhador")
+    parser.add_argument("--reconciliar", action="store_true",
+                        help="Acerta as tarefas do Agendador do Windows e os arquivos de scheduled_tasks com o banco e sai")
     
     # Ignora argumentos desconhecidos para não quebrar a GUI
     args, unknown = parser.parse_known_args()
 
     if args.auto:
         task_id = args.task_id
+        if not task_id:
+            print("ERRO: --auto precisa de --task_id.")
+            sys.exit(2)
+        # Reivindica o job (com lease), envia e aplica a política de retentativas numa falha
+        # (volta para 'pending' com proxima_tentativa, que o reconciliador transforma numa nova
+        # tarefa, ou vai para dead-letter); ver core/execucao.py
+        from core.execucao import executar_job
         try:
-            # 1. Carrega os dados do JSON
-            with open(args.auto, "r", encoding="utf-8") as f:
-                dados = json.load(f)
-
-            # 2. Atualiza o status no banco para 'running' (se o task_id existir)
-            if task_id:
-                db.atualizar_status(task_id, 'running')
-
-            # 3. Executa a automação
-            executar_envio(
-                userdir=PROFILE_DIR,
-                target=dados["target"],
-                mode=dados["mode"],
-                message=dados.get("message"),
-                file_path=dados.get("file_path"),
-                modo_execucao='auto'
-            )
-
-            # 4. Sucesso: Atualiza o banco e o contador
-            if task_id:
-                db.atualizar_status(task_id, 'completed')
-                
-            if callable(contador_execucao):
-                contador_execucao(True)
-                
-            sys.exit(0)
-
+            resultado = executar_job(task_id, userdir=PROFILE_DIR, modo_execucao='auto')
         except Exception as e:
-            # 5. Erro: Registra a falha no banco para o usuário ver na UI
             print(f"ERRO CRÍTICO NA EXECUÇÃO AUTO: {e}")
-            if task_id:
-                db.registrar_erro(task_id, str(e))
             sys.exit(1)
+        sys.exit(0 if resultado in ('completed', 'ignorado') else 1)
+    elif args.importar:
+        from core.importacao import importar_agendamentos
+        resultado = importar_agendamentos(args.importar)
+        for linha, erro in resultado.erros:
+            print(f"  linha {linha}: {erro}")
+        # O serviço de agendamento percebe as linhas novas sozinho (PRAGMA data_version)
+        sys.exit(0 if resultado.importados or not resultado.erros else 1)
+    elif args.servico or args.trabalhador:
+        from core.servico_agendador import rodar_em_primeiro_plano
+        ensure_profile_dir()
+        perfil = os.path.abspath(args.perfil) if args.perfil else None
+        sys.exit(rodar_em_primeiro_plano(exclusivo=args.servico, userdir=perfil))
+    elif args.reconciliar:
+        from core.reconciliador import reconciliar
+        resultado = reconciliar()
+        for alvo, erro in resultado.erros:
+            print(f"  {alvo}: {erro}")
+        sys.exit(1 if resultado.erros else 0)
     else:
         # Se não houver flag --auto, abre a interface gráfica normalmente
         run_gui()
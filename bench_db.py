@@ -0,0 +1,133 @@
+"""
+Benchmark do SchedulerDB: operações por segundo com o acesso antigo ao banco
+(uma conexão nova por chamada, journal padrão, cada escrita com o próprio commit)
+e com o atual (conexão por thread, WAL, thread escritora com lotes).
+
+    python bench_db.py [--threads 4] [--ops 300]
+
+Roda num banco temporário; data/scheduler.db não é tocado.
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+import datetime
+from pathlib import Path
+
+import core.db
+from core.db import SchedulerDB
+
+
+class SchedulerDBAntigo(SchedulerDB):
+    """O acesso de antes: conexão avulsa a cada método, rollback journal, escrita na thread que chamou."""
+
+    JOURNAL_MODE = "DELETE"
+
+    def _get_conn(self):
+        return sqlite3.connect(
+            str(self.db_path),
+            timeout=30,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False
+        )
+
+    def _enfileirar(self, funcao):
+        return funcao()
+
+
+def _agora_mais(horas):
+    return datetime.datetime.now() + datetime.timedelta(hours=horas)
+
+
+def cenario_sequencial(db, ops):
+    """Uma thread: cria, muda status e lista, alternadamente."""
+    ids = []
+    for i in range(ops):
+        if i % 3 == 0:
+            ids.append(db.adicionar(task_name=f"seq_{i}", target="5511999999999", mode="text",
+                                    message="bench", scheduled_time=_agora_mais(1)))
+        elif i % 3 == 1:
+            db.atualizar_status(ids[-1], 'running')
+        else:
+            db.obter_por_id(ids[-1])
+    return ops
+
+
+def cenario_concorrente(db, ops, threads):
+    """
+    N workers gravando (status, checkpoints) enquanto uma "GUI" lê a lista e a contagem
+    sem parar, como o poll de 5 s, só que em laço.
+    """
+    ids = [db.adicionar(task_name=f"conc_{i}", target="5511999999999", mode="text",
+                        message="bench", scheduled_time=_agora_mais(2)) for i in range(threads)]
+    parar = threading.Event()
+    leituras = [0]
+
+    def worker(task_id):
+        for i in range(ops):
+            if i % 2 == 0:
+                db.atualizar_status(task_id, 'running')
+            else:
+                db.registrar_checkpoint(task_id, f"etapa_{i}")
+
+    def gui():
+        while not parar.is_set():
+            db.listar_todos()
+            db.contar_por_status()
+            leituras[0] += 2
+
+    leitor = threading.Thread(target=gui)
+    leitor.start()
+    workers = [threading.Thread(target=worker, args=(t,)) for t in ids]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    parar.set()
+    leitor.join()
+    return ops * threads + leituras[0]
+
+
+def medir(classe, caminho, threads, ops):
+    db = classe(Path(caminho))
+    resultados = {}
+    for nome, rodar in (("sequencial", lambda: cenario_sequencial(db, ops)),
+                        ("concorrente", lambda: cenario_concorrente(db, ops, threads))):
+        inicio = time.perf_counter()
+        total = rodar()
+        resultados[nome] = total / (time.perf_counter() - inicio)
+    db.fechar()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do SchedulerDB")
+    parser.add_argument("--threads", type=int, default=4, help="workers gravando no cenário concorrente")
+    parser.add_argument("--ops", type=int, default=300, help="operações por worker")
+    args = parser.parse_args()
+
+    # Silencia os prints de cada operação do SchedulerDB
+    saida = sys.stdout
+    with tempfile.TemporaryDirectory() as pasta:
+        # Os bancos medidos são criados aqui; se algo cair no db global, ele também nasce no temporário
+        core.db.DB_PATH = Path(pasta) / "padrao.db"
+        medidas = {}
+        for rotulo, classe in (("antes", SchedulerDBAntigo), ("depois", SchedulerDB)):
+            sys.stdout = open(os.devnull, "w")
+            try:
+                medidas[rotulo] = medir(classe, os.path.join(pasta, f"{rotulo}.db"), args.threads, args.ops)
+            finally:
+                sys.stdout.close()
+                sys.stdout = saida
+
+    print(f"{'cenário':<14}{'antes (ops/s)':>16}{'depois (ops/s)':>16}{'ganho':>9}")
+    for cenario in ("sequencial", "concorrente"):
+        antes, depois = medidas["antes"][cenario], medidas["depois"][cenario]
+        print(f"{cenario:<14}{antes:>16.0f}{depois:>16.0f}{depois / antes:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
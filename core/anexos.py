@@ -0,0 +1,277 @@
+import os
+import mmap
+import hashlib
+import sys
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# --------------------------
+# Classificação de anexos
+# --------------------------
+# Extensões que o WhatsApp aceita pelo botão "Fotos e vídeos".
+# Qualquer outra coisa precisa ir pelo botão "Documento".
+EXTENSOES_MIDIA = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp',
+    '.mp4', '.3gp', '.mov', '.m4v',
+}
+
+# WhatsApp Web aceita no máximo 30 arquivos por envio (mesmo limite citado nas Instruções)
+LIMITE_ARQUIVOS_POR_ENVIO = 30
+
+# Limites de tamanho do WhatsApp: mídia maior que isso só passa como documento
+TAMANHO_MAXIMO_MIDIA = 16 * 1024 * 1024
+TAMANHO_MAXIMO_DOCUMENTO = 2 * 1024 * 1024 * 1024
+
+
+def normalizar_caminhos(file_path):
+    """
+    Converte o campo file_path (string separada por '\\n' ou lista) em lista de caminhos absolutos.
+    Linhas vazias são descartadas.
+    """
+    if not file_path:
+        return []
+    paths = file_path.split('\n') if isinstance(file_path, str) else file_path
+    return [os.path.abspath(p.strip()) for p in paths if p and p.strip()]
+
+
+def eh_midia(path):
+    """Retorna True se a extensão do arquivo é de Foto/Vídeo."""
+    return os.path.splitext(path.lower())[1] in EXTENSOES_MIDIA
+
+
+def tipo_envio(path):
+    """
+    Decide por qual botão o arquivo vai: 'midia' ou 'documento'.
+    Foto/vídeo acima do limite de mídia do WhatsApp vai como documento.
+    """
+    if not eh_midia(path):
+        return 'documento'
+    try:
+        return 'midia' if os.path.getsize(path) <= TAMANHO_MAXIMO_MIDIA else 'documento'
+    except OSError:
+        return 'midia'
+
+
+# --------------------------
+# Planejador de lotes
+# --------------------------
+def planejar_lotes(file_path, message=None, limite=LIMITE_ARQUIVOS_POR_ENVIO):
+    """
+    Separa os arquivos de um envio em grupos de mídia e documento e divide cada grupo
+    em lotes de até `limite` arquivos. Cada lote vira um único upload no WhatsApp.
+
+    A ordem dos grupos segue a ordem em que o usuário selecionou os arquivos
+    (o grupo do primeiro arquivo vai primeiro). A legenda vai no primeiro lote de mídia,
+    que é onde o WhatsApp mostra a legenda do álbum; sem mídia, vai no primeiro lote de documentos.
+
+    Returns:
+        list[dict]: [{'tipo': 'midia'|'documento', 'arquivos': [...], 'legenda': str|None}, ...]
+    """
+    if limite < 1:
+        raise ValueError("limite deve ser >= 1")
+
+    grupos = {}
+    for p in normalizar_caminhos(file_path):
+        tipo = tipo_envio(p)
+        grupos.setdefault(tipo, []).append(p)
+
+    lotes = []
+    for tipo, arquivos in grupos.items():
+        for i in range(0, len(arquivos), limite):
+            lotes.append({'tipo': tipo, 'arquivos': arquivos[i:i + limite], 'legenda': None})
+
+    if message and lotes:
+        alvo = next((l for l in lotes if l['tipo'] == 'midia'), lotes[0])
+        alvo['legenda'] = message
+
+    return lotes
+
+
+# --------------------------
+# Verificação prévia (preflight)
+# --------------------------
+# Assinaturas (magic bytes) dos formatos de mídia: (offset, bytes)
+ASSINATURAS_MIDIA = {
+    '.jpg': [(0, b'\xff\xd8\xff')],
+    '.jpeg': [(0, b'\xff\xd8\xff')],
+    '.png': [(0, b'\x89PNG\r\n\x1a\n')],
+    '.gif': [(0, b'GIF87a'), (0, b'GIF89a')],
+    '.webp': [(8, b'WEBP')],
+    '.mp4': [(4, b'ftyp')],
+    '.m4v': [(4, b'ftyp')],
+    '.mov': [(4, b'ftyp'), (4, b'moov'), (4, b'wide'), (4, b'mdat')],
+    '.3gp': [(4, b'ftyp')],
+}
+
+# Executáveis e scripts são bloqueados pelo WhatsApp
+EXTENSOES_BLOQUEADAS = {'.exe', '.bat', '.cmd', '.com', '.scr', '.msi', '.vbs', '.js', '.jar'}
+
+
+def _verificar_arquivo(path):
+    """Verifica um anexo. Retorna a mensagem de erro ou None se estiver ok."""
+    nome = os.path.basename(path)
+    ext = os.path.splitext(path.lower())[1]
+
+    if not os.path.exists(path):
+        return f"{nome}: arquivo não encontrado ({path})"
+    if not os.path.isfile(path):
+        return f"{nome}: não é um arquivo"
+    if ext in EXTENSOES_BLOQUEADAS:
+        return f"{nome}: tipo de arquivo não permitido pelo WhatsApp"
+
+    tamanho = os.path.getsize(path)
+    if tamanho == 0:
+        return f"{nome}: arquivo vazio"
+    if tamanho > TAMANHO_MAXIMO_DOCUMENTO:
+        return f"{nome}: {tamanho / 1e9:.1f} GB excede o limite de 2 GB do WhatsApp"
+
+    try:
+        with open(path, 'rb') as f:
+            cabecalho = f.read(16)
+    except OSError as e:
+        return f"{nome}: sem permissão de leitura ({e})"
+
+    assinaturas = ASSINATURAS_MIDIA.get(ext)
+    if assinaturas and not any(cabecalho[o:o + len(b)] == b for o, b in assinaturas):
+        return f"{nome}: conteúdo não corresponde à extensão {ext}"
+    return None
+
+
+def erros_por_arquivo(paths, max_workers=8):
+    """Verifica os caminhos em paralelo. Returns: dict {caminho: erro} só dos que falharam."""
+    paths = list(paths)
+    if not paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(paths))) as pool:
+        erros = pool.map(_verificar_arquivo, paths)
+    return {p: e for p, e in zip(paths, erros) if e}
+
+
+def verificar_anexos(file_path, max_workers=8):
+    """
+    Verifica todos os anexos em paralelo (existência, permissão, tamanho, tipo).
+    Feito no agendamento e de novo antes de abrir o Chrome.
+
+    Returns:
+        list[str]: mensagens de erro (vazia se todos os arquivos estão ok)
+    """
+    paths = normalizar_caminhos(file_path)
+    erros = erros_por_arquivo(paths, max_workers=max_workers)
+    return [erros[p] for p in paths if p in erros]
+
+
+def exigir_anexos_validos(file_path):
+    """Levanta Exception com todos os problemas encontrados, se houver algum."""
+    erros = verificar_anexos(file_path)
+    if erros:
+        raise Exception("Anexos inválidos:\n" + "\n".join(erros))
+    return True
+
+
+# --------------------------
+# Estimativa de vazão de upload
+# --------------------------
+# A vazão é medida do clique em enviar até o ack do WhatsApp (relógio de pendente sumiu):
+# é quando os bytes sobem de fato. O preview é montado localmente, antes do upload,
+# e tem um prazo próprio que não depende da rede.
+# Estimativa inicial conservadora (~8 Mbit/s) até a primeira medição real
+VAZAO_PADRAO = 1_000_000  # bytes/s
+PESO_MEDICAO = 0.3        # peso da última medição na média móvel exponencial
+
+# O prazo de upload é o tempo estimado multiplicado pela margem, dentro destes limites
+PRAZO_MINIMO = 5.0
+PRAZO_MAXIMO = 600.0
+MARGEM_PRAZO = 3.0
+# Ack (texto ou upload) nunca espera menos que isto: link lento não pode virar "falhou"
+PRAZO_MINIMO_ACK = 30.0
+# Leitura dos arquivos e miniaturas pelo navegador (disco local, não rede)
+VAZAO_PREVIEW = 5_000_000  # bytes/s
+
+
+def _arquivo_vazao():
+    if getattr(sys, 'frozen', False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    return os.path.join(base_dir, "data", "upload_stats.json")
+
+
+def tamanho_total(paths):
+    """Soma o tamanho dos arquivos em bytes (arquivos inacessíveis contam como 0)."""
+    total = 0
+    for p in paths:
+        try:
+            total += os.path.getsize(p)
+        except OSError:
+            pass
+    return total
+
+
+def carregar_vazao():
+    """Retorna a vazão de upload estimada (bytes/s) medida nas execuções anteriores."""
+    try:
+        with open(_arquivo_vazao(), 'r', encoding='utf-8') as f:
+            vazao = float(json.load(f).get("bytes_por_segundo", VAZAO_PADRAO))
+        return vazao if vazao > 0 else VAZAO_PADRAO
+    except Exception:
+        return VAZAO_PADRAO
+
+
+def registrar_vazao(total_bytes, segundos):
+    """
+    Atualiza a estimativa com a medição de um upload, do clique em enviar até o ack
+    (média móvel exponencial).
+    Uploads muito pequenos ou instantâneos não dizem nada sobre a banda e são ignorados.
+    """
+    if total_bytes < 64 * 1024 or segundos <= 0:
+        return carregar_vazao()
+
+    medida = total_bytes / segundos
+    vazao = (1 - PESO_MEDICAO) * carregar_vazao() + PESO_MEDICAO * medida
+    try:
+        caminho = _arquivo_vazao()
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump({"bytes_por_segundo": vazao, "atualizado_em": time.strftime("%Y-%m-%d %H:%M:%S")}, f)
+    except Exception as e:
+        print(f"Erro ao gravar estimativa de vazão: {e}")
+    return vazao
+
+
+def prazo_upload(total_bytes, vazao=None):
+    """Tempo máximo (s) do clique em enviar até o WhatsApp confirmar um upload de `total_bytes`."""
+    vazao = vazao or carregar_vazao()
+    estimado = total_bytes / vazao * MARGEM_PRAZO
+    return min(PRAZO_MAXIMO, PRAZO_MINIMO_ACK + estimado)
+
+
+def prazo_preview(total_bytes):
+    """Tempo máximo (s) para o preview local de `total_bytes` ficar pronto (não mede a rede)."""
+    estimado = total_bytes / VAZAO_PREVIEW * MARGEM_PRAZO
+    return min(PRAZO_MAXIMO, PRAZO_MINIMO + estimado)
+
+
+# --------------------------
+# Hash de conteúdo
+# --------------------------
+# Acima deste tamanho o arquivo é mapeado em memória (mmap) em vez de lido em blocos
+LIMITE_MMAP = 8 * 1024 * 1024
+
+
+def hash_arquivo(path, bloco=1024 * 1024):
+    """
+    SHA-256 do conteúdo do arquivo (hex).
+    Arquivos grandes são mapeados com mmap: o SO pagina o arquivo direto para o hashlib,
+    sem cópias para buffers Python, e o hashlib libera o GIL durante o cálculo.
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        tamanho = os.fstat(f.fileno()).st_size
+        if tamanho >= LIMITE_MMAP:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                h.update(m)
+        else:
+            for parte in iter(lambda: f.read(bloco), b''):
+                h.update(parte)
+    return h.hexdigest()
@@ -0,0 +1,255 @@
+import os
+import sys
+import time
+import shutil
+
+from core.anexos import hash_arquivo
+
+# =============================
+# ARMAZÉM DE ANEXOS (endereçado por conteúdo)
+# =============================
+# Os anexos de um agendamento são copiados para cá no momento em que o job é agendado.
+# O job guarda só a referência "cas:<sha256>/<nome original>" no campo file_path,
+# então mover ou editar o arquivo original depois não afeta o envio, e o mesmo
+# vídeo agendado para 30 chats ocupa espaço uma única vez.
+#
+#   data/anexos/objetos/ab/abcdef...        conteúdo (um arquivo por hash)
+#   data/anexos/visoes/abcdef.../aula.pdf   hardlink com o nome original, criado no envio
+#   data/anexos/recentes/abcdef...          marca de staging (mtime = quando foi armazenado)
+#
+# O nome original importa: o WhatsApp mostra o nome do documento para quem recebe.
+#
+# O staging acontece antes de o job existir no banco (o usuário ainda confirma a previsão de
+# capacidade, a importação ainda está lendo o arquivo). Nesse meio-tempo outro job pode terminar
+# e rodar a coleta de lixo: objetos armazenados há menos de CARENCIA_COLETA segundos não são
+# removidos. A marca fica à parte porque o mtime do objeto é o do arquivo do usuário (hardlink).
+PREFIXO_REFERENCIA = "cas:"
+CARENCIA_COLETA = 6 * 3600
+
+
+def _pasta_armazem():
+    if getattr(sys, 'frozen', False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    return os.path.join(base_dir, "data", "anexos")
+
+
+def _caminho_objeto(digest):
+    return os.path.join(_pasta_armazem(), "objetos", digest[:2], digest)
+
+
+def _pasta_visao(digest):
+    return os.path.join(_pasta_armazem(), "visoes", digest)
+
+
+def _marca_recente(digest):
+    return os.path.join(_pasta_armazem(), "recentes", digest)
+
+
+def _marcar_staging(digest):
+    marca = _marca_recente(digest)
+    os.makedirs(os.path.dirname(marca), exist_ok=True)
+    with open(marca, "a"):
+        pass
+    os.utime(marca)
+
+
+def eh_referencia(entrada):
+    return entrada.startswith(PREFIXO_REFERENCIA)
+
+
+def _separar_referencia(referencia):
+    digest, _, nome = referencia[len(PREFIXO_REFERENCIA):].partition("/")
+    return digest, nome
+
+
+def _vincular_ou_copiar(origem, destino):
+    """Hardlink quando origem e destino estão no mesmo volume; senão, cópia."""
+    tmp = destino + ".tmp"
+    try:
+        os.link(origem, tmp)
+    except OSError:
+        shutil.copy2(origem, tmp)
+    os.replace(tmp, destino)
+
+
+# =============================
+# STAGING
+# =============================
+def armazenar(path):
+    """
+    Coloca um arquivo no armazém e devolve a referência para gravar no job.
+    Se o conteúdo já existe (mesmo hash), nada é copiado.
+    """
+    digest = hash_arquivo(path)
+    objeto = _caminho_objeto(digest)
+    # Marca antes do objeto existir: a coleta nunca vê o objeto novo sem a carência
+    _marcar_staging(digest)
+    if not os.path.exists(objeto):
+        os.makedirs(os.path.dirname(objeto), exist_ok=True)
+        _vincular_ou_copiar(path, objeto)
+    return f"{PREFIXO_REFERENCIA}{digest}/{os.path.basename(path)}"
+
+
+def armazenar_lista(file_path):
+    """
+    Aplica armazenar() a cada caminho do campo file_path (string separada por '\\n').
+    Entradas que já são referências são mantidas.
+    """
+    if not file_path:
+        return file_path
+    entradas = file_path.split('\n') if isinstance(file_path, str) else file_path
+    refs = []
+    for e in entradas:
+        e = e.strip()
+        if not e:
+            continue
+        refs.append(e if eh_referencia(e) else armazenar(e))
+    return "\n".join(refs)
+
+
+# =============================
+# RESOLUÇÃO (na hora do envio)
+# =============================
+def resolver(referencia):
+    """
+    Devolve um caminho real, com o nome original, para a referência.
+    Caminhos comuns (jobs antigos) passam direto.
+    """
+    if not eh_referencia(referencia):
+        return referencia
+
+    digest, nome = _separar_referencia(referencia)
+    objeto = _caminho_objeto(digest)
+    if not os.path.exists(objeto):
+        raise FileNotFoundError(f"Anexo '{nome}' não está mais no armazém ({digest[:12]}).")
+
+    # Links esperados: o próprio objeto + uma visão por nome. Um link a mais significa que o
+    # objeto ainda é o arquivo do usuário (hardlink do staging) e pode ter sido editado no lugar.
+    pasta_visao = _pasta_visao(digest)
+    visoes = len(os.listdir(pasta_visao)) if os.path.isdir(pasta_visao) else 0
+    if os.stat(objeto).st_nlink > 1 + visoes and hash_arquivo(objeto) != digest:
+        raise ValueError(f"Anexo '{nome}' foi alterado depois de agendado.")
+
+    visao = os.path.join(pasta_visao, nome or digest)
+    if not os.path.exists(visao):
+        os.makedirs(os.path.dirname(visao), exist_ok=True)
+        _vincular_ou_copiar(objeto, visao)
+    return visao
+
+
+def resolver_lista(file_path):
+    """Resolve todas as entradas do campo file_path, mantendo o formato de entrada."""
+    if not file_path:
+        return file_path
+    if isinstance(file_path, str):
+        return "\n".join(resolver(e.strip()) for e in file_path.split('\n') if e.strip())
+    return [resolver(e) for e in file_path]
+
+
+def tamanho_anexos(file_path):
+    """
+    Bytes de todas as entradas do campo file_path, sem resolver (nem conferir hash) as referências.
+    Entradas inacessíveis contam como 0.
+    """
+    if not file_path:
+        return 0
+    entradas = file_path.split('\n') if isinstance(file_path, str) else file_path
+    total = 0
+    for e in entradas:
+        e = e.strip()
+        if not e:
+            continue
+        try:
+            total += os.path.getsize(_caminho_objeto(_separar_referencia(e)[0]) if eh_referencia(e) else e)
+        except OSError:
+            pass
+    return total
+
+
+# =============================
+# COLETA DE LIXO
+# =============================
+def hashes_referenciados(file_paths):
+    """Extrai os hashes referenciados por uma coleção de campos file_path."""
+    hashes = set()
+    for fp in file_paths:
+        for e in (fp or "").split('\n'):
+            e = e.strip()
+            if eh_referencia(e):
+                hashes.add(_separar_referencia(e)[0])
+    return hashes
+
+
+def _recentes(carencia, agora):
+    """Hashes armazenados há menos de `carencia` segundos; apaga as marcas vencidas."""
+    pasta = os.path.join(_pasta_armazem(), "recentes")
+    recentes = set()
+    try:
+        marcas = os.listdir(pasta)
+    except FileNotFoundError:
+        return recentes
+    for digest in marcas:
+        marca = os.path.join(pasta, digest)
+        try:
+            if agora - os.path.getmtime(marca) < carencia:
+                recentes.add(digest)
+            else:
+                os.remove(marca)
+        except OSError:
+            continue
+    return recentes
+
+
+def coletar_lixo(file_paths_ativos, logger=None, carencia=CARENCIA_COLETA, agora=None):
+    """
+    Remove objetos (e suas visões) que nenhum job ativo referencia mais.
+    Objetos armazenados há menos de `carencia` segundos ficam (o job pode não estar no banco ainda).
+
+    Args:
+        file_paths_ativos: campos file_path dos jobs que ainda podem ser enviados
+    Returns:
+        int: bytes liberados
+    """
+    pasta_objetos = os.path.join(_pasta_armazem(), "objetos")
+    liberados = 0
+    removidos = 0
+
+    if not os.path.isdir(pasta_objetos):
+        return 0
+
+    pastas = {}
+    for prefixo in os.listdir(pasta_objetos):
+        pasta = os.path.join(pasta_objetos, prefixo)
+        if os.path.isdir(pasta):
+            pastas[pasta] = [d for d in os.listdir(pasta) if not d.endswith(".tmp")]
+
+    # Marcas lidas depois da listagem: a marca é criada antes do objeto, então todo objeto
+    # listado que acabou de ser armazenado já tem a sua
+    vivos = _recentes(carencia, agora or time.time()) | hashes_referenciados(file_paths_ativos)
+
+    for pasta, digests in pastas.items():
+        for digest in digests:
+            if digest in vivos:
+                continue
+            objeto = os.path.join(pasta, digest)
+            try:
+                liberados += os.path.getsize(objeto)
+                os.remove(objeto)
+                shutil.rmtree(_pasta_visao(digest), ignore_errors=True)
+                removidos += 1
+            except OSError as e:
+                print(f"Erro ao remover anexo {digest[:12]}: {e}")
+        try:
+            os.rmdir(pasta)  # só remove se ficou vazia
+        except OSError:
+            pass
+
+    if removidos:
+        msg = f"Armazém de anexos: {removidos} objeto(s) removido(s), {liberados / 1e6:.1f} MB liberados."
+        if logger:
+            logger(msg)
+        else:
+            print(msg)
+    return liberados
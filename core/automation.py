@@ -3,12 +3,21 @@ import time
 import traceback
 import sys
 import undetected_chromedriver as uc
-import json
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import pyperclip
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from core.anexos import (
+    eh_midia, normalizar_caminhos, planejar_lotes,
+    tamanho_total, prazo_upload, prazo_preview, registrar_vazao, exigir_anexos_validos,
+)
+from core.checkpoints import Checkpoints, etapa_lote, etapa_texto, chave_envio
+from core.armazem_anexos import resolver_lista
+from core.ritmo import ritmo_da_conta, MedicaoEnvio
+from core.trava_perfil import TravaPerfil
 
 
 # Delays (ajustáveis)
@@ -17,48 +26,9 @@ SHORT_DELAY = 1.0
 MID_DELAY = 2.0
 LONG_DELAY = 3.0
 
-# --- FUNÇÃO PARA AGENDAMENTO ---
-def run_auto(json_path):
-    """ Função chamada pelo app.py quando o Windows dispara o agendamento. Lê o arquivo JSON e executa a automação. """
-    print(f"Iniciando automação agendada: {json_path}")
-    
-    if not os.path.exists(json_path):
-        print(f"Erro: Arquivo {json_path} não encontrado.")
-        return
-
-    try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            dados = json.load(f)
-        
-        # Extrai os dados do JSON gerado pela sua interface
-        target = dados.get("target")
-        mode = dados.get("mode")
-        message = dados.get("message")
-        file_path = dados.get("file_path")
-
-        if getattr(sys, 'frozen', False):
-            base_dir = os.path.dirname(sys.executable)
-        else:
-            base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-        
-        current_profile = os.path.join(base_dir, "perfil_bot_whatsapp")
-
-        # Chama a função mestre com modo_execucao='auto'
-        executar_envio(
-            userdir=current_profile,
-            target=target,
-            mode=mode,
-            message=message,
-            file_path=file_path,
-            logger=lambda m: print(f"[AUTO-LOG] {m}"),
-            modo_execucao='auto'  # ← ADICIONADO
-        )
-        print("✓ Automação agendada concluída com sucesso.")
-        
-    except Exception as e:
-        print(f"❌ Erro na execução automática: {e}")
-        traceback.print_exc()
-        sys.exit(1)
+# Pré-processamento de mídia antes do upload (ver core/preprocessamento.py)
+PREPROCESSAR_MIDIA = False
+TRANSCODIFICAR_VIDEO = False
 
 # --------------------------
 # Utilitários internos
@@ -145,10 +115,13 @@ def contador_execucao(incrementar=True):
 def iniciar_driver(userdir=None, modo_execucao='manual', timeout=20, logger=None):
     """
     Inicia undetected_chromedriver com perfil persistente.
+    Antes de abrir o Chrome, espera a vez na trava do perfil (core/trava_perfil.py);
+    a trava fica em driver.trava_perfil até encerrar_driver e a espera em driver.espera_trava.
     
     Args:
         modo_execucao: 'manual' = Chrome visível | 'auto' = fake headless
     """
+    trava = None
     try:
         if userdir is None:
             if getattr(sys, 'frozen', False):
@@ -164,6 +137,9 @@ def iniciar_driver(userdir=None, modo_execucao='manual', timeout=20, logger=None
             if logger:
                 logger(f"Criado novo perfil Chrome em: {userdir}")
 
+        trava = TravaPerfil(userdir)
+        espera_trava = trava.adquirir(logger=logger)
+
         if logger:
             logger(f"Iniciando Chrome com profile: {userdir} | modo: {modo_execucao}")
 
@@ -212,6 +188,8 @@ def iniciar_driver(userdir=None, modo_execucao='manual', timeout=20, logger=None
 
         driver = uc.Chrome(options=options, use_subprocess=True)
         driver.browser_pid = driver.browser_pid
+        driver.trava_perfil = trava
+        driver.espera_trava = espera_trava
         driver.set_page_load_timeout(10)
         #driver.maximize_window()
         if modo_execucao != 'auto':
@@ -222,16 +200,16 @@ def iniciar_driver(userdir=None, modo_execucao='manual', timeout=20, logger=None
             logger("Chrome iniciado. Acessando WhatsApp Web...")
         time.sleep(2)
         driver.get("https://web.whatsapp.com")
-        wait_time = 20
+        wait_time = WHATSAPP_LOAD
         if logger:
-            logger(f"Aguardando {wait_time} segundos para carregar WhatsApp...")
-        time.sleep(wait_time)
+            logger(f"Aguardando até {wait_time} segundos para carregar WhatsApp...")
 
-        try:
-            driver.find_element(By.XPATH, "//div[@role='textbox']")
+        # Segue assim que a caixa de busca aparece, em vez de esperar o tempo todo
+        inicio = time.monotonic()
+        if _wait(driver, By.XPATH, "//div[@role='textbox']", timeout=wait_time):
             if logger:
-                logger("✓ WhatsApp Web carregado (DOM ativo).")
-        except:
+                logger(f"✓ WhatsApp Web carregado (DOM ativo) em {time.monotonic() - inicio:.1f}s.")
+        else:
             if logger:
                 logger("⚠️ WhatsApp Web pode não estar autenticado.")
 
@@ -241,6 +219,8 @@ def iniciar_driver(userdir=None, modo_execucao='manual', timeout=20, logger=None
         if logger:
             logger(f"❌ ERRO ao iniciar Chrome: {e}")
             logger(traceback.format_exc())
+        if trava:
+            trava.liberar()
         raise
 
 
@@ -306,9 +286,10 @@ def procurar_contato_grupo(driver, target, logger=None, timeout=1):
 # Mensagem de texto
 # --------------------------
 
-def enviar_mensagem_simples(driver, message, logger=None, timeout=1):
+def enviar_mensagem_simples(driver, message, logger=None, timeout=1, ao_enviar=None):
     """
     Envia mensagem de texto no chat aberto, respeitando quebras de linha com Shift+Enter.
+    ao_enviar: chamado logo depois do clique/Enter de enviar (checkpoint e relógio do ack)
     """
     try:
         _log(logger, "Enviando mensagem de texto...")
@@ -355,6 +336,8 @@ def enviar_mensagem_simples(driver, message, logger=None, timeout=1):
         else:
             msg_box.send_keys(Keys.ENTER)
             _log(logger, "Botão de enviar não encontrado; enviado via Enter.")
+        if ao_enviar:
+            ao_enviar()
 
         time.sleep(SHORT_DELAY)
         return True
@@ -367,6 +350,32 @@ def enviar_mensagem_simples(driver, message, logger=None, timeout=1):
 # --------------------------
 # Funções de anexos / upload
 # --------------------------
+# Seletores compartilhados pelos envios de anexos (Business e Normal)
+_CANDIDATOS_LEGENDA = [
+    (By.XPATH, "//*[@id='app']/div/div/div[3]/div/div[3]/div[2]/div/span/div/div/div/div[2]/div/div[1]/div[3]/div/div/div[1]/div[1]/div[1]/p"), # Business/Normal XPath
+    (By.CSS_SELECTOR, "div.lexical-rich-text-input div[contenteditable='true']"), # CSS Geral
+    (By.XPATH, "//div[contains(@aria-label, 'legenda')]"), # Atributo Acessibilidade
+    (By.CSS_SELECTOR, "#app > div > div > div.x78zum5.xdt5ytf.x5yr21d > div > div.x10l6tqk.x13vifvy.x1o0tod.x78zum5.xh8yej3.x5yr21d.x6ikm8r.x10wlt62.x47corl > div.x9f619.x1n2onr6.x5yr21d.x6ikm8r.x10wlt62.x17dzmu4.x1i1dayz.x2ipvbc.xjdofhw.xyyilfv.x1iyjqo2.xpilrb4.x1t7ytsu.x1vb5itz.x12xzxwr > div > span > div > div > div > div.x1n2onr6.xupqr0c.x78zum5.x1r8uery.x1iyjqo2.xdt5ytf.x1hc1fzr.x6ikm8r.x10wlt62.x1anedsm > div > div.x78zum5.x1iyjqo2.xs83m0k.x1r8uery.xdt5ytf.x1qughib.x6ikm8r.x10wlt62 > div.x1c4vz4f.xs83m0k.xdl72j9.x1g77sc7.x78zum5.xozqiw3.x1oa3qoh.x12fk4p8.xeuugli.x2lwn1j.xl56j7k.x1q0g3np.x6s0dn4.x1n2onr6.xo8q3i6.x1y1aw1k.xwib8y2.x1c1uobl.xyri2b > div > div > div.x1c4vz4f.xs83m0k.xdl72j9.x1g77sc7.x78zum5.xozqiw3.x1oa3qoh.x12fk4p8.xeuugli.x2lwn1j.x1nhvcw1.x1q0g3np.x1cy8zhl.x9f619.xh8yej3.x1ba4aug.x1tiyuxx.xvtqlqk.x1nbhmlj.xdx6fka.x1od0jb8.xyi3aci.xwf5gio.x1p453bz.x1suzm8a > div.x1n2onr6.xh8yej3.x1k70j0n.x14z9mp.xzueoph.x1lziwak.xisnujt.x14ug900.x1vvkbs.x126k92a.x1hx0egp.lexical-rich-text-input > div.x1hx0egp.x6ikm8r.x1odjw0f.x1k6rcq7.x1lkfr7t > p"), # CSS Normal
+    (By.XPATH, "//div[@role='textbox' and contains(@aria-label, 'mensagem')]"),
+]
+
+_CANDIDATOS_ENVIAR_ANEXO = [
+    (By.XPATH, "//span[@data-icon='send']"),
+    (By.XPATH, "//div[@role='button' and @aria-label='Enviar']"),
+    (By.XPATH, "//*[@id='app']/div/div/div[3]/div/div[3]/div[2]/div/span/div/div/div/div[2]/div/div[2]/div[2]/span/div/div/span"),
+    (By.XPATH, "/html/body/div[1]/div/div/div/div/div[3]/div/div[3]/div[2]/div/span/div/div/div/div[2]/div/div[2]/div[2]/span/div/div/span"),
+    (By.CSS_SELECTOR, "div[aria-label='Enviar'] span[data-icon='send']"),
+    (By.CSS_SELECTOR, "#app > div > div > div.x78zum5.xdt5ytf.x5yr21d > div > div.x10l6tqk.x13vifvy.x1o0tod.x78zum5.xh8yej3.x5yr21d.x6ikm8r.x10wlt62.x47corl > div.x9f619.x1n2onr6.x5yr21d.x6ikm8r.x10wlt62.x17dzmu4.x1i1dayz.x2ipvbc.xjdofhw.xyyilfv.x1iyjqo2.xpilrb4.x1t7ytsu.x1vb5itz.x12xzxwr > div > span > div > div > div > div.x1n2onr6.xupqr0c.x78zum5.x1r8uery.x1iyjqo2.xdt5ytf.x1hc1fzr.x6ikm8r.x10wlt62.x1anedsm > div > div.x78zum5.x1c4vz4f.x2lah0s.x1helyrv.x6s0dn4.x1qughib.x178xt8z.x13fuv20.xx42vgk.x1y1aw1k.xwib8y2.xf7dkkf.xv54qhq > div.x1247r65.xng8ra > span > div > div > span"),
+    (By.XPATH, "//span[@data-icon='send' or @data-icon='wds-ic-send-filled']"),
+]
+
+# Miniaturas exibidas no preview de anexos (mídia usa blob:, documento usa ícone)
+_SELETORES_MINIATURAS = [
+    "div[role='button'] img[src^='blob:']",
+    "div[role='button'] span[data-icon^='document']",
+    "div[role='button'] span[data-icon^='doc-']",
+]
+
 def clicar_clip(driver, logger=None):
     """
     Clica no botão de anexar (clip). Usa seletor baseado em data-icon ou fallback por role.
@@ -387,13 +396,13 @@ def clicar_clip(driver, logger=None):
     _log(None, f"clicar_clip: clique realizado ({sel}).")
     return True
 
-def clicar_botao_documento(driver, file_path, logger=None):
+def clicar_botao_documento(driver, file_path, logger=None, tipo=None):
     """
     Diferencia entre WhatsApp Normal e Business para garantir o envio como mídia.
+    tipo: 'midia' ou 'documento' (quando omitido, decide pela extensão do arquivo)
     """
     try:
-        ext = os.path.splitext(file_path.lower())[1]
-        is_media = ext in ['.jpg', '.jpeg', '.png', '.gif', '.mp4']
+        is_media = (tipo == 'midia') if tipo else eh_midia(file_path)
         
         if is_media:
             _log(logger, "Selecionando Fotos e Vídeos (Business)...")
@@ -401,7 +410,10 @@ def clicar_botao_documento(driver, file_path, logger=None):
                 (By.CSS_SELECTOR, "div[role='button'] span[data-icon='attach-image']"), # Universal
                 (By.XPATH, "//div[contains(@aria-label, 'Fotos')]"), # Acessibilidade
                 (By.XPATH, "/html/body/div[1]/div/div/div/div/span[6]/div/ul/div/div/div[2]/li"), # Seu XPath
-                (By.CSS_SELECTOR, "li:nth-child(2) div span") # Seu CSS simplificado
+                (By.CSS_SELECTOR, "li:nth-child(2) div span"), # Seu CSS simplificado
+                (By.XPATH, '//*[@id="app"]/div/div/div[4]/div/div/div[1]/div[1]/div/div/div/div/div[1]/div[2]/div[1]/div[2]/span'), # Normal XPath
+                (By.CSS_SELECTOR, "#app > div > div > div:nth-child(11) > div > div > div.xu96u03.xm80bdy.x10l6tqk.x13vifvy.xoz0ns6.x1gslohp > div.html-div.xdj266r.x14z9mp.xat24cr.x1lziwak.xexx8yu.xyri2b.x18d9i69.x1c1uobl > div > div > div > div > div.x78zum5.xdt5ytf.x1iyjqo2.x1n2onr6 > div:nth-child(2) > div.x6s0dn4.xlr9sxt.xvvg52n.xwd4zgb.xq8v1ta.x78zum5.xu0aao5.xh8yej3 > div.x78zum5.xdt5ytf.x1iyjqo2.xde1mab > span"), # Normal CSS
+                (By.XPATH, "//span[@data-icon='attach-image']/parent::div/parent::li"), # Fallback Universal
             ]
         else:
             _log(logger, "Selecionando Documentos (Business)...")
@@ -466,124 +478,197 @@ def upload_arquivo(driver, file_path, logger=None, timeout=1):
         _log(logger, traceback.format_exc())
         raise
 
-def enviar_arquivo(driver, file_path, logger=None):
+def _colar_legenda(driver, message, logger=None):
     """
-    Envia arquivos um por um para evitar o erro 'invalid argument'.
+    Cola a legenda no preview de anexos via Ctrl+V (preserva quebras de linha e emojis).
     """
-    try:
-        # Garante que file_path seja uma lista, mesmo que venha do agendamento como string
-        paths = file_path.split('\n') if isinstance(file_path, str) else file_path
-        
-        for p in paths:
-            p = p.strip()
-            if not p or not os.path.exists(p): continue
-            
-            _log(logger, f"Anexando individualmente: {os.path.basename(p)}")
-            clicar_clip(driver, logger=logger)
-            clicar_botao_documento(driver, p, logger=logger)
+    _log(logger, "Colando legenda...")
+    caption_box, _ = _find(driver, _CANDIDATOS_LEGENDA)
+    if not caption_box:
+        _log(logger, "Aviso: Caixa de legenda não encontrada para colar texto.")
+        return False
+
+    pyperclip.copy(message)
+    caption_box.click()
+    time.sleep(0.5)
 
-            input_file = localizar_input_file(driver, logger)
-            if not input_file: raise Exception("Input file não encontrado")
-            
-            # Envia o caminho absoluto de apenas UM arquivo por vez
-            input_file.send_keys(os.path.abspath(p))
-            time.sleep(2.0) 
+    # Técnica Ctrl+A + Backspace + Ctrl+V
+    caption_box.send_keys(Keys.CONTROL + "a")
+    caption_box.send_keys(Keys.BACKSPACE)
+    caption_box.send_keys(Keys.CONTROL + "v")
+    time.sleep(1)
+    return True
 
-            # Botão de enviar (seta verde) - Seletor híbrido para Business e Normal
-            send_btn = _wait(driver, By.XPATH, "//div[@role='button' and @aria-label='Enviar'] | //span[@data-icon='send']", timeout=5)
-            
-            if send_btn:
-                driver.execute_script("arguments[0].click();", send_btn)
-                time.sleep(2.0) 
-            else:
-                _log(logger, "Botão de enviar não encontrado após upload.")
+def _contar_miniaturas(driver):
+    """Conta as miniaturas do preview usando o seletor que encontrar mais elementos."""
+    total = 0
+    for sel in _SELETORES_MINIATURAS:
+        try:
+            total = max(total, len(driver.find_elements(By.CSS_SELECTOR, sel)))
+        except Exception:
+            continue
+    return total
 
-        return True
-    except Exception as e:
-        _log(logger, f"Erro enviar_arquivo: {e}")
-        raise
+def _botao_enviar_habilitado(driver):
+    """Verifica, sem esperar, se a seta verde do preview existe e está habilitada."""
+    for by, sel in _CANDIDATOS_ENVIAR_ANEXO:
+        try:
+            for el in driver.find_elements(by, sel):
+                botao = el
+                # O ícone fica dentro do botão; o estado 'aria-disabled' fica no botão
+                if el.tag_name == 'span':
+                    try:
+                        botao = el.find_element(By.XPATH, "./ancestor::*[@role='button'][1]")
+                    except Exception:
+                        pass
+                if el.is_displayed() and botao.get_attribute('aria-disabled') != 'true':
+                    return True
+        except Exception:
+            continue
+    return False
 
-def enviar_arquivo_com_mensagem(driver, file_path, message, logger=None):
-    try:
-        # 1. Preparação dos arquivos 
-        paths = [os.path.abspath(p.strip()) for p in file_path.split('\n') if p.strip()] if isinstance(file_path, str) else [os.path.abspath(p) for p in file_path]
-        full_paths_string = "\n".join(paths)
+def aguardar_preview(driver, esperado, prazo, logger=None, intervalo=0.25):
+    """
+    Espera o preview mostrar `esperado` miniaturas com o botão de enviar habilitado,
+    no máximo `prazo` segundos. Retorna o tempo gasto.
+    """
+    inicio = time.monotonic()
+    limite = inicio + prazo
+    # Arquivo único não mostra a faixa de miniaturas, basta o botão habilitado
+    minimo = esperado if esperado > 1 else 0
+
+    while time.monotonic() < limite:
+        if _botao_enviar_habilitado(driver) and _contar_miniaturas(driver) >= minimo:
+            decorrido = time.monotonic() - inicio
+            _log(logger, f"Preview pronto em {decorrido:.1f}s ({esperado} arquivo(s)).")
+            return decorrido
+        time.sleep(intervalo)
+
+    _log(logger, f"Aviso: preview não confirmado em {prazo:.0f}s; tentando enviar assim mesmo.")
+    return prazo
+
+def _clicar_enviar_anexo(driver, logger=None):
+    """Clica na seta verde do preview de anexos."""
+    send_btn, _ = _find(driver, _CANDIDATOS_ENVIAR_ANEXO)
+    if not send_btn:
+        raise Exception("Botão de enviar não encontrado após upload.")
+    driver.execute_script("arguments[0].click();", send_btn)
+    _log(logger, "Botão enviar clicado.")
+    return True
 
-        # 2. Abrir menu de anexo
-        clicar_clip(driver, logger=logger)
-        
-        # --- LÓGICA HÍBRIDA PARA BOTÃO DE FOTOS/VÍDEOS ---
-        _log(logger, "Localizando botão de Fotos e Vídeos...")
-        seletores_fotos = [
-            (By.XPATH, "/html/body/div[1]/div/div/div/div/span[6]/div/ul/div/div/div[2]/li"), # Business
-            (By.XPATH, '//*[@id="app"]/div/div/div[4]/div/div/div[1]/div[1]/div/div/div/div/div[1]/div[2]/div[1]/div[2]/span'), # Normal XPath
-            (By.CSS_SELECTOR, "#app > div > div > div:nth-child(11) > div > div > div.xu96u03.xm80bdy.x10l6tqk.x13vifvy.xoz0ns6.x1gslohp > div.html-div.xdj266r.x14z9mp.xat24cr.x1lziwak.xexx8yu.xyri2b.x18d9i69.x1c1uobl > div > div > div > div > div.x78zum5.xdt5ytf.x1iyjqo2.x1n2onr6 > div:nth-child(2) > div.x6s0dn4.xlr9sxt.xvvg52n.xwd4zgb.xq8v1ta.x78zum5.xu0aao5.xh8yej3 > div.x78zum5.xdt5ytf.x1iyjqo2.xde1mab > span"), # Normal CSS
-            (By.XPATH, "//span[@data-icon='attach-image']/parent::div/parent::li") # Fallback Universal
-        ]
-        
-        btn_fotos, _ = _find(driver, seletores_fotos)
-        
-        if not btn_fotos:
-            raise Exception("Não foi possível encontrar o botão de Fotos em nenhuma das versões.")
-            
-        driver.execute_script("arguments[0].click();", btn_fotos)
-        time.sleep(2)
+def aguardar_confirmacao_envio(driver, prazo, logger=None, intervalo=0.5):
+    """
+    Espera o WhatsApp confirmar o envio: preview fechado e nenhuma mensagem do chat
+    com o relógio de pendente (msg-time). Retorna True se confirmou dentro do prazo.
+    """
+    limite = time.monotonic() + prazo
+    while time.monotonic() < limite:
+        try:
+            preview_aberto = _botao_enviar_habilitado(driver) and _contar_miniaturas(driver) > 0
+            pendentes = driver.find_elements(By.CSS_SELECTOR, "#main span[data-icon='msg-time']")
+            if not preview_aberto and not pendentes:
+                return True
+        except Exception:
+            pass
+        time.sleep(intervalo)
+    _log(logger, f"Aviso: envio não confirmado em {prazo:.0f}s.")
+    return False
 
-        # 3. Enviar arquivos (Injeção direta no input oculto)
-        input_file = localizar_input_file(driver, logger)
-        input_file.send_keys(full_paths_string)
-        
-        _log(logger, "Aguardando preview das imagens...")
-        time.sleep(6) # Tempo essencial para o WA montar o álbum
-
-        # 4. Inserir Legenda via Ctrl+V 
-        if message:
-            _log(logger, "Colando legenda...")
-            # Unindo seus candidatos do Business com o normal
-            caption_candidates = [
-                (By.XPATH, "//*[@id='app']/div/div/div[3]/div/div[3]/div[2]/div/span/div/div/div/div[2]/div/div[1]/div[3]/div/div/div[1]/div[1]/div[1]/p"), # Business/Normal XPath
-                (By.CSS_SELECTOR, "div.lexical-rich-text-input div[contenteditable='true']"), # CSS Geral
-                (By.XPATH, "//div[contains(@aria-label, 'legenda')]"), # Atributo Acessibilidade
-                (By.CSS_SELECTOR, "#app > div > div > div.x78zum5.xdt5ytf.x5yr21d > div > div.x10l6tqk.x13vifvy.x1o0tod.x78zum5.xh8yej3.x5yr21d.x6ikm8r.x10wlt62.x47corl > div.x9f619.x1n2onr6.x5yr21d.x6ikm8r.x10wlt62.x17dzmu4.x1i1dayz.x2ipvbc.xjdofhw.xyyilfv.x1iyjqo2.xpilrb4.x1t7ytsu.x1vb5itz.x12xzxwr > div > span > div > div > div > div.x1n2onr6.xupqr0c.x78zum5.x1r8uery.x1iyjqo2.xdt5ytf.x1hc1fzr.x6ikm8r.x10wlt62.x1anedsm > div > div.x78zum5.x1iyjqo2.xs83m0k.x1r8uery.xdt5ytf.x1qughib.x6ikm8r.x10wlt62 > div.x1c4vz4f.xs83m0k.xdl72j9.x1g77sc7.x78zum5.xozqiw3.x1oa3qoh.x12fk4p8.xeuugli.x2lwn1j.xl56j7k.x1q0g3np.x6s0dn4.x1n2onr6.xo8q3i6.x1y1aw1k.xwib8y2.x1c1uobl.xyri2b > div > div > div.x1c4vz4f.xs83m0k.xdl72j9.x1g77sc7.x78zum5.xozqiw3.x1oa3qoh.x12fk4p8.xeuugli.x2lwn1j.x1nhvcw1.x1q0g3np.x1cy8zhl.x9f619.xh8yej3.x1ba4aug.x1tiyuxx.xvtqlqk.x1nbhmlj.xdx6fka.x1od0jb8.xyi3aci.xwf5gio.x1p453bz.x1suzm8a > div.x1n2onr6.xh8yej3.x1k70j0n.x14z9mp.xzueoph.x1lziwak.xisnujt.x14ug900.x1vvkbs.x126k92a.x1hx0egp.lexical-rich-text-input > div.x1hx0egp.x6ikm8r.x1odjw0f.x1k6rcq7.x1lkfr7t > p") # CSS Normal
-            ]
-            
-            caption_box, _ = _find(driver, caption_candidates)
-            
-            if caption_box:
-                pyperclip.copy(message)
-                caption_box.click()
-                time.sleep(0.5)
-                
-                # Técnica Ctrl+A + Backspace + Ctrl+V
-                caption_box.send_keys(Keys.CONTROL + "a")
-                caption_box.send_keys(Keys.BACKSPACE)
-                caption_box.send_keys(Keys.CONTROL + "v")
-                time.sleep(1)
-            else:
-                _log(logger, "Aviso: Caixa de legenda não encontrada para colar texto.")
-
-        # 5. Clique no Enviar (Seta Verde)
-        # Sendo redundante com seletores de ícone e de label
-        send_btn_candidates = [
-            (By.XPATH, "//span[@data-icon='send']"),
-            (By.XPATH, "//div[@role='button' and @aria-label='Enviar']"),
-            (By.XPATH, "//*[@id='app']/div/div/div[3]/div/div[3]/div[2]/div/span/div/div/div/div[2]/div/div[2]/div[2]/span/div/div/span"),
-            (By.XPATH, "/html/body/div[1]/div/div/div/div/div[3]/div/div[3]/div[2]/div/span/div/div/div/div[2]/div/div[2]/div[2]/span/div/div/span"),
-            (By.CSS_SELECTOR, "div[aria-label='Enviar'] span[data-icon='send']"),
-            (By.CSS_SELECTOR, "#app > div > div > div.x78zum5.xdt5ytf.x5yr21d > div > div.x10l6tqk.x13vifvy.x1o0tod.x78zum5.xh8yej3.x5yr21d.x6ikm8r.x10wlt62.x47corl > div.x9f619.x1n2onr6.x5yr21d.x6ikm8r.x10wlt62.x17dzmu4.x1i1dayz.x2ipvbc.xjdofhw.xyyilfv.x1iyjqo2.xpilrb4.x1t7ytsu.x1vb5itz.x12xzxwr > div > span > div > div > div > div.x1n2onr6.xupqr0c.x78zum5.x1r8uery.x1iyjqo2.xdt5ytf.x1hc1fzr.x6ikm8r.x10wlt62.x1anedsm > div > div.x78zum5.x1c4vz4f.x2lah0s.x1helyrv.x6s0dn4.x1qughib.x178xt8z.x13fuv20.xx42vgk.x1y1aw1k.xwib8y2.xf7dkkf.xv54qhq > div.x1247r65.xng8ra > span > div > div > span")
-        ]
-        send_btn, _ = _find(driver, send_btn_candidates)
-        
-        if send_btn:
-            driver.execute_script("arguments[0].click();", send_btn)
-            _log(logger, "Botão enviar clicado.")
-        else:
-            _log(logger, "Falha ao encontrar botão de envio final.")
+def enviar_lote(driver, lote, logger=None, ao_enviar=None):
+    """
+    Envia um lote do planejador (core.anexos.planejar_lotes) em um único upload:
+    clip → Fotos/Documento → input com todos os caminhos → legenda → enviar.
+    ao_enviar: chamado logo depois do clique em enviar, antes de esperar o ack
+        (grava a unidade como enviada, ver core/checkpoints.py)
+    """
+    arquivos = lote['arquivos']
+    _log(logger, f"Anexando lote de {len(arquivos)} arquivo(s) ({lote['tipo']})...")
 
-        _log(logger, "Lote enviado com sucesso.")
-        time.sleep(2)
-        return True
+    clicar_clip(driver, logger=logger)
+    clicar_botao_documento(driver, arquivos[0], logger=logger, tipo=lote['tipo'])
+
+    input_file = localizar_input_file(driver, logger)
+    if not input_file:
+        raise Exception("Input file não encontrado")
+
+    total_bytes = tamanho_total(arquivos)
+    prazo = prazo_preview(total_bytes)
+
+    # O segredo está aqui: enviar a string com todos os arquivos do lote
+    input_file.send_keys("\n".join(arquivos))
+
+    _log(logger, f"Aguardando preview dos arquivos ({total_bytes / 1e6:.1f} MB, prazo {prazo:.0f}s)...")
+    aguardar_preview(driver, len(arquivos), prazo, logger=logger)
+
+    if lote.get('legenda'):
+        _colar_legenda(driver, lote['legenda'], logger=logger)
+
+    _clicar_enviar_anexo(driver, logger=logger)
+    clique = time.monotonic()
+    if ao_enviar:
+        ao_enviar()
+    time.sleep(SHORT_DELAY)
+
+    # Depois do clique o WhatsApp ainda sobe os bytes; o relógio some quando o servidor recebe.
+    # Esse intervalo é o upload de verdade: é ele que alimenta a estimativa de vazão.
+    if not aguardar_confirmacao_envio(driver, prazo_upload(total_bytes), logger=logger):
+        raise Exception("Lote enviado mas não confirmado pelo WhatsApp (não será reenviado).")
+    registrar_vazao(total_bytes, time.monotonic() - clique)
+    return True
 
+def _ritmo(ritmo, tipo, logger=None):
+    """Contexto de ritmo da unidade de envio (só a MedicaoEnvio, se não houver ritmo)."""
+    return ritmo.envio(tipo, logger=logger) if ritmo else nullcontext(MedicaoEnvio())
+
+def enviar_lotes(driver, file_path, message=None, logger=None, checkpoints=None, ritmo=None):
+    """
+    Planeja e envia todos os arquivos do job: mídia e documentos separados,
+    cada grupo dividido no limite de arquivos por envio do WhatsApp.
+    Com checkpoints, lotes já confirmados numa tentativa anterior são pulados.
+    Com ritmo (core.ritmo.RitmoConta), cada lote espera o token de mídia da conta.
+    """
+    paths = normalizar_caminhos(file_path)
+    exigir_anexos_validos(paths)
+
+    lotes = planejar_lotes(paths, message)
+    if not lotes:
+        raise Exception("Nenhum arquivo válido para enviar.")
+
+    _log(logger, f"{len(paths)} arquivo(s) planejado(s) em {len(lotes)} upload(s).")
+    for i, lote in enumerate(lotes):
+        etapa = etapa_lote(i, lote)
+        if checkpoints and checkpoints.feito(etapa):
+            _log(logger, f"Lote {i + 1}/{len(lotes)} já enviado para este destinatário; pulando.")
+            continue
+        with _ritmo(ritmo, 'midia', logger) as medicao:
+            def ao_enviar(etapa=etapa):
+                medicao.clique()
+                if checkpoints:
+                    checkpoints.marcar_enviado(etapa)
+            enviar_lote(driver, lote, logger=logger, ao_enviar=ao_enviar)
+            medicao.ack()
+        if checkpoints:
+            checkpoints.marcar(etapa)
+
+    _log(logger, "Lote enviado com sucesso.")
+    return True
+
+def enviar_arquivo(driver, file_path, logger=None, checkpoints=None, ritmo=None):
+    """
+    Envia os arquivos do job agrupados em lotes (um upload por lote, não por arquivo).
+    """
+    try:
+        return enviar_lotes(driver, file_path, logger=logger, checkpoints=checkpoints, ritmo=ritmo)
+    except Exception as e:
+        _log(logger, f"Erro enviar_arquivo: {e}")
+        raise
+
+def enviar_arquivo_com_mensagem(driver, file_path, message, logger=None, checkpoints=None, ritmo=None):
+    """
+    Igual a enviar_arquivo, com a legenda colada no lote certo (primeiro lote de mídia).
+    """
+    try:
+        return enviar_lotes(driver, file_path, message, logger=logger, checkpoints=checkpoints, ritmo=ritmo)
     except Exception as e:
         _log(logger, f"Erro crítico na função: {e}")
         raise
@@ -598,31 +683,8 @@ def enviar_arquivos_multiplos(driver, lista_file_paths, logger=None):
     lista_file_paths: deve ser uma lista de caminhos, ex: ['c:/img1.png', 'c:/img2.jpg']
     """
     try:
-        # Transforma a lista em uma string única separada por \n
-        files_string = "\n".join(lista_file_paths)
-        primeiro_arquivo = lista_file_paths[0]
-
-        _log(logger, f"Anexando {len(lista_file_paths)} arquivos...")
-        clicar_clip(driver, logger=logger)
-        
-        # Usa o primeiro arquivo apenas para decidir se abre 'Fotos' ou 'Documentos'
-        clicar_botao_documento(driver, primeiro_arquivo, logger=logger)
-
-        input_file = localizar_input_file(driver, logger)
-        if not input_file: 
-            raise Exception("Input file não encontrado")
-        
-        # O segredo está aqui: enviar a string com todos os arquivos
-        input_file.send_keys(files_string)
-        
-        # Tempo maior para carregar múltiplos previews
-        time.sleep(4.0) 
-
-        send_btn = _wait(driver, By.XPATH, "//div[@role='button' and @aria-label='Enviar']", timeout=3)
-        if not send_btn:
-            send_btn = _wait(driver, By.XPATH, "//span[@data-icon='send' or @data-icon='wds-ic-send-filled']", timeout=2)
-        
-        driver.execute_script("arguments[0].click();", send_btn)
+        for lote in planejar_lotes(lista_file_paths):
+            enviar_lote(driver, lote, logger=logger)
         _log(logger, "Envio múltiplo concluído.")
         return True
     except Exception as e:
@@ -634,51 +696,309 @@ def enviar_arquivos_multiplos_com_mensagem(driver, lista_file_paths, message, lo
     Envia vários arquivos e uma única legenda que vale para todos.
     """
     try:
-        files_string = "\n".join(lista_file_paths)
-        primeiro_arquivo = lista_file_paths[0]
-
-        clicar_clip(driver, logger=logger)
-        clicar_botao_documento(driver, primeiro_arquivo, logger=logger)
-
-        input_file = localizar_input_file(driver, logger)
-        input_file.send_keys(files_string)
-        
-        # Aguarda carregar todos os arquivos no preview
-        time.sleep(5.0) 
-
-        caption_candidates = [
-            (By.XPATH, "//div[@role='textbox' and contains(@aria-label, 'mensagem')]"),
-            (By.XPATH, "//div[@contenteditable='true' and @data-tab='10']"),
-            (By.CSS_SELECTOR, "div[contenteditable='true']")
-        ]
-        
-        caption_box, sel = _find(driver, caption_candidates)
-        
-        if caption_box:
-            driver.execute_script("arguments[0].focus();", caption_box)
-            caption_box.click()
-            time.sleep(1)
-            if message:
-                caption_box.send_keys(message)
-                time.sleep(1)
-
-        send_btn = _wait(driver, By.XPATH, "//div[@role='button' and @aria-label='Enviar']", timeout=3)
-        driver.execute_script("arguments[0].click();", send_btn)
+        for lote in planejar_lotes(lista_file_paths, message):
+            enviar_lote(driver, lote, logger=logger)
         return True
     except Exception as e:
         _log(logger, f"Erro envio múltiplo com mensagem: {e}")
         raise
 
+# --------------------------
+# Encaminhamento (fan-out)
+# --------------------------
+# WhatsApp Web permite encaminhar para no máximo 5 chats por vez
+LIMITE_ENCAMINHAR = 5
+# Jobs da mesma sessão com os mesmos anexos e o mesmo horário recebem um único upload,
+# encaminhado aos demais destinos (ver enviar_fanout_na_sessao). False: um upload por destino.
+ENCAMINHAR_ATIVO = True
+
+def _xpath_literal(texto):
+    """Monta um literal XPath seguro para textos com aspas simples e/ou duplas."""
+    if "'" not in texto:
+        return f"'{texto}'"
+    if '"' not in texto:
+        return f'"{texto}"'
+    partes = texto.split("'")
+    return "concat(" + ", \"'\", ".join(f"'{p}'" for p in partes) + ")"
+
+def _clicar(driver, el):
+    try:
+        el.click()
+    except Exception:
+        driver.execute_script("arguments[0].click();", el)
+
+def contar_mensagens_lote(lotes):
+    """Quantas mensagens um envio gera no chat: cada arquivo vira uma mensagem."""
+    return sum(len(l['arquivos']) for l in lotes)
+
+def selecionar_ultimas_mensagens(driver, quantidade, logger=None):
+    """
+    Entra no modo 'Selecionar mensagens' do chat aberto e marca as últimas
+    `quantidade` mensagens enviadas pelo bot.
+    """
+    menu, _ = _find(driver, [
+        (By.XPATH, "//div[@id='main']//header//span[@data-icon='menu']"),
+        (By.XPATH, "//div[@id='main']//header//div[@role='button' and @aria-label='Mais opções']"),
+    ])
+    if not menu:
+        raise Exception("Menu do chat não encontrado.")
+    _clicar(driver, menu)
+    time.sleep(0.5)
+
+    opcao, _ = _find(driver, [
+        (By.XPATH, "//div[@role='button' and @aria-label='Selecionar mensagens']"),
+        (By.XPATH, "//li//div[contains(., 'Selecionar mensagens')]"),
+    ])
+    if not opcao:
+        raise Exception("Opção 'Selecionar mensagens' não encontrada.")
+    _clicar(driver, opcao)
+    time.sleep(0.5)
+
+    mensagens = driver.find_elements(By.XPATH, "//div[@id='main']//div[contains(@class, 'message-out')]")
+    if len(mensagens) < quantidade:
+        raise Exception(f"Esperava {quantidade} mensagens enviadas no chat, encontrei {len(mensagens)}.")
+
+    for el in mensagens[-quantidade:]:
+        _clicar(driver, el)
+        time.sleep(0.1)
+    _log(logger, f"{quantidade} mensagem(ns) selecionada(s) para encaminhar.")
+    return True
+
+def encaminhar_selecionadas(driver, destinos, logger=None, ao_enviar=None):
+    """
+    Abre o diálogo de encaminhar com as mensagens já selecionadas, marca até
+    LIMITE_ENCAMINHAR destinos e envia.
+    ao_enviar: chamado logo depois do clique em enviar (grava os destinos como enviados)
+    """
+    if len(destinos) > LIMITE_ENCAMINHAR:
+        raise ValueError(f"No máximo {LIMITE_ENCAMINHAR} destinos por encaminhamento.")
+
+    botao, _ = _find(driver, [
+        (By.XPATH, "//div[@role='button' and @aria-label='Encaminhar']"),
+        (By.XPATH, "//span[@data-icon='forward']"),
+    ])
+    if not botao:
+        raise Exception("Botão 'Encaminhar' não encontrado.")
+    _clicar(driver, botao)
+    time.sleep(1.0)
+
+    busca, _ = _find(driver, [
+        (By.XPATH, "//div[@role='dialog']//div[@contenteditable='true']"),
+        (By.CSS_SELECTOR, "div[role='dialog'] input[type='text']"),
+    ])
+    if not busca:
+        raise Exception("Campo de busca do diálogo de encaminhar não encontrado.")
+
+    for destino in destinos:
+        _clicar(driver, busca)
+        busca.send_keys(Keys.CONTROL + "a")
+        busca.send_keys(Keys.BACKSPACE)
+        busca.send_keys(destino)
+        time.sleep(1.0)
+
+        resultado = _wait_clickable(
+            driver, By.XPATH,
+            f"//div[@role='dialog']//span[@title={_xpath_literal(destino)}]",
+            timeout=5
+        )
+        if not resultado:
+            raise Exception(f"Destino '{destino}' não encontrado no diálogo de encaminhar.")
+        _clicar(driver, resultado)
+        time.sleep(0.3)
+
+    enviar, _ = _find(driver, [
+        (By.XPATH, "//div[@role='dialog']//span[@data-icon='send']"),
+        (By.XPATH, "//div[@role='dialog']//div[@role='button' and @aria-label='Enviar']"),
+        (By.XPATH, "//span[@data-icon='wds-ic-send-filled']"),
+    ])
+    if not enviar:
+        raise Exception("Botão de enviar do diálogo de encaminhar não encontrado.")
+    _clicar(driver, enviar)
+    if ao_enviar:
+        ao_enviar()
+    time.sleep(MID_DELAY)
+    _log(logger, f"Encaminhado para: {', '.join(destinos)}")
+    return True
+
+def encaminhar_para_muitos(driver, quantidade, destinos, logger=None, ao_enviar=None, ao_confirmar=None,
+                           ritmo=None):
+    """
+    Encaminha as últimas `quantidade` mensagens do chat aberto para todos os destinos,
+    em lotes de LIMITE_ENCAMINHAR (a seleção precisa ser refeita a cada lote).
+    ao_enviar / ao_confirmar: chamados com a lista de destinos do lote logo depois do clique
+        em enviar e depois que o diálogo fecha (checkpoints, ver enviar_fanout_na_sessao)
+    ritmo: core.ritmo.RitmoConta da conta; cada lote encaminhado conta como um envio de mídia
+    """
+    entregues = []
+    for i in range(0, len(destinos), LIMITE_ENCAMINHAR):
+        lote = destinos[i:i + LIMITE_ENCAMINHAR]
+        with _ritmo(ritmo, 'midia', logger) as medicao:
+            selecionar_ultimas_mensagens(driver, quantidade, logger=logger)
+
+            def clique(lote=lote):
+                medicao.clique()
+                if ao_enviar:
+                    ao_enviar(lote)
+            encaminhar_selecionadas(driver, lote, logger=logger, ao_enviar=clique)
+            medicao.ack()
+        if ao_confirmar:
+            ao_confirmar(lote)
+        entregues.extend(lote)
+    return entregues
+
+# --------------------------
+# Pré-processamento
+# --------------------------
+def _preprocessar_anexos_job(file_path, task_id=None, logger=None):
+    """
+    Roda o pré-processamento de mídia e grava o relatório no agendamento (se houver task_id).
+    Retorna a nova lista de caminhos a enviar.
+    """
+    from core.preprocessamento import preprocessar_anexos
+
+    paths, relatorio = preprocessar_anexos(
+        normalizar_caminhos(file_path),
+        transcodificar_video=TRANSCODIFICAR_VIDEO,
+        logger=logger
+    )
+    if task_id:
+        try:
+            from core.db import db
+            db.registrar_preprocessamento(task_id, relatorio)
+        except Exception as e:
+            _log(logger, f"Aviso: relatório de pré-processamento não gravado: {e}")
+    return paths
+
+def validar_anexos_job(file_path, mode, logger=None):
+    """
+    Etapa rápida, sem navegador: resolve as referências do armazém e faz o preflight.
+    Falha aqui, antes de gastar 30s+ abrindo o Chrome, se algum anexo não pode ser enviado.
+    """
+    if not file_path or mode not in ("file", "file_text"):
+        return file_path
+
+    # Referências do armazém (cas:...) viram caminhos reais com o nome original
+    file_path = resolver_lista(file_path)
+    exigir_anexos_validos(file_path)
+    _log(logger, "Preflight dos anexos ok.")
+    return file_path
+
+def preprocessar_se_ativo(file_path, mode, task_id=None, preprocessar=None, logger=None):
+    """Etapa pesada e opcional: pré-processa as mídias (roda enquanto o Chrome carrega)."""
+    if preprocessar is None:
+        preprocessar = PREPROCESSAR_MIDIA
+    if not preprocessar or not file_path or mode not in ("file", "file_text"):
+        return file_path
+    return _preprocessar_anexos_job(file_path, task_id=task_id, logger=logger)
+
+def preparar_anexos(file_path, mode, task_id=None, preprocessar=None, logger=None):
+    """
+    Etapa sem navegador completa: resolve, faz o preflight e, se ativado, pré-processa.
+    Retorna os caminhos prontos para upload.
+    """
+    file_path = validar_anexos_job(file_path, mode, logger=logger)
+    return preprocessar_se_ativo(file_path, mode, task_id=task_id, preprocessar=preprocessar, logger=logger)
+
+def unidades_envio(mode, message=None, file_path=None):
+    """Etapas de envio (texto ou lotes) que o job gera, na mesma ordem de enviar_conteudo."""
+    if mode == "text":
+        return [etapa_texto(message)]
+    legenda = message if mode == "file_text" else None
+    return [etapa_lote(i, l) for i, l in enumerate(planejar_lotes(normalizar_caminhos(file_path), legenda))]
+
+def job_ja_enviado(task_id, target, mode, message=None, file_path=None):
+    """
+    Verifica pelas chaves de idempotência, sem abrir o navegador, se todas as
+    unidades de envio do job já foram confirmadas para este destinatário.
+    """
+    from core.db import db
+
+    unidades = unidades_envio(mode, message, file_path)
+    return bool(unidades) and all(
+        db.envio_confirmado(chave_envio(task_id, u, target)) for u in unidades
+    )
+
 # --------------------------
 # Função mestre
 # --------------------------
-def executar_envio(userdir, target, mode, message=None, file_path=None, logger=None, modo_execucao='manual'):
+def enviar_conteudo(driver, mode, message=None, file_path=None, logger=None, checkpoints=None, ritmo=None):
+    """
+    Envia texto e/ou arquivos no chat já aberto, conforme o modo do job.
+    checkpoints: core.checkpoints.Checkpoints do job (opcional) para retomar sem duplicar.
+    ritmo: core.ritmo.RitmoConta da conta (opcional) para espaçar os envios.
+    """
+    if mode == "text":
+        if not message:
+            raise Exception("Modo 'text' selecionado mas nenhuma mensagem fornecida.")
+        etapa = etapa_texto(message)
+        if checkpoints and checkpoints.feito(etapa):
+            _log(logger, "Texto já enviado para este destinatário; pulando.")
+            return True
+        with _ritmo(ritmo, 'texto', logger) as medicao:
+            def ao_enviar():
+                # Só o intervalo clique -> ack alimenta o ritmo (digitação e esperas fixas não)
+                medicao.clique()
+                if checkpoints:
+                    checkpoints.marcar_enviado(etapa)
+            enviar_mensagem_simples(driver, message, logger=logger, ao_enviar=ao_enviar)
+            if not aguardar_confirmacao_envio(driver, prazo_upload(len(message.encode('utf-8'))), logger=logger):
+                raise Exception("Mensagem enviada mas não confirmada pelo WhatsApp (não será reenviada).")
+            medicao.ack()
+        if checkpoints:
+            checkpoints.marcar(etapa)
+    elif mode == "file":
+        if not file_path:
+            raise Exception("Modo 'file' selecionado mas nenhum arquivo fornecido.")
+        enviar_arquivo(driver, file_path, logger=logger, checkpoints=checkpoints, ritmo=ritmo)
+    elif mode == "file_text":
+        if not file_path:
+            raise Exception("Arquivo necessário para modo 'file_text'.")
+        enviar_arquivo_com_mensagem(driver, file_path, message or "", logger=logger, checkpoints=checkpoints,
+                                    ritmo=ritmo)
+    else:
+        raise Exception("Modo desconhecido.")
+    return True
+
+def encerrar_driver(driver, logger=None):
+    """Fecha o Chrome do bot e mata o processo remanescente, se houver."""
+    try:
+        time.sleep(10) 
+        # 1. Captura o PID enquanto o driver ainda está ativo
+        pid_bot = getattr(driver, 'browser_pid', None) 
+        
+        # 2. Tenta o fechamento padrão
+        driver.close()
+        driver.quit()
+        time.sleep(5)
+        
+        # 3. Mata o processo remanescente se ele ainda existir
+        if pid_bot:
+            import psutil
+            if psutil.pid_exists(pid_bot):
+                processo = psutil.Process(pid_bot)
+                processo.terminate()
+        
+        _log(logger, "Driver e processos encerrados com sucesso.")
+    except Exception as e:
+        _log(logger, f"Aviso ao fechar: {e}")
+    finally:
+        # Próximo da fila do perfil só entra com este Chrome fechado
+        trava = getattr(driver, 'trava_perfil', None)
+        if trava:
+            trava.liberar()
+
+def executar_envio(userdir, target, mode, message=None, file_path=None, logger=None, modo_execucao='manual',
+                   task_id=None, preprocessar=None, checkpoints=None):
     """
     Função mestre: inicializa driver, procura contato e decide qual envio executar.
     
     Args:
         mode: 'text', 'file', 'file_text'
         modo_execucao: 'manual' (visível) ou 'auto' (fake headless)
+        task_id: ID do agendamento (opcional), usado para gravar métricas do job
+        preprocessar: reduz as mídias antes do upload (None = usa PREPROCESSAR_MIDIA)
+        checkpoints: progresso durável do job; com task_id é carregado do banco, e uma
+            nova tentativa retoma do último passo confirmado
     """
     driver = None
 
@@ -698,24 +1018,50 @@ def executar_envio(userdir, target, mode, message=None, file_path=None, logger=N
             logger(f'Execução número {vezes_executadas}')
             logger(f'Modo de execução: {modo_execucao}')
 
-        driver = iniciar_driver(userdir=userdir, modo_execucao=modo_execucao, logger=logger)
+        # Etapa 1 (rápida): preflight — se falhar, o Chrome nem é aberto
+        file_path = validar_anexos_job(file_path, mode, logger=logger)
+
+        # Job duplicado (retry ou tarefa disparada duas vezes): tudo já foi entregue.
+        # Com pré-processamento os nomes dos lotes só são conhecidos depois, então a
+        # checagem fica por conta das unidades, durante o envio.
+        pre_ativo = PREPROCESSAR_MIDIA if preprocessar is None else preprocessar
+        if task_id and not (pre_ativo and mode != "text"):
+            if job_ja_enviado(task_id, target, mode, message, file_path):
+                _log(logger, "Todas as partes já foram enviadas para este destinatário; nada a fazer.")
+                return True
+
+        # Etapa 2: preparo pesado (checkpoints no banco, pré-processamento) em threads
+        # enquanto o Chrome sobe e o WhatsApp carrega. O caminho crítico vira
+        # max(navegador, preparo) em vez da soma dos dois.
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="preparo_envio") as pool:
+            futuro_checkpoints = None
+            if checkpoints is None and task_id:
+                futuro_checkpoints = pool.submit(Checkpoints, task_id, target)
+            futuro_anexos = pool.submit(
+                preprocessar_se_ativo, file_path, mode,
+                task_id=task_id, preprocessar=preprocessar, logger=logger
+            )
+
+            driver = iniciar_driver(userdir=userdir, modo_execucao=modo_execucao, logger=logger)
+            if task_id:
+                from core.db import db
+                db.registrar_espera_trava(task_id, driver.espera_trava)
+
+            # Etapa 3: envio começa assim que os dois lados estão prontos
+            if futuro_checkpoints:
+                checkpoints = futuro_checkpoints.result()
+            file_path = futuro_anexos.result()
+
+        if checkpoints and checkpoints.etapas:
+            _log(logger, f"Retomando job: {len(checkpoints.etapas)} etapa(s) já confirmada(s).")
+
         procurar_contato_grupo(driver, target, logger=logger)
         time.sleep(1.0)
+        if checkpoints:
+            checkpoints.marcar("chat_aberto")
 
-        if mode == "text":
-            if not message:
-                raise Exception("Modo 'text' selecionado mas nenhuma mensagem fornecida.")
-            enviar_mensagem_simples(driver, message, logger=logger)
-        elif mode == "file":
-            if not file_path:
-                raise Exception("Modo 'file' selecionado mas nenhum arquivo fornecido.")
-            enviar_arquivo(driver, file_path, logger=logger)
-        elif mode == "file_text":
-            if not file_path:
-                raise Exception("Arquivo necessário para modo 'file_text'.")
-            enviar_arquivo_com_mensagem(driver, file_path, message or "", logger=logger)
-        else:
-            raise Exception("Modo desconhecido.")
+        enviar_conteudo(driver, mode, message, file_path, logger=logger, checkpoints=checkpoints,
+                        ritmo=ritmo_da_conta(userdir))
         return True
     except Exception as e:
         _log(logger, f"Erro em executar_envio: {str(e)}")
@@ -725,23 +1071,136 @@ def executar_envio(userdir, target, mode, message=None, file_path=None, logger=N
 
     finally:
         if driver:
-            try:
-                time.sleep(10) 
-                # 1. Captura o PID enquanto o driver ainda está ativo
-                pid_bot = getattr(driver, 'browser_pid', None) 
-                
-                # 2. Tenta o fechamento padrão
-                driver.close()
-                driver.quit()
-                time.sleep(5)
-                
-                # 3. Mata o processo remanescente se ele ainda existir
-                if pid_bot:
-                    import psutil
-                    if psutil.pid_exists(pid_bot):
-                        processo = psutil.Process(pid_bot)
-                        processo.terminate()
-                
-                _log(logger, "Driver e processos encerrados com sucesso.")
-            except Exception as e:
-                _log(logger, f"Aviso ao fechar: {e}")
\ No newline at end of file
+            encerrar_driver(driver, logger=logger)
+
+# --------------------------
+# Sessão: vários jobs no mesmo navegador
+# --------------------------
+def driver_ativo(driver):
+    """True se o Chrome do driver ainda responde."""
+    try:
+        driver.title
+        return True
+    except Exception:
+        return False
+
+def enviar_job_na_sessao(driver, target, mode, message=None, file_path=None, logger=None,
+                         task_id=None, preprocessar=None, chat_atual=None, ritmo=None):
+    """
+    Envia um job num navegador já aberto (sem iniciar nem encerrar o Chrome).
+    A conversa só é reaberta se o destino for diferente de `chat_atual`.
+    ritmo: core.ritmo.RitmoConta da conta da sessão.
+
+    Returns:
+        str: destino cuja conversa ficou aberta
+    """
+    file_path = validar_anexos_job(file_path, mode, logger=logger)
+
+    pre_ativo = PREPROCESSAR_MIDIA if preprocessar is None else preprocessar
+    if task_id and not (pre_ativo and mode != "text"):
+        if job_ja_enviado(task_id, target, mode, message, file_path):
+            _log(logger, "Todas as partes já foram enviadas para este destinatário; nada a fazer.")
+            return chat_atual
+
+    checkpoints = Checkpoints(task_id, target) if task_id else None
+    file_path = preprocessar_se_ativo(file_path, mode, task_id=task_id, preprocessar=preprocessar, logger=logger)
+
+    _abrir_conversa(driver, target, chat_atual, logger=logger)
+    if checkpoints:
+        checkpoints.marcar("chat_aberto")
+
+    enviar_conteudo(driver, mode, message, file_path, logger=logger, checkpoints=checkpoints, ritmo=ritmo)
+    return target
+
+def _abrir_conversa(driver, target, chat_atual=None, logger=None):
+    """Abre a conversa de `target`, a menos que ela já seja a `chat_atual` da sessão."""
+    if chat_atual is not None and chat_atual.strip().lower() == target.strip().lower():
+        _log(logger, f"Conversa com '{target}' já aberta; reaproveitando.")
+        return
+    procurar_contato_grupo(driver, target, logger=logger)
+    time.sleep(1.0)
+
+# --------------------------
+# Fan-out: envia uma vez, encaminha para muitos
+# --------------------------
+def enviar_fanout_na_sessao(driver, jobs, mode, message=None, file_path=None, logger=None,
+                            preprocessar=None, chat_atual=None, ritmo=None, ao_entregar=None):
+    """
+    Entrega o mesmo conteúdo com anexos a vários jobs (um destino cada) com um único upload:
+    o primeiro destino recebe o upload e os demais recebem pelo 'Encaminhar' do WhatsApp Web,
+    em grupos de LIMITE_ENCAMINHAR, em vez de subir os mesmos bytes para cada destino.
+
+    Cada job segue com os próprios checkpoints e chaves de envio (core/checkpoints.py): as
+    unidades de um destino são gravadas como enviadas logo depois do clique que o encaminha,
+    então uma nova tentativa depois de uma queda nunca reencaminha para quem já recebeu.
+    Destino que já recebeu parte do conteúdo numa tentativa anterior não entra no
+    encaminhamento (receberia tudo de novo): completa pelo envio normal, que pula o que foi feito.
+
+    Args:
+        jobs: lista de (task_id, target), já reivindicados
+        ao_entregar: chamado com o task_id assim que todas as unidades do job estão confirmadas
+    Returns:
+        str: destino cuja conversa ficou aberta
+    """
+    if mode not in ("file", "file_text"):
+        raise Exception("Fan-out só se aplica a envios com arquivo.")
+    ao_entregar = ao_entregar or (lambda task_id: None)
+
+    # Um preparo (preflight + pré-processamento) para todos os destinos
+    file_path = preparar_anexos(file_path, mode, task_id=jobs[0][0], preprocessar=preprocessar, logger=logger)
+    legenda = message if mode == "file_text" else None
+    lotes = planejar_lotes(normalizar_caminhos(file_path), legenda)
+    if not lotes:
+        raise Exception("Nenhum arquivo válido para enviar.")
+    unidades = [etapa_lote(i, l) for i, l in enumerate(lotes)]
+    checkpoints = {task_id: Checkpoints(task_id, target) for task_id, target in jobs}
+
+    novos, parciais = [], []
+    for task_id, target in jobs:
+        feitas = sum(1 for u in unidades if checkpoints[task_id].feito(u))
+        if feitas == len(unidades):
+            _log(logger, f"Todas as partes já foram enviadas para '{target}'; nada a fazer.")
+            ao_entregar(task_id)
+        else:
+            (parciais if feitas else novos).append((task_id, target))
+
+    for task_id, target in parciais:
+        _abrir_conversa(driver, target, chat_atual, logger=logger)
+        chat_atual = target
+        enviar_conteudo(driver, mode, message, file_path, logger=logger, checkpoints=checkpoints[task_id],
+                        ritmo=ritmo)
+        ao_entregar(task_id)
+
+    if not novos:
+        return chat_atual
+
+    origem_id, origem = novos[0]
+    _abrir_conversa(driver, origem, chat_atual, logger=logger)
+    chat_atual = origem
+    enviar_conteudo(driver, mode, message, file_path, logger=logger, checkpoints=checkpoints[origem_id],
+                    ritmo=ritmo)
+    ao_entregar(origem_id)
+
+    restantes = dict((target, task_id) for task_id, target in novos[1:])
+    if not restantes:
+        return chat_atual
+    quantidade = contar_mensagens_lote(lotes)
+    _log(logger, f"Fan-out: upload único em '{origem}' ({quantidade} mensagem(ns)), "
+                 f"encaminhando para {len(restantes)} destino(s).")
+
+    def ao_enviar(destinos):
+        for destino in destinos:
+            for u in unidades:
+                checkpoints[restantes[destino]].marcar_enviado(u)
+
+    def ao_confirmar(destinos):
+        for destino in destinos:
+            task_id = restantes[destino]
+            for u in unidades:
+                checkpoints[task_id].marcar(u)
+            ao_entregar(task_id)
+
+    encaminhar_para_muitos(driver, quantidade, list(restantes), logger=logger,
+                           ao_enviar=ao_enviar, ao_confirmar=ao_confirmar, ritmo=ritmo)
+    # O encaminhamento fecha o diálogo e volta para a conversa de origem
+    return chat_atual
@@ -0,0 +1,96 @@
+import os
+import hashlib
+
+# =============================
+# CHECKPOINTS DE EXECUÇÃO
+# =============================
+# Cada etapa confirmada de um job fica gravada no banco (tabela checkpoints):
+#   chat_aberto            conversa aberta no WhatsApp
+#   texto:0:<assinatura>   mensagem de texto enviada
+#   lote:<n>:<assinatura>  n-ésimo lote de anexos enviado e confirmado
+#   enviado:<unidade>      clique em enviar dado, ack do WhatsApp ainda não visto
+# Se o job falha no meio, a próxima tentativa pula as etapas já confirmadas
+# em vez de reenviar (e duplicar) o que o destinatário já recebeu.
+#
+# As etapas de texto e lote são unidades de envio: além do checkpoint, cada uma tem
+# uma chave de idempotência (job, parte, destinatário) gravada na tabela
+# envios_confirmados, consultada logo antes de enviar. Isso cobre o mesmo job
+# disparado duas vezes (tarefa do Windows duplicada, app.py --auto + executor_cli.py).
+#
+# A unidade é gravada como "enviado" (checkpoint + chave) logo depois do clique, antes de
+# esperar o ack: num link lento a mensagem sai mesmo que o ack não venha a tempo, e uma
+# nova tentativa nunca reenvia uma unidade nesse estado.
+
+
+def _assinatura(texto):
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:12]
+
+
+def etapa_texto(message, indice=0):
+    """Etapa de uma parte de texto; a assinatura muda se o texto mudar."""
+    return f"texto:{indice}:{_assinatura(message or '')}"
+
+
+def etapa_lote(indice, lote):
+    """Etapa de um lote; a assinatura muda se os arquivos do lote mudarem."""
+    nomes = "\n".join(os.path.basename(a) for a in lote['arquivos']) + "\n" + (lote.get('legenda') or "")
+    return f"lote:{indice}:{_assinatura(nomes)}"
+
+
+def etapa_enviada(etapa):
+    """Checkpoint de uma unidade cujo envio foi disparado mas não confirmado."""
+    return f"enviado:{etapa}"
+
+
+def eh_unidade_envio(etapa):
+    return etapa.startswith(("texto:", "lote:"))
+
+
+def chave_envio(task_id, parte, destinatario):
+    """Chave de idempotência de uma unidade de envio."""
+    bruto = f"{task_id}|{parte}|{(destinatario or '').strip().lower()}"
+    return hashlib.sha256(bruto.encode('utf-8')).hexdigest()
+
+
+class Checkpoints:
+    """
+    Progresso durável de um job. Carrega as etapas já confirmadas ao ser criado
+    e grava cada nova etapa assim que ela é confirmada.
+    Com `destinatario`, as unidades de envio também passam pela chave de idempotência.
+    """
+
+    def __init__(self, task_id, destinatario=None, db=None):
+        if db is None:
+            from core.db import db
+        self.task_id = task_id
+        self.destinatario = destinatario
+        self.db = db
+        self.etapas = set(db.listar_checkpoints(task_id))
+
+    def feito(self, etapa):
+        """True se a etapa foi confirmada ou, para unidades de envio, ao menos disparada."""
+        if etapa in self.etapas or etapa_enviada(etapa) in self.etapas:
+            return True
+        # Consulta fresca: outro processo pode ter enviado depois que carregamos as etapas
+        if self.destinatario and eh_unidade_envio(etapa):
+            return self.db.envio_confirmado(chave_envio(self.task_id, etapa, self.destinatario))
+        return False
+
+    def marcar_enviado(self, etapa):
+        """Unidade disparada (clique em enviar): daqui em diante não é mais reenviada."""
+        self.marcar(etapa_enviada(etapa))
+        if self.destinatario:
+            self.db.registrar_envio(
+                chave_envio(self.task_id, etapa, self.destinatario),
+                self.task_id, etapa, self.destinatario
+            )
+
+    def marcar(self, etapa):
+        if etapa not in self.etapas:
+            self.db.registrar_checkpoint(self.task_id, etapa)
+            self.etapas.add(etapa)
+        if self.destinatario and eh_unidade_envio(etapa):
+            self.db.registrar_envio(
+                chave_envio(self.task_id, etapa, self.destinatario),
+                self.task_id, etapa, self.destinatario
+            )
@@ -1,7 +1,12 @@
+import re
 import sqlite3
 import os
 import sys
+import queue
 import datetime
+import functools
+import threading
+from concurrent.futures import Future
 from typing import List, Tuple, Optional
 from pathlib import Path
 
@@ -19,6 +24,95 @@ DB_PATH = DATA_DIR / "scheduler.db"
 # Garante que diretório existe
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+# scheduled_time é hora local em ISO; o 'utc' converte para epoch como datetime.timestamp()
+EPOCH_SQL = "CAST(strftime('%s', {}, 'utc') AS INTEGER)"
+# Vencimento de um job em epoch; {novo} é 'NEW.' dentro dos triggers
+VENCIMENTO_SQL = ("COALESCE(" + EPOCH_SQL.format("{novo}proxima_tentativa") + ", "
+                  + EPOCH_SQL.format("{novo}scheduled_time") + ")")
+# Tamanho padrão de uma página do histórico (listar_pagina)
+PAGINA_HISTORICO = 100
+
+# =============================
+# CONEXÕES
+# =============================
+# Cada thread (GUI, serviço, workers) usa uma conexão de longa duração, aberta uma vez e
+# reaproveitada: o cache de comandos preparados do sqlite3 (CACHE_COMANDOS) passa a valer
+# entre chamadas. O banco fica em WAL: quem lê (o poll da GUI) não bloqueia quem grava e vice-versa.
+#
+# Toda escrita (métodos marcados com @_escrita) vai para uma única thread escritora, que junta
+# o que chegou na fila (até LOTE_ESCRITA operações) numa só transação. Cada operação roda num
+# SAVEPOINT: uma que falha é desfeita sozinha, sem derrubar as outras do lote. Quem chamou
+# recebe o retorno (ou a exceção) só depois do COMMIT.
+TIMEOUT_CONEXAO = 30
+CACHE_COMANDOS = 256
+LOTE_ESCRITA = 64
+PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",   # seguro em WAL; o fsync fica para o checkpoint
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",    # ~16 MB por conexão
+)
+
+
+class _Conexao:
+    """
+    Conexão da thread, com a interface que os métodos do SchedulerDB já usam
+    (cursor/commit/rollback/close/row_factory). close() não fecha a conexão: só encerra os
+    cursores e desfaz o que não foi confirmado, como acontecia ao fechar uma conexão avulsa.
+    Dentro do lote da thread escritora, commit() fica para o fim do lote e rollback()
+    desfaz só a operação atual (ROLLBACK TO do savepoint).
+    """
+
+    def __init__(self, conn, em_lote=False):
+        self._conn = conn
+        self._em_lote = em_lote
+        self._cursores = []
+        self._confirmado = conn.total_changes
+        self.row_factory = None
+
+    def cursor(self):
+        cur = self._conn.cursor()
+        cur.row_factory = self.row_factory
+        self._cursores.append(cur)
+        return cur
+
+    def execute(self, sql, params=()):
+        cur = self.cursor()
+        cur.execute(sql, params)
+        return cur
+
+    def commit(self):
+        if not self._em_lote:
+            self._conn.commit()
+        self._confirmado = self._conn.total_changes
+
+    def rollback(self):
+        if self._em_lote:
+            self._conn.execute("ROLLBACK TO operacao")
+        else:
+            self._conn.rollback()
+        self._confirmado = self._conn.total_changes
+
+    def close(self):
+        for cur in self._cursores:
+            cur.close()
+        self._cursores = []
+        if self._em_lote:
+            if self._conn.total_changes != self._confirmado:
+                self._conn.execute("ROLLBACK TO operacao")
+        elif self._conn.in_transaction:
+            self._conn.rollback()
+
+    def __getattr__(self, nome):
+        return getattr(self._conn, nome)
+
+
+def _escrita(metodo):
+    """Marca um método do SchedulerDB que grava: ele roda na thread escritora."""
+    @functools.wraps(metodo)
+    def envolvido(self, *args, **kwargs):
+        return self._enfileirar(lambda: metodo(self, *args, **kwargs))
+    return envolvido
+
 
 class SchedulerDB:
     """
@@ -33,37 +127,150 @@ class SchedulerDB:
     - file_path: Caminho do arquivo (opcional)
     - scheduled_time: Data/hora agendada (ISO format)
     - created_at: Data/hora de criação
-    - status: Estado atual ('pending', 'running', 'completed', 'failed')
+    - status: Estado atual ('pending', 'running', 'completed', 'failed', 'cancelled', 'dead_letter', 'missed')
     - json_path: Caminho do JSON de instrução
     - executed_at: Data/hora de execução
     - error_message: Mensagem de erro
+    - bytes_originais / bytes_processados: Tamanho dos anexos antes/depois do pré-processamento
+    - segundos_economizados: Tempo de upload economizado pelo pré-processamento
+    - recorrencia_id: Regra (tabela recorrencias) que gerou esta ocorrência, se houver
+    - tentativas / max_tentativas: Falhas até agora e limite do job (ver core/retentativas.py)
+    - proxima_tentativa: Quando o job falho volta a ser disparado (None = scheduled_time)
+    - espera_trava: Segundos que o job esperou pela trava do perfil do Chrome (core/trava_perfil.py)
+    - lease_dono / lease_ate: Executor que está rodando o job e até quando (core/lease.py);
+      num job 'pending', a reserva do despacho que vai enviá-lo (ver reservar)
+    - scheduled_epoch: scheduled_time em segundos (epoch), mantido por trigger; chave dos índices
+    - vencimento_epoch: vencimento do job (proxima_tentativa ou scheduled_time) em epoch, mantido
+      por trigger; chave do índice que o despacho (reivindicar/listar_vencimentos) percorre
     """
 
+    STATUS = ('pending', 'running', 'completed', 'failed', 'cancelled', 'dead_letter', 'missed')
+    JOURNAL_MODE = "WAL"
+
     def __init__(self, db_path: Path = DB_PATH):
         self.db_path = db_path
+        self._local = threading.local()
+        self._fila_escrita = queue.Queue()
+        self._escritor = None
+        self._lock_escritor = threading.Lock()
         self._init_db()
 
-    def _get_conn(self):
+    def _conexao_thread(self):
         """
-        Cria conexão com timeout maior para evitar locks.
+        Conexão de longa duração desta thread (aberta na primeira chamada).
         
         Configurações importantes:
-        - timeout=30: Aguarda até 30s se banco estiver locked
-        - check_same_thread=False: Permite uso em diferentes threads
+        - timeout=30: Aguarda até 30s se banco estiver locked (outro processo gravando)
+        - cached_statements: comandos preparados reaproveitados entre chamadas
         - PARSE_DECLTYPES: Converte tipos automaticamente
         """
-        return sqlite3.connect(
-            str(self.db_path),
-            timeout=30,
-            detect_types=sqlite3.PARSE_DECLTYPES,
-            check_same_thread=False
-        )
+        conn = getattr(self._local, 'conn', None)
+        # Processo filho (fork) não reaproveita a conexão do pai
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(
+                str(self.db_path),
+                timeout=TIMEOUT_CONEXAO,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                check_same_thread=False,
+                cached_statements=CACHE_COMANDOS
+            )
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _get_conn(self):
+        """Conexão da thread atual (ver _Conexao: close() não fecha de verdade)."""
+        return _Conexao(self._conexao_thread(), em_lote=getattr(self._local, 'em_lote', False))
+
+    # =============================
+    # THREAD ESCRITORA
+    # =============================
+    def _enfileirar(self, funcao):
+        """Roda `funcao` na thread escritora e devolve o retorno dela (ou levanta a exceção)."""
+        if getattr(self._local, 'escritor', False):
+            # Escrita chamada de dentro de outra (ex.: registrar_erro -> atualizar_status)
+            return funcao()
+        with self._lock_escritor:
+            if self._escritor is None or not self._escritor.is_alive():
+                self._escritor = threading.Thread(target=self._loop_escritor, name="db_escritor", daemon=True)
+                self._escritor.start()
+        futuro = Future()
+        self._fila_escrita.put((funcao, futuro))
+        return futuro.result()
+
+    def _loop_escritor(self):
+        self._local.escritor = True
+        while True:
+            item = self._fila_escrita.get()
+            if item is None:
+                break
+            lote = [item]
+            while len(lote) < LOTE_ESCRITA:
+                try:
+                    item = self._fila_escrita.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._fila_escrita.put(None)
+                    break
+                lote.append(item)
+            self._gravar_lote(lote)
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+
+    def _gravar_lote(self, lote):
+        """Uma transação para o lote inteiro, um savepoint por operação."""
+        conn = self._conexao_thread()
+        resultados = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for funcao, futuro in lote:
+                conn.execute("SAVEPOINT operacao")
+                self._local.em_lote = True
+                try:
+                    resultados.append((futuro, funcao(), None))
+                except BaseException as e:
+                    conn.execute("ROLLBACK TO operacao")
+                    resultados.append((futuro, None, e))
+                finally:
+                    self._local.em_lote = False
+                    conn.execute("RELEASE operacao")
+            conn.commit()
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            for _, futuro in lote:
+                futuro.set_exception(e)
+            return
+        for futuro, retorno, erro in resultados:
+            if erro is not None:
+                futuro.set_exception(erro)
+            else:
+                futuro.set_result(retorno)
+
+    def fechar(self):
+        """Espera as escritas pendentes, para a thread escritora e fecha a conexão desta thread."""
+        with self._lock_escritor:
+            escritor, self._escritor = self._escritor, None
+        if escritor is not None and escritor.is_alive():
+            self._fila_escrita.put(None)
+            escritor.join()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
 
     def _init_db(self):
         """Cria tabela se não existir"""
         conn = self._get_conn()
         cur = conn.cursor()
         
+        # WAL fica gravado no arquivo: só a primeira abertura converte o banco
+        cur.execute(f"PRAGMA journal_mode = {self.JOURNAL_MODE}")
+        
         cur.execute("""
         CREATE TABLE IF NOT EXISTS agendamentos (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -75,21 +282,204 @@ class SchedulerDB:
             scheduled_time TEXT NOT NULL,
             created_at TEXT NOT NULL,
             status TEXT DEFAULT 'pending' 
-                CHECK (status IN ('pending', 'running', 'completed', 'failed', 'cancelled')),
+                CHECK (status IN ('pending', 'running', 'completed', 'failed', 'cancelled', 'dead_letter', 'missed')),
             json_path TEXT,
             executed_at TEXT,
             error_message TEXT
         )
         """)
+
+        # Etapas já confirmadas de cada job, para retomar sem reenviar (ver core/checkpoints.py)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS checkpoints (
+            task_id INTEGER NOT NULL,
+            etapa TEXT NOT NULL,
+            criado_em TEXT NOT NULL,
+            PRIMARY KEY (task_id, etapa)
+        )
+        """)
+
+        # Unidades de envio (job, parte, destinatário) já confirmadas pelo WhatsApp.
+        # O índice único garante que a mesma chave nunca é registrada duas vezes,
+        # mesmo com app.py --auto, executor_cli.py e a GUI rodando o mesmo job.
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS envios_confirmados (
+            chave TEXT NOT NULL,
+            task_id INTEGER NOT NULL,
+            parte TEXT NOT NULL,
+            destinatario TEXT NOT NULL,
+            confirmado_em TEXT NOT NULL
+        )
+        """)
+        cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_envios_confirmados_chave
+        ON envios_confirmados (chave)
+        """)
+
+        # Regras de agendamento recorrente (ver core/recorrencia.py)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS recorrencias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            target TEXT NOT NULL,
+            mode TEXT NOT NULL CHECK (mode IN ('text', 'file', 'file_text')),
+            message TEXT,
+            file_path TEXT,
+            frequencia TEXT NOT NULL CHECK (frequencia IN ('diaria', 'semanal', 'mensal')),
+            intervalo INTEGER NOT NULL DEFAULT 1,
+            dias_semana TEXT,
+            hora TEXT NOT NULL,
+            inicio TEXT NOT NULL,
+            fim TEXT,
+            excecoes TEXT,
+            ativa INTEGER NOT NULL DEFAULT 1,
+            materializado_ate TEXT,
+            created_at TEXT NOT NULL
+        )
+        """)
+
+        # Decisões da recuperação de jobs atrasados (ver core/recuperacao.py)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS recuperacoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            scheduled_time TEXT NOT NULL,
+            atraso_segundos REAL NOT NULL,
+            decisao TEXT NOT NULL CHECK (decisao IN ('executar', 'perdido')),
+            gatilho TEXT NOT NULL,
+            decidido_em TEXT NOT NULL
+        )
+        """)
+
+        self._migrar(cur)
+
+        # scheduled_epoch acompanha o scheduled_time (hora local -> epoch) em qualquer INSERT/UPDATE,
+        # venha de onde vier; as linhas antigas são preenchidas aqui uma vez
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_agendamentos_epoch_insert
+        AFTER INSERT ON agendamentos WHEN NEW.scheduled_epoch IS NULL
+        BEGIN
+            UPDATE agendamentos SET scheduled_epoch = {EPOCH_SQL.format('NEW.scheduled_time')} WHERE id = NEW.id;
+        END
+        """)
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_agendamentos_epoch_update
+        AFTER UPDATE OF scheduled_time ON agendamentos
+        BEGIN
+            UPDATE agendamentos SET scheduled_epoch = {EPOCH_SQL.format('NEW.scheduled_time')} WHERE id = NEW.id;
+        END
+        """)
+        cur.execute(f"""
+        UPDATE agendamentos SET scheduled_epoch = {EPOCH_SQL.format('scheduled_time')}
+        WHERE scheduled_epoch IS NULL
+        """)
+
+        # vencimento_epoch idem, para o vencimento: a retentativa (proxima_tentativa) manda, se houver
+        vencimento = VENCIMENTO_SQL.format(novo='NEW.')
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_agendamentos_vencimento_insert
+        AFTER INSERT ON agendamentos
+        BEGIN
+            UPDATE agendamentos SET vencimento_epoch = {vencimento} WHERE id = NEW.id;
+        END
+        """)
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_agendamentos_vencimento_update
+        AFTER UPDATE OF scheduled_time, proxima_tentativa ON agendamentos
+        BEGIN
+            UPDATE agendamentos SET vencimento_epoch = {vencimento} WHERE id = NEW.id;
+        END
+        """)
+        cur.execute(f"""
+        UPDATE agendamentos SET vencimento_epoch = {VENCIMENTO_SQL.format(novo='')}
+        WHERE vencimento_epoch IS NULL
+        """)
+
+        # Pendentes/atrasados/histórico por status: (status, horário, id) cobre o filtro e a ordem.
+        # O índice parcial de pendentes fica coberto por este.
+        cur.execute("DROP INDEX IF EXISTS idx_agendamentos_pendentes")
+        cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_agendamentos_status_horario
+        ON agendamentos (status, scheduled_epoch, id)
+        """)
+        # Despacho: pendentes por vencimento, na ordem em que serão enviados
+        cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_agendamentos_vencimento
+        ON agendamentos (status, vencimento_epoch, id)
+        """)
+        # Histórico sem filtro de status, paginado por (horário, id)
+        cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_agendamentos_horario
+        ON agendamentos (scheduled_epoch, id)
+        """)
+
+        # Uma ocorrência de cada regra por horário, mesmo com materializações concorrentes
+        cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_agendamentos_ocorrencia
+        ON agendamentos (recorrencia_id, scheduled_time)
+        WHERE recorrencia_id IS NOT NULL
+        """)
         
         conn.commit()
         conn.close()
         
         print(f"✓ Database inicializado: {self.db_path}")
 
+    # Colunas adicionadas depois da criação da tabela (bancos antigos recebem via ALTER TABLE)
+    COLUNAS_EXTRAS = {
+        'bytes_originais': 'INTEGER',
+        'bytes_processados': 'INTEGER',
+        'segundos_economizados': 'REAL',
+        'recorrencia_id': 'INTEGER',
+        'tentativas': 'INTEGER DEFAULT 0',
+        'max_tentativas': 'INTEGER',
+        'proxima_tentativa': 'TEXT',
+        'espera_trava': 'REAL',
+        'lease_dono': 'TEXT',
+        'lease_ate': 'TEXT',
+        'scheduled_epoch': 'INTEGER',
+        'vencimento_epoch': 'INTEGER',
+    }
+
+    def _migrar(self, cur):
+        """Adiciona as colunas novas que ainda não existem no banco."""
+        cur.execute("PRAGMA table_info(agendamentos)")
+        existentes = {row[1] for row in cur.fetchall()}
+        for coluna, tipo in self.COLUNAS_EXTRAS.items():
+            if coluna not in existentes:
+                cur.execute(f"ALTER TABLE agendamentos ADD COLUMN {coluna} {tipo}")
+        self._migrar_status(cur)
+
+    def _migrar_status(self, cur):
+        """
+        Bancos antigos têm um CHECK de status sem os estados novos. O SQLite não altera
+        CHECK com ALTER TABLE: a tabela é recriada com o CHECK atual e os dados copiados,
+        na mesma transação (índices e triggers da tabela são recriados depois, em _init_db).
+        """
+        cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'agendamentos'")
+        sql = cur.fetchone()[0]
+        lista = ", ".join(f"'{s}'" for s in self.STATUS)
+        novo = re.sub(r"status IN \([^)]*\)", f"status IN ({lista})", sql, count=1)
+        if novo == sql:
+            return
+
+        if not cur.connection.in_transaction:
+            cur.execute("BEGIN")
+        cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'agendamentos'")
+        seq = cur.fetchone()
+        cur.execute(novo.replace("agendamentos", "agendamentos_migracao", 1))
+        cur.execute("INSERT INTO agendamentos_migracao SELECT * FROM agendamentos")
+        cur.execute("DROP TABLE agendamentos")
+        cur.execute("ALTER TABLE agendamentos_migracao RENAME TO agendamentos")
+        if seq:
+            # IDs de jobs excluídos não são reaproveitados
+            cur.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'agendamentos'", seq)
+        print("✓ Banco migrado: novos status de agendamento")
+
     # =============================
     # CREATE
     # =============================
+    @_escrita
     def adicionar(
         self,
         task_name: str,
@@ -98,7 +488,8 @@ class SchedulerDB:
         scheduled_time: datetime.datetime,
         message: Optional[str] = None,
         file_path: Optional[str] = None,
-        json_path: Optional[str] = None
+        json_path: Optional[str] = None,
+        max_tentativas: Optional[int] = None
     ) -> int:
         """
         Adiciona novo agendamento.
@@ -113,9 +504,9 @@ class SchedulerDB:
             cur.execute("""
                 INSERT INTO agendamentos (
                     task_name, target, mode, message, file_path,
-                    scheduled_time, created_at, json_path, status
+                    scheduled_time, created_at, json_path, status, max_tentativas
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending')
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?)
             """, (
                 task_name,
                 target,
@@ -124,7 +515,8 @@ class SchedulerDB:
                 file_path,
                 scheduled_time.isoformat(),
                 datetime.datetime.now().isoformat(),
-                json_path
+                json_path,
+                max_tentativas
             ))
             
             conn.commit()
@@ -140,12 +532,57 @@ class SchedulerDB:
         finally:
             conn.close()
 
+    @_escrita
+    def adicionar_lote(self, linhas) -> Tuple[int, List[Tuple[int, str]]]:
+        """
+        Insere vários agendamentos numa única transação, cada linha no seu SAVEPOINT:
+        uma linha que o banco recusa (task_name repetido, CHECK...) é desfeita sozinha
+        e relatada, sem derrubar as outras.
+
+        Args:
+            linhas: lista de dicts com task_name, target, mode, message, file_path, scheduled_time
+                    (e max_tentativas, opcional)
+        Returns:
+            tuple: (quantidade inserida, [(índice da linha em `linhas`, erro)])
+        """
+        conn = self._get_conn()
+        cur = conn.cursor()
+        agora = datetime.datetime.now().isoformat()
+        inseridos, falhas = 0, []
+        try:
+            for i, l in enumerate(linhas):
+                cur.execute("SAVEPOINT linha")
+                try:
+                    cur.execute("""
+                        INSERT INTO agendamentos (
+                            task_name, target, mode, message, file_path,
+                            scheduled_time, created_at, status, max_tentativas
+                        )
+                        VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?)
+                    """, (l['task_name'], l['target'], l['mode'], l.get('message'), l.get('file_path'),
+                          l['scheduled_time'].isoformat(), agora, l.get('max_tentativas')))
+                    inseridos += 1
+                except sqlite3.Error as e:
+                    cur.execute("ROLLBACK TO linha")
+                    falhas.append((i, f"não gravado no banco: {e}"))
+                finally:
+                    cur.execute("RELEASE linha")
+            conn.commit()
+            print(f"✓ {inseridos} agendamento(s) criados em lote")
+            return inseridos, falhas
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
     # =============================
     # READ
     # =============================
     def listar_todos(self) -> List[Tuple]:
         """
         Lista TODOS os agendamentos (qualquer status).
+        Para o histórico na GUI, prefira listar_pagina: esta lê a tabela inteira.
         
         Returns:
             List[Tuple]: Lista de tuplas com dados resumidos
@@ -158,7 +595,7 @@ class SchedulerDB:
                 id, task_name, target, mode, 
                 scheduled_time, status, created_at
             FROM agendamentos
-            ORDER BY scheduled_time DESC
+            ORDER BY scheduled_epoch DESC, id DESC
         """)
         
         rows = cur.fetchall()
@@ -166,6 +603,67 @@ class SchedulerDB:
         
         return rows
 
+    def listar_pagina(
+        self,
+        status=None,
+        de: Optional[datetime.datetime] = None,
+        ate: Optional[datetime.datetime] = None,
+        apos: Optional[Tuple[int, int]] = None,
+        limite: int = PAGINA_HISTORICO,
+        crescente: bool = False
+    ) -> Tuple[List[Tuple], Optional[Tuple[int, int]]]:
+        """
+        Uma página do histórico, paginada por keyset (horário, id): cada página é uma busca
+        no índice a partir do cursor da anterior, sem OFFSET, e custa o mesmo na primeira
+        página ou na milésima.
+        
+        Args:
+            status: um status ou uma lista deles (None = todos)
+            de / ate: só agendamentos com scheduled_time em [de, ate)
+            apos: cursor devolvido pela página anterior (None = primeira página)
+            limite: linhas por página
+            crescente: do mais antigo para o mais novo (padrão: mais novo primeiro, como listar_todos)
+        Returns:
+            tuple: (linhas no formato de listar_todos, cursor da próxima página ou None se acabou)
+        """
+        filtros, params = [], []
+        if isinstance(status, str):
+            filtros.append("status = ?")
+            params.append(status)
+        elif status:
+            filtros.append(f"status IN ({','.join('?' * len(status))})")
+            params.extend(status)
+        if de is not None:
+            filtros.append("scheduled_epoch >= ?")
+            params.append(int(de.timestamp()))
+        if ate is not None:
+            filtros.append("scheduled_epoch < ?")
+            params.append(int(ate.timestamp()))
+        if apos is not None:
+            filtros.append(f"(scheduled_epoch, id) {'>' if crescente else '<'} (?, ?)")
+            params.extend(apos)
+        where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+        direcao = "ASC" if crescente else "DESC"
+        
+        conn = self._get_conn()
+        cur = conn.cursor()
+        
+        cur.execute(f"""
+            SELECT 
+                id, task_name, target, mode, 
+                scheduled_time, status, created_at, scheduled_epoch
+            FROM agendamentos
+            {where}
+            ORDER BY scheduled_epoch {direcao}, id {direcao}
+            LIMIT ?
+        """, params + [limite])
+        
+        rows = cur.fetchall()
+        conn.close()
+        
+        cursor = (rows[-1][7], rows[-1][0]) if len(rows) == limite else None
+        return [row[:7] for row in rows], cursor
+
     def listar_pendentes(self) -> List[Tuple]:
         """
         Lista apenas agendamentos PENDENTES.
@@ -182,7 +680,28 @@ class SchedulerDB:
                 file_path, scheduled_time, json_path
             FROM agendamentos
             WHERE status = 'pending'
-            ORDER BY scheduled_time ASC
+            ORDER BY scheduled_epoch ASC, id ASC
+        """)
+        
+        rows = cur.fetchall()
+        conn.close()
+        
+        return rows
+
+    def listar_vencimentos(self) -> List[Tuple]:
+        """
+        (id, vencimento) dos agendamentos PENDENTES, usado pelo serviço de agendamento.
+        O vencimento é a proxima_tentativa de um job reagendado pela política de retentativas,
+        ou o scheduled_time.
+        """
+        conn = self._get_conn()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            SELECT id, COALESCE(proxima_tentativa, scheduled_time)
+            FROM agendamentos
+            WHERE status = 'pending'
+            ORDER BY vencimento_epoch, id
         """)
         
         rows = cur.fetchall()
@@ -190,6 +709,67 @@ class SchedulerDB:
         
         return rows
     
+    def listar_atrasados(self, agora: datetime.datetime) -> List[Tuple]:
+        """
+        (id, scheduled_time, vencimento) dos pendentes cujo vencimento já passou,
+        numa consulta pelo índice (status, vencimento_epoch).
+        """
+        conn = self._get_conn()
+        cur = conn.cursor()
+        
+        # O filtro por vencimento_epoch usa o índice; o COALESCE (ISO, com frações de segundo)
+        # dá o corte exato dentro do último segundo
+        cur.execute("""
+            SELECT id, scheduled_time, COALESCE(proxima_tentativa, scheduled_time)
+            FROM agendamentos
+            WHERE status = 'pending' AND vencimento_epoch <= ?
+            AND COALESCE(proxima_tentativa, scheduled_time) < ?
+            ORDER BY vencimento_epoch ASC, id ASC
+        """, (int(agora.timestamp()), agora.isoformat()))
+        
+        rows = cur.fetchall()
+        conn.close()
+        
+        return rows
+
+    def listar_anexos_ativos(self) -> List[str]:
+        """
+        Lista o file_path dos agendamentos que ainda podem ser enviados
+        (usado pela coleta de lixo do armazém de anexos).
+        """
+        conn = self._get_conn()
+        cur = conn.cursor()
+        
+        # Regras ativas também seguram os anexos das ocorrências futuras
+        cur.execute("""
+            SELECT file_path FROM agendamentos
+            WHERE status IN ('pending', 'running', 'failed', 'dead_letter', 'missed')
+            AND file_path IS NOT NULL
+            UNION
+            SELECT file_path FROM recorrencias
+            WHERE ativa = 1 AND file_path IS NOT NULL
+        """)
+        
+        rows = [row[0] for row in cur.fetchall()]
+        conn.close()
+        
+        return rows
+    
+    def task_names_existentes(self, nomes: List[str]) -> set:
+        """Quais destes task_names já estão no banco (consulta em blocos de 500)."""
+        existentes = set()
+        conn = self._get_conn()
+        cur = conn.cursor()
+        for i in range(0, len(nomes), 500):
+            bloco = nomes[i:i + 500]
+            cur.execute(
+                f"SELECT task_name FROM agendamentos WHERE task_name IN ({','.join('?' * len(bloco))})",
+                bloco
+            )
+            existentes.update(row[0] for row in cur.fetchall())
+        conn.close()
+        return existentes
+
     def obter_por_id(self, task_id: int) -> Optional[dict]:
         """Busca um agendamento pelo ID e retorna como dicionário"""
         conn = self._get_conn()
@@ -203,14 +783,32 @@ class SchedulerDB:
         finally:
             conn.close()
 
+    @_escrita
     def atualizar_agendamento_completo(self, task_id, target, mode, message, file_path, scheduled_time):
-        """Método para permitir a edição de um agendamento existente"""
+        """
+        Método para permitir a edição de um agendamento existente.
+        Se o conteúdo do envio mudou, ou o job já tinha sido concluído (reagendar = enviar de novo),
+        os checkpoints e chaves de envio antigos deixam de valer e são apagados;
+        mudar só o horário de um job pendente/falho preserva o progresso para a próxima tentativa.
+        Editar também zera as tentativas (um job em dead-letter volta a ter todas).
+        """
         conn = self._get_conn()
         cur = conn.cursor()
         try:
+            for tabela in ("checkpoints", "envios_confirmados"):
+                cur.execute(f"""
+                    DELETE FROM {tabela}
+                    WHERE task_id = ? AND task_id NOT IN (
+                        SELECT id FROM agendamentos
+                        WHERE id = ? AND target = ? AND mode = ?
+                        AND message IS ? AND file_path IS ?
+                        AND status != 'completed'
+                    )
+                """, (task_id, task_id, target, mode, message, file_path))
             cur.execute("""
                 UPDATE agendamentos 
-                SET target = ?, mode = ?, message = ?, file_path = ?, scheduled_time = ?, status = 'pending'
+                SET target = ?, mode = ?, message = ?, file_path = ?, scheduled_time = ?, status = 'pending',
+                    tentativas = 0, proxima_tentativa = NULL, lease_dono = NULL, lease_ate = NULL
                 WHERE id = ?
             """, (target, mode, message, file_path, scheduled_time.isoformat(), task_id))
             conn.commit()
@@ -248,6 +846,7 @@ class SchedulerDB:
     # =============================
     # UPDATE
     # =============================
+    @_escrita
     def atualizar_status(
         self,
         identificador,
@@ -259,7 +858,7 @@ class SchedulerDB:
         
         Args:
             identificador: ID ou task_name
-            status: Novo status ('pending', 'running', 'completed', 'failed')
+            status: Novo status ('pending', 'running', 'completed', 'failed', 'dead_letter')
             error_message: Mensagem de erro (opcional)
         """
         conn = self._get_conn()
@@ -284,9 +883,521 @@ class SchedulerDB:
         
         print(f"✓ Status atualizado: {identificador} → {status}")
 
+    @_escrita
+    def registrar_falha(self, task_id: int, error_message: str,
+                        proxima_tentativa: Optional[datetime.datetime] = None,
+                        lease_vencido_em: Optional[datetime.datetime] = None) -> bool:
+        """
+        Conta uma tentativa falha do job. O lease do executor acaba aqui: a retentativa
+        fica livre para qualquer executor, sem esperar o lease antigo vencer.
+        
+        Args:
+            proxima_tentativa: quando tentar de novo (job volta para 'pending');
+                               None manda o job para 'dead_letter'
+            lease_vencido_em: só registra se o job ainda está 'running' com o lease vencido
+                              nesse instante (usado pelo varredor de leases)
+        Returns:
+            bool: False se a condição do lease não bateu
+        """
+        conn = self._get_conn()
+        cur = conn.cursor()
+        
+        condicao, params = "", []
+        if lease_vencido_em:
+            condicao = "AND status = 'running' AND (lease_ate IS NULL OR lease_ate < ?)"
+            params = [lease_vencido_em.isoformat()]
+        cur.execute(f"""
+            UPDATE agendamentos
+            SET status = ?, executed_at = ?, error_message = ?,
+                tentativas = COALESCE(tentativas, 0) + 1, proxima_tentativa = ?,
+                lease_dono = NULL, lease_ate = NULL
+            WHERE id = ? {condicao}
+        """, [
+            'pending' if proxima_tentativa else 'dead_letter',
+            datetime.datetime.now().isoformat(),
+            error_message,
+            proxima_tentativa.isoformat() if proxima_tentativa else None,
+            task_id
+        ] + params)
+        alterado = cur.rowcount == 1
+        
+        conn.commit()
+        conn.close()
+        return alterado
+
+    # =============================
+    # LEASES
+    # =============================
+    @_escrita
+    def reivindicar(
+        self,
+        dono: str,
+        duracao: float,
+        ate: Optional[datetime.datetime] = None,
+        ids: Optional[List[int]] = None,
+        limite: int = 50
+    ) -> List[dict]:
+        """
+        Passa de 'pending' para 'running' (com lease de `dono`) os jobs vencidos até `ate`,
+        num único UPDATE ... RETURNING: dois executores nunca recebem o mesmo job.
+        Jobs reservados por outro dono (ver reservar) ficam de fora até a reserva vencer.
+
+        Args:
+            ate: só jobs cujo vencimento (proxima_tentativa ou scheduled_time) é <= ate (None = qualquer)
+            ids: restringe aos jobs indicados
+            limite: máximo de jobs do lote
+        Returns:
+            list[dict]: jobs reivindicados (linhas completas), em ordem de vencimento
+        """
+        if ids is not None and not ids:
+            return []
+        agora = datetime.datetime.now()
+        sql, params = self._sql_reivindicar(ate, ids, dono, agora)
+        
+        conn = self._get_conn()
+        conn.row_factory = sqlite3.Row
+        cur = conn.cursor()
+        
+        try:
+            cur.execute(sql, [agora.isoformat(), dono, (agora + datetime.timedelta(seconds=duracao)).isoformat()]
+                        + params + [limite])
+            rows = [dict(row) for row in cur.fetchall()]
+            conn.commit()
+        finally:
+            conn.close()
+        
+        rows.sort(key=lambda r: (r.get('proxima_tentativa') or r['scheduled_time'], r['id']))
+        return rows
+
+    @staticmethod
+    def _filtros_vencimento(ate: Optional[datetime.datetime], ids: Optional[List[int]]):
+        """Trecho do WHERE (e parâmetros) dos pendentes vencidos até `ate` / entre `ids`."""
+        filtros, params = [], []
+        if ate is not None:
+            # O índice (status, vencimento_epoch, id) faz o corte e a ordem; o COALESCE
+            # só acerta as frações de segundo do último segundo
+            filtros.append("vencimento_epoch <= ? AND COALESCE(proxima_tentativa, scheduled_time) <= ?")
+            params.extend([int(ate.timestamp()), ate.isoformat()])
+        if ids is not None:
+            filtros.append(f"id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        return "".join(f" AND {f}" for f in filtros), params
+
+    @classmethod
+    def _sql_reivindicar(cls, ate: Optional[datetime.datetime], ids: Optional[List[int]],
+                         dono: str, agora: datetime.datetime):
+        """
+        UPDATE do reivindicar e os parâmetros dos filtros. Os parâmetros completos são
+        (executed_at, lease_dono, lease_ate, *filtros, limite).
+        """
+        where, params = cls._filtros_vencimento(ate, ids)
+        sql = f"""
+            UPDATE agendamentos
+            SET status = 'running', executed_at = ?, error_message = NULL, lease_dono = ?, lease_ate = ?
+            WHERE status = 'pending' AND id IN (
+                SELECT id FROM agendamentos
+                WHERE status = 'pending'{where}
+                AND (lease_dono IS NULL OR lease_dono = ? OR lease_ate < ?)
+                ORDER BY vencimento_epoch, id
+                LIMIT ?
+            )
+            RETURNING *
+        """
+        return sql, params + [dono, agora.isoformat()]
+
+    @_escrita
+    def reservar(
+        self,
+        dono: str,
+        duracao: float,
+        ate: datetime.datetime,
+        limite: int = 50
+    ) -> List[dict]:
+        """
+        Reserva para `dono` os pendentes que vencem até `ate` e que ninguém reservou, num único
+        UPDATE ... RETURNING. O job continua 'pending' (pode ser editado ou excluído); a reserva
+        (lease_dono/lease_ate em linha pendente) só impede outro executor de reivindicá-lo até
+        vencer. Quem reservou reivindica cada job na hora de enviá-lo (reivindicar).
+
+        Returns:
+            list[dict]: jobs reservados, em ordem de vencimento
+        """
+        where, params = self._filtros_vencimento(ate, None)
+        agora = datetime.datetime.now()
+        
+        conn = self._get_conn()
+        conn.row_factory = sqlite3.Row
+        cur = conn.cursor()
+        
+        try:
+            cur.execute(f"""
+                UPDATE agendamentos SET lease_dono = ?, lease_ate = ?
+                WHERE status = 'pending' AND id IN (
+                    SELECT id FROM agendamentos
+                    WHERE status = 'pending'{where}
+                    AND (lease_dono IS NULL OR lease_ate < ?)
+                    ORDER BY vencimento_epoch, id
+                    LIMIT ?
+                )
+                RETURNING *
+            """, [dono, (agora + datetime.timedelta(seconds=duracao)).isoformat()]
+                 + params + [agora.isoformat(), limite])
+            rows = [dict(row) for row in cur.fetchall()]
+            conn.commit()
+        finally:
+            conn.close()
+        
+        rows.sort(key=lambda r: (r.get('proxima_tentativa') or r['scheduled_time'], r['id']))
+        return rows
+
+    def listar_reservas(self, agora: datetime.datetime) -> dict:
+        """{id: lease_ate} dos pendentes com reserva ainda válida (ver reservar)."""
+        conn = self._get_conn()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            SELECT id, lease_ate FROM agendamentos
+            WHERE status = 'pending' AND lease_dono IS NOT NULL AND lease_ate >= ?
+        """, (agora.isoformat(),))
+        
+        rows = cur.fetchall()
+        conn.close()
+        return dict(rows)
+
+    @_escrita
+    def renovar_lease(self, task_ids: List[int], dono: str, duracao: float) -> int:
+        """
+        Heartbeat: estende o lease dos jobs (em execução ou só reservados) que ainda são deste dono.
+        Retorna quantos renovou.
+        """
+        conn = self._get_conn()
+        cur = conn.cursor()
+        ate = (datetime.datetime.now() + datetime.timedelta(seconds=duracao)).isoformat()
+        
+        cur.execute(f"""
+            UPDATE agendamentos SET lease_ate = ?
+            WHERE status IN ('running', 'pending') AND lease_dono = ?
+            AND id IN ({','.join('?' * len(task_ids))})
+        """, [ate, dono] + list(task_ids))
+        renovados = cur.rowcount
+        
+        conn.commit()
+        conn.close()
+        return renovados
+
+    @_escrita
+    def liberar_reservas(self, task_ids: List[int], dono: str) -> int:
+        """
+        Solta as reservas de `dono` nos jobs que não chegaram a ser reivindicados (continuam
+        'pending'). Jobs em execução, concluídos ou de outro dono não são tocados.
+        """
+        if not task_ids:
+            return 0
+        conn = self._get_conn()
+        cur = conn.cursor()
+
+        cur.execute(f"""
+            UPDATE agendamentos SET lease_dono = NULL, lease_ate = NULL
+            WHERE status = 'pending' AND lease_dono = ?
+            AND id IN ({','.join('?' * len(task_ids))})
+        """, [dono] + list(task_ids))
+        liberados = cur.rowcount
+
+        conn.commit()
+        conn.close()
+        return liberados
+
+    def listar_leases_vencidos(self, agora: datetime.datetime) -> List[dict]:
+        """
+        Jobs 'running' cujo lease venceu. Linhas sem lease (de versões anteriores)
+        contam como vencidas.
+        """
+        conn = self._get_conn()
+        conn.row_factory = sqlite3.Row
+        cur = conn.cursor()
+        
+        cur.execute("""
+            SELECT id, tentativas, max_tentativas, lease_dono, lease_ate
+            FROM agendamentos
+            WHERE status = 'running' AND (lease_ate IS NULL OR lease_ate < ?)
+        """, (agora.isoformat(),))
+        
+        rows = [dict(row) for row in cur.fetchall()]
+        conn.close()
+        return rows
+
+    @_escrita
+    def registrar_recuperacao(self, decisoes: List[Tuple], gatilho: str):
+        """
+        Grava as decisões da recuperação de atrasados e marca os perdidos como 'missed',
+        numa única transação. Um job que deixou de estar pendente nesse meio-tempo não muda.
+
+        Args:
+            decisoes: (task_id, scheduled_time, atraso em segundos, 'executar' | 'perdido')
+            gatilho: 'inicio' ou 'retomada'
+        """
+        conn = self._get_conn()
+        cur = conn.cursor()
+        agora = datetime.datetime.now().isoformat()
+        try:
+            cur.executemany("""
+                INSERT INTO recuperacoes (task_id, scheduled_time, atraso_segundos, decisao, gatilho, decidido_em)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(t, h, atraso, decisao, gatilho, agora) for t, h, atraso, decisao in decisoes])
+            cur.executemany("""
+                UPDATE agendamentos
+                SET status = 'missed', executed_at = ?, error_message = ?
+                WHERE id = ? AND status = 'pending'
+            """, [
+                (agora, f"Perdido: {atraso / 60:.0f} min de atraso ({gatilho}).", t)
+                for t, _, atraso, decisao in decisoes if decisao == 'perdido'
+            ])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @_escrita
+    def registrar_espera_trava(self, task_id: int, segundos: float):
+        """Grava quanto tempo o job esperou na fila do perfil do Chrome."""
+        conn = self._get_conn()
+        cur = conn.cursor()
+        cur.execute("UPDATE agendamentos SET espera_trava = ? WHERE id = ?", (round(segundos or 0.0, 3), task_id))
+        conn.commit()
+        conn.close()
+
+    @_escrita
+    def registrar_preprocessamento(self, task_id: int, relatorio: dict):
+        """
+        Grava o resultado do pré-processamento de mídia do job.
+        
+        Args:
+            task_id: ID do agendamento
+            relatorio: dict retornado por core.preprocessamento.preprocessar_anexos
+        """
+        conn = self._get_conn()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            UPDATE agendamentos
+            SET bytes_originais = ?, bytes_processados = ?, segundos_economizados = ?
+            WHERE id = ?
+        """, (
+            relatorio.get('bytes_originais'),
+            relatorio.get('bytes_processados'),
+            relatorio.get('segundos_economizados'),
+            task_id
+        ))
+        
+        conn.commit()
+        conn.close()
+
+    # =============================
+    # CHECKPOINTS
+    # =============================
+    @_escrita
+    def registrar_checkpoint(self, task_id: int, etapa: str):
+        """Marca uma etapa do job como confirmada (idempotente)."""
+        conn = self._get_conn()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            INSERT OR IGNORE INTO checkpoints (task_id, etapa, criado_em)
+            VALUES (?, ?, ?)
+        """, (task_id, etapa, datetime.datetime.now().isoformat()))
+        
+        conn.commit()
+        conn.close()
+
+    def listar_checkpoints(self, task_id: int) -> List[str]:
+        """Etapas já confirmadas do job, na ordem em que aconteceram."""
+        conn = self._get_conn()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            SELECT etapa FROM checkpoints
+            WHERE task_id = ?
+            ORDER BY criado_em ASC
+        """, (task_id,))
+        
+        rows = [row[0] for row in cur.fetchall()]
+        conn.close()
+        
+        return rows
+
+    @_escrita
+    def limpar_checkpoints(self, task_id: int):
+        """Descarta o progresso salvo do job (próxima execução começa do zero)."""
+        conn = self._get_conn()
+        cur = conn.cursor()
+        cur.execute("DELETE FROM checkpoints WHERE task_id = ?", (task_id,))
+        conn.commit()
+        conn.close()
+
+    # =============================
+    # IDEMPOTÊNCIA
+    # =============================
+    def envio_confirmado(self, chave: str) -> bool:
+        """Consulta (pelo índice único) se a unidade de envio já foi confirmada."""
+        conn = self._get_conn()
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM envios_confirmados WHERE chave = ?", (chave,))
+        row = cur.fetchone()
+        conn.close()
+        return row is not None
+
+    @_escrita
+    def registrar_envio(self, chave: str, task_id: int, parte: str, destinatario: str) -> bool:
+        """
+        Grava a unidade de envio como confirmada.
+        
+        Returns:
+            bool: False se a chave já existia (outro processo confirmou antes)
+        """
+        conn = self._get_conn()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            INSERT OR IGNORE INTO envios_confirmados (chave, task_id, parte, destinatario, confirmado_em)
+            VALUES (?, ?, ?, ?, ?)
+        """, (chave, task_id, parte, destinatario, datetime.datetime.now().isoformat()))
+        inserido = cur.rowcount == 1
+        
+        conn.commit()
+        conn.close()
+        return inserido
+
+    # =============================
+    # RECORRÊNCIAS
+    # =============================
+    @_escrita
+    def adicionar_recorrencia(
+        self,
+        nome: str,
+        target: str,
+        mode: str,
+        regra: dict,
+        message: Optional[str] = None,
+        file_path: Optional[str] = None
+    ) -> int:
+        """
+        Grava uma regra recorrente (as ocorrências são criadas por core.recorrencia.materializar).
+
+        Args:
+            regra: dict com frequencia, intervalo, dias_semana, hora, inicio, fim, excecoes
+        Returns:
+            int: ID da regra
+        """
+        from core.recorrencia import normalizar_regra
+        r = normalizar_regra(regra)
+
+        conn = self._get_conn()
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO recorrencias (
+                nome, target, mode, message, file_path, frequencia, intervalo,
+                dias_semana, hora, inicio, fim, excecoes, created_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            nome, target, mode, message, file_path, r['frequencia'], r['intervalo'],
+            ",".join(str(d) for d in r['dias_semana']) or None,
+            r['hora'].strftime("%H:%M"),
+            r['inicio'].isoformat(),
+            r['fim'].isoformat() if r['fim'] else None,
+            ",".join(sorted(e.isoformat() for e in r['excecoes'])) or None,
+            datetime.datetime.now().isoformat()
+        ))
+        conn.commit()
+        rec_id = cur.lastrowid
+        conn.close()
+
+        print(f"✓ Recorrência criada: ID={rec_id}, {r['frequencia']} às {r['hora'].strftime('%H:%M')}")
+        return rec_id
+
+    def listar_recorrencias(self, somente_ativas: bool = True) -> List[dict]:
+        """Lista as regras recorrentes como dicionários."""
+        conn = self._get_conn()
+        conn.row_factory = sqlite3.Row
+        cur = conn.cursor()
+        if somente_ativas:
+            cur.execute("SELECT * FROM recorrencias WHERE ativa = 1 ORDER BY id")
+        else:
+            cur.execute("SELECT * FROM recorrencias ORDER BY id")
+        rows = [dict(row) for row in cur.fetchall()]
+        conn.close()
+        return rows
+
+    @_escrita
+    def materializar_ocorrencias(self, recorrencia_id: int, momentos: List[datetime.datetime],
+                                 ate: datetime.datetime) -> int:
+        """
+        Cria as linhas de agendamentos das ocorrências e avança materializado_ate,
+        numa única transação. Ocorrências que já existem são ignoradas.
+
+        Returns:
+            int: quantas linhas foram criadas
+        """
+        conn = self._get_conn()
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "SELECT nome, target, mode, message, file_path FROM recorrencias WHERE id = ?",
+                (recorrencia_id,)
+            )
+            rec = cur.fetchone()
+            if not rec:
+                return 0
+            nome, target, mode, message, file_path = rec
+            agora = datetime.datetime.now().isoformat()
+
+            cur.executemany("""
+                INSERT OR IGNORE INTO agendamentos (
+                    task_name, target, mode, message, file_path,
+                    scheduled_time, created_at, status, recorrencia_id
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?)
+            """, [
+                (f"{nome}_{recorrencia_id}_{m.strftime('%Y%m%d%H%M')}", target, mode, message,
+                 file_path, m.isoformat(), agora, recorrencia_id)
+                for m in momentos
+            ])
+            # Ignoradas não contam; o UPDATE do trigger de scheduled_epoch também não
+            criados = cur.rowcount
+            cur.execute(
+                "UPDATE recorrencias SET materializado_ate = ? WHERE id = ?",
+                (ate.isoformat(), recorrencia_id)
+            )
+            conn.commit()
+            return criados
+        finally:
+            conn.close()
+
+    @_escrita
+    def desativar_recorrencia(self, recorrencia_id: int, remover_pendentes: bool = True):
+        """
+        Encerra uma regra. As ocorrências já enviadas ficam no histórico;
+        com remover_pendentes, as futuras já materializadas são apagadas.
+        """
+        conn = self._get_conn()
+        cur = conn.cursor()
+        cur.execute("UPDATE recorrencias SET ativa = 0 WHERE id = ?", (recorrencia_id,))
+        if remover_pendentes:
+            cur.execute(
+                "DELETE FROM agendamentos WHERE recorrencia_id = ? AND status = 'pending'",
+                (recorrencia_id,)
+            )
+        conn.commit()
+        conn.close()
+
+        print(f"✓ Recorrência desativada: {recorrencia_id}")
+
     # =============================
     # DELETE
     # =============================
+    @_escrita
     def deletar(self, identificador):
         """
         Remove um agendamento do banco.
@@ -301,6 +1412,8 @@ class SchedulerDB:
             cur.execute("DELETE FROM agendamentos WHERE id = ?", (identificador,))
         else:
             cur.execute("DELETE FROM agendamentos WHERE task_name = ?", (identificador,))
+        cur.execute("DELETE FROM checkpoints WHERE task_id NOT IN (SELECT id FROM agendamentos)")
+        cur.execute("DELETE FROM envios_confirmados WHERE task_id NOT IN (SELECT id FROM agendamentos)")
         
         conn.commit()
         conn.close()
@@ -339,8 +1452,33 @@ class SchedulerDB:
 # =============================
 # INSTÂNCIA GLOBAL
 # =============================
-# Singleton para uso em todo o app
-db = SchedulerDB()
+# Singleton para uso em todo o app. Só é criado no primeiro uso: importar core.db não abre
+# (nem migra) o banco, e quem troca DB_PATH antes disso (testes, bench_db.py) não toca no
+# data/scheduler.db do usuário.
+_padrao: Optional[SchedulerDB] = None
+_lock_padrao = threading.Lock()
+
+
+def get_db() -> SchedulerDB:
+    """SchedulerDB global do app, aberto em DB_PATH na primeira chamada."""
+    global _padrao
+    with _lock_padrao:
+        if _padrao is None:
+            _padrao = SchedulerDB(DB_PATH)
+        return _padrao
+
+
+class _BancoPadrao:
+    """`from core.db import db` continua valendo: cada atributo é buscado no get_db()."""
+
+    def __getattr__(self, nome):
+        return getattr(get_db(), nome)
+
+    def __repr__(self):
+        return f"<db padrão: {DB_PATH}>"
+
+
+db = _BancoPadrao()
 
 
 # =============================
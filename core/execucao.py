@@ -0,0 +1,301 @@
+import os
+import sys
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from core.db import db
+from core.automation import (
+    iniciar_driver, encerrar_driver, driver_ativo, enviar_job_na_sessao, enviar_fanout_na_sessao,
+    contador_execucao, executar_envio, ENCAMINHAR_ATIVO
+)
+from core.armazem_anexos import coletar_lixo, tamanho_anexos
+from core.ritmo import ritmo_da_conta
+from core.fila_envios import PRIORIDADE_MANUAL
+from core.servico_agendador import JANELA_COALESCENCIA, vencimento_job
+from core.retentativas import aplicar_politica
+from core.planejador import registrar_duracao
+from core.lease import Lease, DURACAO_LEASE
+
+if getattr(sys, 'frozen', False):
+    BASE_DIR = os.path.dirname(sys.executable)
+else:
+    BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PROFILE_DIR = os.path.normpath(os.path.join(BASE_DIR, "perfil_bot_whatsapp"))
+
+
+def _log(logger, msg):
+    if logger:
+        logger(msg)
+    else:
+        print(msg)
+
+
+# =============================
+# SESSÃO: VÁRIOS JOBS, UM CHROME
+# =============================
+def ordenar_jobs(tasks):
+    """Ordem de envio da sessão: horário, depois destino (empates do mesmo destino ficam juntos)."""
+    return sorted(tasks, key=lambda t: (vencimento_job(t) or 0, t['target'].strip().lower(), t['id']))
+
+
+def mesmo_conteudo(a, b):
+    """Dois jobs com arquivo que mandam exatamente o mesmo conteúdo (candidatos ao fan-out)."""
+    return (a['mode'] != 'text' and a['mode'] == b['mode']
+            and (a['message'] or "") == (b['message'] or "") and a['file_path'] == b['file_path'])
+
+
+def executar_sessao(task_ids, userdir=PROFILE_DIR, logger=None, modo_execucao='auto', janela=JANELA_COALESCENCIA,
+                    fila=None, reservados=None, lease=None):
+    """
+    Executa vários agendamentos do SchedulerDB numa única sessão do Chrome.
+
+    Os jobs vão na ordem de ordenar_jobs(); nenhum é enviado antes do seu horário
+    (a sessão espera com o navegador aberto). Jobs seguidos para o mesmo destino
+    reaproveitam a conversa aberta. Cada job tem seu próprio status e executed_at.
+    Cada job é reivindicado (SchedulerDB.reivindicar) na hora de sair: um job que foi editado
+    para depois da janela, excluído, já concluído ou pego por outro executor é ignorado.
+    Um job que falha passa pela política de retentativas (core/retentativas.py): volta
+    para 'pending' com uma próxima tentativa ou vai para 'dead_letter'.
+
+    Jobs já vencidos com os mesmos anexos e a mesma mensagem para destinos diferentes saem
+    juntos pelo fan-out (enviar_fanout_na_sessao): um upload, encaminhado aos demais.
+
+    Com `reservados` (linhas que o despacho do serviço reservou, junto com o `lease` cujo
+    heartbeat mantém a reserva), a sessão parte dessas linhas e passa a ser dona do lease;
+    cada job continua sendo reivindicado só na sua vez, e as reservas que sobrarem
+    (job editado para depois da janela, por exemplo) são soltas no fim.
+
+    Com `fila` (core.fila_envios.FilaEnvios), envios manuais que chegam durante a sessão
+    são atendidos no mesmo Chrome antes do próximo job e durante as esperas.
+
+    Returns:
+        dict: {task_id: 'completed' | 'retentar' | 'dead_letter' | 'ignorado'}
+    """
+    if reservados is not None:
+        tasks = list(reservados)
+    else:
+        tasks = [t for t in (db.obter_por_id(i) for i in task_ids) if t]
+    resultados = {i: 'ignorado' for i in task_ids}
+    limite = time.time() + janela
+    sessao = {'driver': None, 'chat_atual': None, 'espera_trava': 0.0}
+    ritmo = ritmo_da_conta(userdir)
+    # Heartbeat dos jobs em 'running' desta sessão e das reservas que ainda esperam a vez (core/lease.py)
+    if lease is None:
+        lease = Lease(db).iniciar()
+
+    def abrir_driver():
+        if sessao['driver'] is None:
+            inicio = time.monotonic()
+            sessao['driver'] = iniciar_driver(userdir=userdir, modo_execucao=modo_execucao, logger=logger)
+            sessao['chat_atual'] = None
+            # A espera pela trava do perfil conta para o job que abriu o Chrome
+            sessao['espera_trava'] = sessao['driver'].espera_trava
+            registrar_duracao('abertura', time.monotonic() - inicio - sessao['espera_trava'])
+        return sessao['driver']
+
+    def depois_de_falha():
+        # Estado da conversa desconhecido depois de uma falha; Chrome morto é reaberto
+        sessao['chat_atual'] = None
+        if sessao['driver'] and not driver_ativo(sessao['driver']):
+            encerrar_driver(sessao['driver'], logger=logger)
+            sessao['driver'] = None
+
+    def atender_manuais(segundos=0.0):
+        """Ponto seguro: atende os envios manuais da fila por até `segundos`."""
+        fim = time.monotonic() + segundos
+        while fila is not None:
+            pedido = fila.retirar(timeout=max(0.0, fim - time.monotonic()), prioridade_max=PRIORIDADE_MANUAL)
+            if pedido is None:
+                break
+            _log(logger, f"Envio manual atendido na sessão (esperou {pedido.espera:.1f}s na fila).")
+            d = pedido.dados
+            try:
+                sessao['chat_atual'] = enviar_job_na_sessao(
+                    abrir_driver(), d['target'], d['mode'], d.get('message'), d.get('file_path'),
+                    logger=logger, chat_atual=sessao['chat_atual'], ritmo=ritmo
+                )
+                contador_execucao(True)
+                pedido.concluir(True)
+            except Exception as e:
+                _log(logger, f"Erro no envio manual: {e}")
+                pedido.concluir(erro=e)
+                depois_de_falha()
+        restante = fim - time.monotonic()
+        if restante > 0:
+            time.sleep(restante)
+
+    def enviar_um(task):
+        task_id = task['id']
+        try:
+            driver = abrir_driver()
+            db.registrar_espera_trava(task_id, sessao['espera_trava'])
+            sessao['espera_trava'] = 0.0
+            inicio = time.monotonic()
+            sessao['chat_atual'] = enviar_job_na_sessao(
+                driver, task['target'], task['mode'], task['message'], task['file_path'],
+                logger=logger, task_id=task_id, chat_atual=sessao['chat_atual'], ritmo=ritmo
+            )
+            # Alimenta o planejador de capacidade (core/planejador.py)
+            registrar_duracao(task['mode'], time.monotonic() - inicio,
+                              tamanho_anexos(task['file_path']) if task['mode'] != 'text' else 0)
+            db.atualizar_status(task_id, 'completed')
+            contador_execucao(True)
+            resultados[task_id] = 'completed'
+        except Exception as e:
+            _log(logger, f"Erro no agendamento {task_id}: {e}")
+            _log(logger, traceback.format_exc())
+            resultados[task_id] = aplicar_politica(task_id, e, logger=logger)
+            depois_de_falha()
+        finally:
+            lease.remover(task_id)
+
+    def enviar_grupo(grupo):
+        """Fan-out: cada job é concluído assim que o seu destino recebe; o resto falha junto."""
+        def ao_entregar(task_id):
+            db.atualizar_status(task_id, 'completed')
+            contador_execucao(True)
+            resultados[task_id] = 'completed'
+            lease.remover(task_id)
+
+        primeiro = grupo[0]
+        try:
+            driver = abrir_driver()
+            db.registrar_espera_trava(primeiro['id'], sessao['espera_trava'])
+            sessao['espera_trava'] = 0.0
+            sessao['chat_atual'] = enviar_fanout_na_sessao(
+                driver, [(t['id'], t['target']) for t in grupo], primeiro['mode'], primeiro['message'],
+                primeiro['file_path'], logger=logger, chat_atual=sessao['chat_atual'], ritmo=ritmo,
+                ao_entregar=ao_entregar
+            )
+        except Exception as e:
+            _log(logger, f"Erro no fan-out dos agendamentos {[t['id'] for t in grupo]}: {e}")
+            _log(logger, traceback.format_exc())
+            for t in grupo:
+                if resultados[t['id']] != 'completed':
+                    resultados[t['id']] = aplicar_politica(t['id'], e, logger=logger)
+                    lease.remover(t['id'])
+            depois_de_falha()
+
+    tratados = set()
+    try:
+        for task in ordenar_jobs(tasks):
+            task_id = task['id']
+            if task_id in tratados:
+                continue
+            espera = (vencimento_job(task) or 0) - time.time()
+            if espera > 0:
+                if time.time() + espera > limite:
+                    continue
+                _log(logger, f"Sessão aberta: aguardando {espera:.0f}s pelo agendamento {task_id}.")
+                atender_manuais(espera)
+            else:
+                atender_manuais()
+
+            # Reivindica o job de forma atômica, só agora que é a vez dele: se foi editado para
+            # depois, excluído, concluído ou pego por outro executor enquanto a sessão esperava,
+            # não volta nada. O lease de execução começa aqui.
+            ate = datetime.now() + timedelta(seconds=1)
+            reivindicado = db.reivindicar(lease.dono, DURACAO_LEASE, ate=ate, ids=[task_id])
+            tratados.add(task_id)
+            if not reivindicado:
+                continue
+            task = reivindicado[0]
+            lease.adicionar(task_id)
+
+            # Fan-out: os outros jobs já vencidos com o mesmo conteúdo saem com este upload
+            irmaos = []
+            if ENCAMINHAR_ATIVO:
+                candidatos = [t['id'] for t in tasks if t['id'] not in tratados and mesmo_conteudo(t, task)
+                              and (vencimento_job(t) or 0) <= ate.timestamp()]
+                if candidatos:
+                    irmaos = db.reivindicar(lease.dono, DURACAO_LEASE, ate=ate, ids=candidatos)
+                    for t in irmaos:
+                        lease.adicionar(t['id'])
+                        tratados.add(t['id'])
+            # Um irmão editado depois da reserva, ou para um destino que já está no grupo
+            # (o encaminhamento marca cada chat uma vez), já foi reivindicado: sai sozinho
+            grupo, avulsos = [task], []
+            destinos = {task['target'].strip().lower()}
+            for t in irmaos:
+                destino = t['target'].strip().lower()
+                if mesmo_conteudo(t, task) and destino not in destinos:
+                    grupo.append(t)
+                    destinos.add(destino)
+                else:
+                    avulsos.append(t)
+            if len(grupo) > 1:
+                enviar_grupo(grupo)
+            else:
+                enviar_um(task)
+            for t in avulsos:
+                enviar_um(t)
+        atender_manuais()
+    finally:
+        lease.parar()
+        if reservados is not None:
+            db.liberar_reservas([t['id'] for t in reservados], lease.dono)
+        if sessao['driver']:
+            inicio = time.monotonic()
+            encerrar_driver(sessao['driver'], logger=logger)
+            registrar_duracao('encerramento', time.monotonic() - inicio)
+        _log(logger, f"Ritmo de envio da conta: {ritmo.estado()}")
+        ritmo.salvar()
+
+    if 'completed' in resultados.values():
+        # Jobs concluídos não seguram mais os anexos no armazém
+        coletar_lixo(db.listar_anexos_ativos(), logger)
+    return resultados
+
+
+# =============================
+# UM JOB, FORA DE SESSÃO
+# =============================
+def executar_job(task_id, userdir=PROFILE_DIR, logger=None, modo_execucao='auto'):
+    """
+    Executa um único agendamento do banco num Chrome próprio (app.py --auto, executor_cli.py).
+
+    O job é reivindicado ('pending' -> 'running', atômico) antes de abrir o navegador, com
+    lease renovado enquanto o envio roda: se este processo cair, o serviço devolve o job.
+    Disparo repetido de um job já concluído (ou pego por outro executor) não faz nada.
+    O envio passa por executar_envio (preparo dos anexos junto com o carregamento do
+    WhatsApp, checkpoints e chaves de envio); uma falha passa pela política de retentativas.
+
+    Returns:
+        str: 'completed' | 'retentar' | 'dead_letter' | 'ignorado'
+    """
+    with Lease(db) as lease:
+        reivindicado = db.reivindicar(lease.dono, DURACAO_LEASE, ids=[task_id])
+        if not reivindicado:
+            _log(logger, f"Tarefa {task_id} não está pendente (concluída ou com outro executor); ignorando.")
+            return 'ignorado'
+        task = reivindicado[0]
+        lease.adicionar(task_id)
+        try:
+            executar_envio(
+                userdir=userdir, target=task['target'], mode=task['mode'], message=task['message'],
+                file_path=task['file_path'], logger=logger, modo_execucao=modo_execucao, task_id=task_id
+            )
+            db.atualizar_status(task_id, 'completed')
+        except Exception as e:
+            _log(logger, f"Erro no agendamento {task_id}: {e}")
+            return aplicar_politica(task_id, e, logger=logger)
+    contador_execucao(True)
+    # Job concluído não segura mais os anexos no armazém
+    coletar_lixo(db.listar_anexos_ativos(), logger)
+    return 'completed'
+
+
+def executar_manual(pedido, userdir=PROFILE_DIR, logger=None):
+    """Atende um envio manual da fila fora de sessão (Chrome visível, como o 'Enviar Agora')."""
+    d = pedido.dados
+    try:
+        executar_envio(
+            userdir=userdir, target=d['target'], mode=d['mode'], message=d.get('message'),
+            file_path=d.get('file_path'), logger=logger, modo_execucao='manual'
+        )
+        contador_execucao(True)
+        pedido.concluir(True)
+    except Exception as e:
+        pedido.concluir(erro=e)
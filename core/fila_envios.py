@@ -0,0 +1,119 @@
+import time
+import heapq
+import itertools
+import threading
+
+# =============================
+# FILA DE ENVIOS COM PRIORIDADE
+# =============================
+# Tudo que usa o Chrome do bot passa por aqui, na frente do motor de envio:
+#   PRIORIDADE_MANUAL    "Enviar Agora" da GUI: fura a fila e, se houver uma sessão aberta,
+#                        é atendido no próximo ponto seguro dela (entre dois jobs)
+#   PRIORIDADE_AGENDADA  grupos de jobs do serviço de agendamento, em ordem de prazo
+# Dentro da mesma prioridade a ordem é (prazo, chegada). A espera na fila é medida por classe.
+PRIORIDADE_MANUAL = 0
+PRIORIDADE_AGENDADA = 1
+NOMES_PRIORIDADE = {PRIORIDADE_MANUAL: 'manual', PRIORIDADE_AGENDADA: 'agendado'}
+
+PESO_ESPERA = 0.3  # média móvel exponencial da espera
+
+
+class PedidoEnvio:
+    """
+    Um item da fila.
+
+    Args:
+        tipo: 'sessao' (dados = lista de task_ids) ou 'manual' (dados = dict do envio)
+        prazo: epoch até quando deveria começar (ordem dentro da prioridade)
+    """
+
+    def __init__(self, tipo, dados, prioridade, prazo=None):
+        self.tipo = tipo
+        self.dados = dados
+        self.prioridade = prioridade
+        self.prazo = prazo if prazo is not None else time.time()
+        self.enfileirado_em = time.monotonic()
+        self.espera = None
+        self.resultado = None
+        self.erro = None
+        self._concluido = threading.Event()
+
+    def concluir(self, resultado=None, erro=None):
+        self.resultado = resultado
+        self.erro = erro
+        self._concluido.set()
+
+    @property
+    def concluido(self):
+        return self._concluido.is_set()
+
+    def aguardar(self, timeout=None):
+        """Bloqueia até o pedido ser atendido; levanta o erro do envio, se houver."""
+        if not self._concluido.wait(timeout):
+            raise TimeoutError("Envio ainda na fila.")
+        if self.erro:
+            raise self.erro
+        return self.resultado
+
+
+class FilaEnvios:
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._fechada = False
+        self._estatisticas = {
+            nome: {'atendidos': 0, 'espera_media_s': 0.0, 'espera_max_s': 0.0}
+            for nome in NOMES_PRIORIDADE.values()
+        }
+
+    def colocar(self, pedido):
+        with self._cond:
+            heapq.heappush(self._heap, (pedido.prioridade, pedido.prazo, next(self._seq), pedido))
+            self._cond.notify_all()
+        return pedido
+
+    def retirar(self, timeout=None, prioridade_max=None):
+        """
+        Retira o pedido mais prioritário. Espera até `timeout` segundos (None = sem limite).
+        Com prioridade_max, só retira pedidos com prioridade <= prioridade_max
+        (usado pela sessão para atender só os manuais entre um job e outro).
+        Retorna None se não houver pedido a tempo ou se a fila foi fechada.
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._heap and (prioridade_max is None or self._heap[0][0] <= prioridade_max):
+                    pedido = heapq.heappop(self._heap)[3]
+                    self._registrar_espera(pedido)
+                    return pedido
+                if self._fechada:
+                    return None
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return None
+                self._cond.wait(restante)
+
+    def fechar(self):
+        """Acorda quem está esperando; pedidos que ainda estão na fila continuam lá."""
+        with self._cond:
+            self._fechada = True
+            self._cond.notify_all()
+
+    def _registrar_espera(self, pedido):
+        pedido.espera = time.monotonic() - pedido.enfileirado_em
+        est = self._estatisticas[NOMES_PRIORIDADE[pedido.prioridade]]
+        est['atendidos'] += 1
+        est['espera_media_s'] = (1 - PESO_ESPERA) * est['espera_media_s'] + PESO_ESPERA * pedido.espera
+        est['espera_max_s'] = max(est['espera_max_s'], pedido.espera)
+
+    def estatisticas(self):
+        """Espera na fila por classe de prioridade (atendidos, média, máxima, na fila agora)."""
+        with self._cond:
+            resultado = {nome: dict(est, na_fila=0) for nome, est in self._estatisticas.items()}
+            for prioridade, _, _, _ in self._heap:
+                resultado[NOMES_PRIORIDADE[prioridade]]['na_fila'] += 1
+            for est in resultado.values():
+                est['espera_media_s'] = round(est['espera_media_s'], 2)
+                est['espera_max_s'] = round(est['espera_max_s'], 2)
+            return resultado
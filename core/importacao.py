@@ -0,0 +1,204 @@
+import os
+import csv
+import json
+import time
+from datetime import datetime
+from itertools import islice
+
+from core.anexos import erros_por_arquivo
+from core.armazem_anexos import armazenar, eh_referencia
+
+# =============================
+# IMPORTAÇÃO EM LOTE (CSV / JSONL)
+# =============================
+# Colunas / chaves aceitas:
+#   target          contato ou grupo (obrigatório)
+#   scheduled_time  "2026-10-20 08:00", "2026-10-20T08:00" ou "20/10/2026 08:00" (obrigatório)
+#   mode            text | file | file_text (padrão: text, ou file_text se houver arquivo)
+#   message         texto
+#   file_path       caminhos separados por "|" (no JSONL também pode ser uma lista)
+#   task_name       opcional; gerado se vazio
+#   max_tentativas  opcional; limite de tentativas do job (ver core/retentativas.py)
+#
+# O arquivo é lido em streaming e validado em lotes (os anexos de cada lote são conferidos
+# em paralelo e copiados para o armazém uma vez por arquivo). As linhas válidas de cada lote
+# vão para SchedulerDB.adicionar_lote assim que o lote é validado, numa transação por lote e
+# um SAVEPOINT por linha: só o lote atual fica na memória, e uma linha que o banco recusa
+# entra no mesmo relatório de erros das inválidas, sem abortar o resto da importação.
+LOTE_VALIDACAO = 500
+MODOS = ('text', 'file', 'file_text')
+FORMATOS_DATA = ("%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S",
+                 "%d/%m/%Y %H:%M")
+
+
+def ler_linhas(caminho):
+    """Gera (número da linha, dict) do arquivo CSV ou JSONL, sem carregar tudo na memória."""
+    ext = os.path.splitext(caminho.lower())[1]
+    with open(caminho, "r", encoding="utf-8-sig", newline="") as f:
+        if ext in (".jsonl", ".ndjson", ".json"):
+            for n, linha in enumerate(f, start=1):
+                if not linha.strip():
+                    continue
+                try:
+                    yield n, json.loads(linha)
+                except json.JSONDecodeError as e:
+                    yield n, {"_erro": f"JSON inválido: {e.msg}"}
+        else:
+            # Linha 1 é o cabeçalho
+            for n, registro in enumerate(csv.DictReader(f), start=2):
+                yield n, {k.strip().lower(): v for k, v in registro.items() if k}
+
+
+def _data_hora(valor):
+    valor = str(valor or "").strip()
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(valor, formato)
+        except ValueError:
+            continue
+    raise ValueError(f"data/hora inválida: {valor!r}")
+
+
+def _campos(registro):
+    """Normaliza um registro. Levanta ValueError com a mensagem da linha."""
+    if "_erro" in registro:
+        raise ValueError(registro["_erro"])
+
+    target = str(registro.get("target") or "").strip()
+    if not target:
+        raise ValueError("target vazio")
+
+    arquivos = registro.get("file_path") or []
+    if isinstance(arquivos, str):
+        arquivos = arquivos.replace("\n", "|").split("|")
+    arquivos = [a.strip() for a in arquivos if a and a.strip()]
+
+    message = str(registro.get("message") or "").strip() or None
+    mode = str(registro.get("mode") or "").strip().lower() or ("file_text" if arquivos else "text")
+    if mode not in MODOS:
+        raise ValueError(f"mode inválido: {mode!r}")
+    if mode == "text" and not message:
+        raise ValueError("modo text sem mensagem")
+    if mode != "text" and not arquivos:
+        raise ValueError(f"modo {mode} sem file_path")
+
+    max_tentativas = str(registro.get("max_tentativas") or "").strip() or None
+    if max_tentativas is not None:
+        if not max_tentativas.isdigit() or int(max_tentativas) < 1:
+            raise ValueError(f"max_tentativas inválido: {max_tentativas!r}")
+        max_tentativas = int(max_tentativas)
+
+    quando = _data_hora(registro.get("scheduled_time"))
+    if quando < datetime.now():
+        raise ValueError(f"horário no passado ({quando:%d/%m/%Y %H:%M})")
+
+    return {
+        "task_name": str(registro.get("task_name") or "").strip() or None,
+        "target": target,
+        "mode": mode,
+        "message": None if mode == "file" else message,
+        "arquivos": arquivos if mode != "text" else [],
+        "scheduled_time": quando,
+        "max_tentativas": max_tentativas,
+    }
+
+
+class ResultadoImportacao:
+    def __init__(self):
+        self.importados = 0
+        self.erros = []          # (número da linha, mensagem)
+        self.segundos = 0.0
+
+    def resumo(self):
+        return (f"{self.importados} agendamento(s) importado(s), {len(self.erros)} linha(s) com erro "
+                f"em {self.segundos:.1f}s.")
+
+
+def importar_agendamentos(caminho, db=None, logger=None, lote=LOTE_VALIDACAO):
+    """
+    Importa agendamentos de um CSV/JSONL, gravando lote a lote.
+
+    Returns:
+        ResultadoImportacao: quantidade importada e erros por linha
+    """
+    if db is None:
+        from core.db import db
+
+    resultado = ResultadoImportacao()
+    inicio = time.monotonic()
+    prefixo = f"Import_{int(time.time())}"
+    nomes_vistos = set()
+    refs_cache = {}    # caminho -> referência do armazém (cada arquivo é copiado uma vez)
+
+    def validar_lote(itens):
+        validos = []
+        for n, registro in itens:
+            try:
+                validos.append((n, _campos(registro)))
+            except ValueError as e:
+                resultado.erros.append((n, str(e)))
+
+        # Anexos do lote inteiro conferidos em paralelo, cada caminho uma única vez
+        novos = {os.path.abspath(a) for _, c in validos for a in c["arquivos"]
+                 if not eh_referencia(a)} - refs_cache.keys()
+        erros_arquivo = erros_por_arquivo(sorted(novos))
+
+        # task_name não pode repetir no arquivo nem colidir com o banco (uma consulta por lote)
+        for n, c in validos:
+            c["task_name"] = c["task_name"] or f"{prefixo}_{n}"
+        existentes = db.task_names_existentes([c["task_name"] for _, c in validos])
+
+        for n, c in validos:
+            nome = c["task_name"]
+            if nome in nomes_vistos or nome in existentes:
+                resultado.erros.append((n, f"task_name repetido: {nome}"))
+                continue
+            try:
+                refs = []
+                for a in c["arquivos"]:
+                    if eh_referencia(a):
+                        refs.append(a)
+                        continue
+                    p = os.path.abspath(a)
+                    if p in erros_arquivo:
+                        raise ValueError(erros_arquivo[p])
+                    if p not in refs_cache:
+                        refs_cache[p] = armazenar(p)
+                    refs.append(refs_cache[p])
+            except (ValueError, OSError) as e:
+                resultado.erros.append((n, str(e)))
+                continue
+
+            nomes_vistos.add(nome)
+            yield n, {
+                "task_name": nome, "target": c["target"], "mode": c["mode"],
+                "message": c["message"], "file_path": "\n".join(refs) or None,
+                "scheduled_time": c["scheduled_time"], "max_tentativas": c["max_tentativas"],
+            }
+
+    fonte = ler_linhas(caminho)
+    while True:
+        itens = list(islice(fonte, lote))
+        if not itens:
+            break
+        # Validação (leituras) do lote termina antes de abrir a transação de escrita dele
+        validas = list(validar_lote(itens))
+        if not validas:
+            continue
+        try:
+            inseridos, falhas = db.adicionar_lote([linha for _, linha in validas])
+        except Exception as e:
+            # Banco indisponível para este lote: as linhas dele vão para o relatório, os próximos seguem
+            inseridos, falhas = 0, [(i, f"não gravado no banco: {e}") for i in range(len(validas))]
+        resultado.importados += inseridos
+        resultado.erros.extend((validas[i][0], erro) for i, erro in falhas)
+
+    resultado.segundos = time.monotonic() - inicio
+    resultado.erros.sort()
+
+    msg = resultado.resumo()
+    if logger:
+        logger(msg)
+    else:
+        print(msg)
+    return resultado
@@ -0,0 +1,116 @@
+import os
+import socket
+import threading
+from datetime import datetime
+
+from core.retentativas import decidir
+
+# =============================
+# LEASE + HEARTBEAT DOS JOBS EM EXECUÇÃO
+# =============================
+# Quem põe um job em 'running' ganha um lease (lease_dono, lease_ate) de DURACAO_LEASE segundos
+# e o renova a cada INTERVALO_HEARTBEAT enquanto trabalha. Se o processo cair ou o PC reiniciar
+# no meio do envio, o lease vence e o varredor (varrer_leases_vencidos, chamado pelo serviço
+# de agendamento) devolve o job para a política de retentativas: volta para 'pending' com
+# backoff, ou 'dead_letter' se as tentativas acabaram. O envio retomado não duplica nada
+# (checkpoints e chaves de envio).
+#
+# O job só vai para 'running' (e ganha o lease) na hora em que é enviado: os jobs que o
+# despacho do serviço reservou para uma sessão continuam 'pending' e o mesmo heartbeat só
+# mantém a reserva deles. Se a sessão cair, a reserva vence e o job volta a ser de qualquer
+# executor, sem contar tentativa: o varredor só olha para quem estava de fato enviando.
+DURACAO_LEASE = 120
+INTERVALO_HEARTBEAT = 30
+ERRO_LEASE_VENCIDO = "Executor parou no meio do envio (lease vencido)."
+
+
+def id_trabalhador():
+    """Identifica este processo como dono de leases: 'maquina:pid'."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Lease:
+    """
+    Heartbeat dos jobs que este executor está rodando.
+
+        with Lease(db) as lease:
+            if db.reivindicar(lease.dono, lease.duracao, ids=[task_id]):
+                lease.adicionar(task_id)
+            ...
+            lease.remover(task_id)
+    """
+
+    def __init__(self, db, dono=None, duracao=DURACAO_LEASE, intervalo=INTERVALO_HEARTBEAT):
+        self.db = db
+        self.dono = dono or id_trabalhador()
+        self.duracao = duracao
+        self.intervalo = intervalo
+        self._ids = set()
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def adicionar(self, task_id):
+        with self._lock:
+            self._ids.add(task_id)
+
+    def remover(self, task_id):
+        with self._lock:
+            self._ids.discard(task_id)
+
+    def iniciar(self):
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._heartbeat, name="lease_heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _heartbeat(self):
+        while not self._parar.wait(self.intervalo):
+            with self._lock:
+                ids = list(self._ids)
+            if not ids:
+                continue
+            try:
+                self.db.renovar_lease(ids, self.dono, self.duracao)
+            except Exception as e:
+                print(f"Erro ao renovar lease dos jobs {ids}: {e}")
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+        return False
+
+
+def varrer_leases_vencidos(db=None, agora=None, logger=None):
+    """
+    Devolve à política de retentativas os jobs 'running' com lease vencido.
+
+    Returns:
+        int: quantos jobs foram recuperados
+    """
+    if db is None:
+        from core.db import db
+    agora = agora or datetime.now()
+    recuperados = 0
+    for task in db.listar_leases_vencidos(agora):
+        tentativas = (task.get('tentativas') or 0) + 1
+        proxima = decidir(tentativas, task.get('max_tentativas'), ERRO_LEASE_VENCIDO, agora)
+        # Condicional: se o dono renovou nesse meio-tempo, o job não é tocado
+        if not db.registrar_falha(task['id'], ERRO_LEASE_VENCIDO, proxima, lease_vencido_em=agora):
+            continue
+        recuperados += 1
+        destino = f"nova tentativa às {proxima:%H:%M:%S}" if proxima else "dead-letter"
+        msg = f"Agendamento {task['id']}: lease de {task.get('lease_dono') or '?'} vencido; {destino}."
+        if logger:
+            logger(msg)
+        else:
+            print(msg)
+    return recuperados
@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+from datetime import datetime
+
+from core.anexos import carregar_vazao
+from core.armazem_anexos import tamanho_anexos
+from core.servico_agendador import JANELA_COALESCENCIA, epoch_agendamento
+
+# =============================
+# PLANEJADOR DE CAPACIDADE
+# =============================
+# O horário agendado é só a intenção: com um único perfil do Chrome os jobs saem um depois do
+# outro. O planejador simula a fila de pendentes do jeito que o serviço de agendamento a executa
+# (grupos pela JANELA_COALESCENCIA, uma sessão por grupo, sessões em série) usando durações
+# medidas nas execuções anteriores:
+#   abertura       Chrome + WhatsApp Web carregado (uma vez por sessão)
+#   encerramento   fechar o Chrome e liberar o perfil (entre uma sessão e a próxima)
+#   text/file/file_text   tempo de um job fora o upload; o upload é bytes / vazão medida
+#                          (core/anexos.py, data/upload_stats.json)
+# Cada job recebe início e fim previstos; quem começa mais de ORCAMENTO_ATRASO segundos
+# depois do horário é sinalizado. As medições ficam em data/duracoes_jobs.json.
+ORCAMENTO_ATRASO = 300
+DURACOES_PADRAO = {
+    'abertura': 35.0,
+    'encerramento': 15.0,
+    'text': 8.0,
+    'file': 12.0,
+    'file_text': 15.0,
+}
+PESO_MEDICAO = 0.3  # média móvel exponencial, como a vazão de upload
+
+
+def _arquivo_duracoes():
+    if getattr(sys, 'frozen', False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    return os.path.join(base_dir, "data", "duracoes_jobs.json")
+
+
+def carregar_duracoes():
+    """Durações médias medidas (segundos), com os padrões para o que ainda não foi medido."""
+    duracoes = dict(DURACOES_PADRAO)
+    try:
+        with open(_arquivo_duracoes(), 'r', encoding='utf-8') as f:
+            duracoes.update({k: float(v) for k, v in json.load(f).items() if k in DURACOES_PADRAO})
+    except Exception:
+        pass
+    return duracoes
+
+
+def registrar_duracao(etapa, segundos, bytes_enviados=0):
+    """
+    Atualiza a média de uma etapa com uma medição. Para jobs com arquivo, o tempo de upload
+    previsto pela vazão é descontado: a média guarda só a parte fixa do job.
+    """
+    if etapa not in DURACOES_PADRAO or segundos <= 0:
+        return
+    if bytes_enviados:
+        segundos = max(1.0, segundos - bytes_enviados / carregar_vazao())
+    duracoes = carregar_duracoes()
+    duracoes[etapa] = (1 - PESO_MEDICAO) * duracoes[etapa] + PESO_MEDICAO * segundos
+    try:
+        caminho = _arquivo_duracoes()
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        tmp = caminho + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({k: round(v, 2) for k, v in duracoes.items()}, f)
+        os.replace(tmp, caminho)
+    except Exception as e:
+        print(f"Erro ao gravar durações dos jobs: {e}")
+
+
+def duracao_job(mode, file_path, duracoes=None, vazao=None):
+    """Duração prevista de um job (segundos), sem a abertura do Chrome."""
+    duracoes = duracoes or carregar_duracoes()
+    segundos = duracoes.get(mode, DURACOES_PADRAO['text'])
+    if mode != 'text' and file_path:
+        segundos += tamanho_anexos(file_path) / (vazao or carregar_vazao())
+    return segundos
+
+
+# =============================
+# SIMULAÇÃO
+# =============================
+def simular(jobs, agora=None, janela=JANELA_COALESCENCIA, orcamento=ORCAMENTO_ATRASO, duracoes=None):
+    """
+    Simula a execução dos jobs num único perfil.
+
+    Args:
+        jobs: dicts com id, target, mode, file_path, scheduled_time (e proxima_tentativa, opcional)
+    Returns:
+        list[dict]: um por job, em ordem de execução, com 'inicio', 'fim' (datetime),
+                    'atraso' (segundos) e 'atrasado' (bool) além dos campos do job
+    """
+    duracoes = duracoes or carregar_duracoes()
+    vazao = carregar_vazao()
+    agora = (agora or datetime.now()).timestamp()
+
+    fila = []
+    for job in jobs:
+        vencimento = epoch_agendamento(job.get('proxima_tentativa') or job['scheduled_time'])
+        if vencimento is not None:
+            fila.append((max(vencimento, agora), vencimento, job))
+    fila.sort(key=lambda item: (item[0], str(item[2].get('target', '')).lower(), item[2].get('id') or 0))
+
+    previsoes = []
+    livre = agora      # quando o perfil fica livre (sessão anterior encerrada)
+    i = 0
+    while i < len(fila):
+        # Mesmo agrupamento do serviço: o job vencido leva os que vencem dentro da janela
+        limite = fila[i][0] + janela
+        grupo = []
+        while i < len(fila) and fila[i][0] <= limite:
+            grupo.append(fila[i])
+            i += 1
+
+        t = max(grupo[0][0], livre) + duracoes['abertura']
+        for pronto, vencimento, job in grupo:
+            inicio = max(t, pronto)
+            t = inicio + duracao_job(job['mode'], job.get('file_path'), duracoes, vazao)
+            atraso = inicio - vencimento
+            previsoes.append(dict(
+                job,
+                inicio=datetime.fromtimestamp(inicio),
+                fim=datetime.fromtimestamp(t),
+                atraso=atraso,
+                atrasado=atraso > orcamento,
+            ))
+        livre = t + duracoes['encerramento']
+    return previsoes
+
+
+def prever_novo(scheduled_time, mode, file_path=None, target="", db=None, agora=None,
+                orcamento=ORCAMENTO_ATRASO):
+    """
+    Previsão para um job que ainda vai ser agendado, junto com os pendentes do banco.
+
+    Returns:
+        tuple: (previsão do novo job, lista de pendentes que passam a estourar o orçamento por causa dele)
+    """
+    if db is None:
+        from core.db import db
+    colunas = ("id", "task_name", "target", "mode", "message", "file_path", "scheduled_time", "json_path")
+    pendentes = [dict(zip(colunas, row)) for row in db.listar_pendentes()]
+    # Retentativas entram pelo horário da próxima tentativa
+    vencimentos = dict(db.listar_vencimentos())
+    for p in pendentes:
+        p['proxima_tentativa'] = vencimentos.get(p['id'])
+    novo = {'id': None, 'target': target, 'mode': mode, 'file_path': file_path,
+            'scheduled_time': scheduled_time.isoformat()}
+
+    antes = {p['id'] for p in simular(pendentes, agora, orcamento=orcamento) if p['atrasado']}
+    depois = simular(pendentes + [novo], agora, orcamento=orcamento)
+    previsao = next(p for p in depois if p['id'] is None)
+    afetados = [p for p in depois if p['atrasado'] and p['id'] is not None and p['id'] not in antes]
+    return previsao, afetados
+
+
+def resumo_previsao(previsao, afetados=()):
+    """Texto curto para a GUI."""
+    texto = (f"Previsão de envio: {previsao['inicio']:%d/%m %H:%M} – {previsao['fim']:%H:%M}")
+    if previsao['atraso'] >= 60:
+        texto += f" ({previsao['atraso'] / 60:.0f} min depois do horário)"
+    if afetados:
+        texto += f"\n{len(afetados)} agendamento(s) já existente(s) passam a atrasar mais de " \
+                 f"{ORCAMENTO_ATRASO / 60:.0f} min."
+    return texto
@@ -0,0 +1,262 @@
+import os
+import sys
+import time
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from core.anexos import hash_arquivo, carregar_vazao
+
+# =============================
+# CONFIGURAÇÃO
+# =============================
+# O WhatsApp reduz as fotos para ~1600px no lado maior; mandar mais que isso só gasta upload
+LADO_MAXIMO_IMAGEM = 1600
+QUALIDADE_JPEG = 80
+# Vídeos só são recodificados se o usuário pedir (ffmpeg precisa estar no PATH)
+ALTURA_MAXIMA_VIDEO = 720
+CRF_VIDEO = 28
+
+# Arquivos menores que isso já estão bons o bastante
+TAMANHO_MINIMO = 300 * 1024
+
+EXTENSOES_IMAGEM = {'.jpg', '.jpeg', '.png', '.webp'}
+EXTENSOES_VIDEO = {'.mp4', '.mov', '.3gp', '.m4v'}
+
+# Muda quando os parâmetros acima mudam, para invalidar o cache antigo
+VERSAO_PARAMETROS = f"i{LADO_MAXIMO_IMAGEM}q{QUALIDADE_JPEG}v{ALTURA_MAXIMA_VIDEO}c{CRF_VIDEO}"
+
+# Limpeza do cache: sai o que não é usado há IDADE_MAXIMA_CACHE e, acima de LIMITE_CACHE,
+# os menos usados recentemente. Cada acerto renova a data do arquivo; o que foi usado nos
+# últimos CARENCIA_CACHE segundos nunca sai (outra sessão pode estar subindo o arquivo).
+LIMITE_CACHE = 2 * 1024 ** 3
+IDADE_MAXIMA_CACHE = 30 * 24 * 3600
+CARENCIA_CACHE = 3600
+
+
+def _pasta_cache():
+    if getattr(sys, 'frozen', False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    pasta = os.path.join(base_dir, "data", "cache_midia")
+    os.makedirs(pasta, exist_ok=True)
+    return pasta
+
+
+def _usar(caminho):
+    """Marca o arquivo do cache como usado agora (ordem de limpeza)."""
+    try:
+        os.utime(caminho)
+    except OSError:
+        pass
+
+
+def limpar_cache(limite=LIMITE_CACHE, idade_maxima=IDADE_MAXIMA_CACHE, carencia=CARENCIA_CACHE,
+                 logger=None, agora=None):
+    """
+    Remove do data/cache_midia os arquivos sem uso há mais de `idade_maxima` segundos, os de
+    parâmetros antigos (VERSAO_PARAMETROS) e, se o total passar de `limite` bytes, os usados
+    há mais tempo até voltar ao limite. Arquivos usados há menos de `carencia` segundos ficam.
+
+    Returns:
+        int: bytes liberados
+    """
+    agora = agora or time.time()
+    pasta = _pasta_cache()
+    arquivos = []
+    for nome in os.listdir(pasta):
+        caminho = os.path.join(pasta, nome)
+        try:
+            st = os.stat(caminho)
+        except OSError:
+            continue
+        arquivos.append((st.st_mtime, st.st_size, nome, caminho))
+
+    remover, restantes = [], []
+    for mtime, tamanho, nome, caminho in arquivos:
+        if agora - mtime < carencia:
+            restantes.append((mtime, tamanho, caminho))
+        elif agora - mtime > idade_maxima or VERSAO_PARAMETROS not in nome or ".tmp" in nome:
+            remover.append((tamanho, caminho))
+        else:
+            restantes.append((mtime, tamanho, caminho))
+
+    total = sum(tamanho for _, tamanho, _ in restantes)
+    for mtime, tamanho, caminho in sorted(restantes):
+        if total <= limite:
+            break
+        if agora - mtime < carencia:
+            continue
+        remover.append((tamanho, caminho))
+        total -= tamanho
+
+    liberados = 0
+    for tamanho, caminho in remover:
+        try:
+            os.remove(caminho)
+            liberados += tamanho
+        except OSError as e:
+            print(f"Erro ao remover do cache de mídia {os.path.basename(caminho)}: {e}")
+
+    if liberados:
+        msg = f"Cache de mídia: {len(remover)} arquivo(s) removido(s), {liberados / 1e6:.1f} MB liberados."
+        if logger:
+            logger(msg)
+        else:
+            print(msg)
+    return liberados
+
+
+# =============================
+# WORKERS (rodam em outro processo)
+# =============================
+def _processar_imagem(origem, destino):
+    """Reduz e recomprime uma imagem para JPEG. Requer Pillow."""
+    from PIL import Image, ImageOps
+
+    with Image.open(origem) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((LADO_MAXIMO_IMAGEM, LADO_MAXIMO_IMAGEM))
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        tmp = destino + ".tmp"
+        img.save(tmp, "JPEG", quality=QUALIDADE_JPEG, optimize=True, progressive=True)
+    os.replace(tmp, destino)
+
+
+def _processar_video(origem, destino):
+    """Recodifica o vídeo em H.264/AAC com altura máxima limitada. Requer ffmpeg."""
+    tmp = destino + ".tmp.mp4"
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error", "-i", origem,
+        "-vf", f"scale=-2:'min({ALTURA_MAXIMA_VIDEO},ih)'",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", str(CRF_VIDEO),
+        "-c:a", "aac", "-b:a", "96k", "-movflags", "+faststart",
+        tmp,
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "ffmpeg falhou")
+    os.replace(tmp, destino)
+
+
+def _processar(tipo, origem, destino):
+    """Ponto de entrada do worker."""
+    if tipo == 'imagem':
+        _processar_imagem(origem, destino)
+    else:
+        _processar_video(origem, destino)
+
+
+# =============================
+# PIPELINE
+# =============================
+def _tipo_processavel(path, transcodificar_video):
+    ext = os.path.splitext(path.lower())[1]
+    if ext in EXTENSOES_IMAGEM:
+        return 'imagem'
+    if transcodificar_video and ext in EXTENSOES_VIDEO:
+        return 'video'
+    return None
+
+
+def _pillow_disponivel():
+    try:
+        import PIL  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def preprocessar_anexos(paths, transcodificar_video=False, logger=None, max_workers=None):
+    """
+    Reduz/recomprime as mídias de um envio em um pool de processos (um por núcleo).
+
+    O resultado fica em cache pelo hash do conteúdo original, então o mesmo arquivo
+    enviado para vários chats só é processado uma vez (ver limpar_cache). Arquivos que não encolhem,
+    tipos não suportados ou falhas mantêm o caminho original.
+
+    Returns:
+        tuple: (lista de caminhos a enviar, relatório dict com
+                bytes_originais, bytes_processados, segundos_processamento, segundos_economizados)
+    """
+    def log(msg):
+        if logger:
+            logger(msg)
+        else:
+            print(msg)
+
+    pillow = _pillow_disponivel()
+    if not pillow:
+        log("Pillow não instalado: imagens serão enviadas sem pré-processamento.")
+    if transcodificar_video and not shutil.which("ffmpeg"):
+        log("ffmpeg não encontrado no PATH: vídeos serão enviados sem pré-processamento.")
+        transcodificar_video = False
+
+    pasta = _pasta_cache()
+    resultado = list(paths)
+    pendentes = {}   # destino -> (tipo, origem)
+    indices = {}     # destino -> [índices em resultado]
+
+    for i, p in enumerate(paths):
+        tipo = _tipo_processavel(p, transcodificar_video)
+        if not tipo or (tipo == 'imagem' and not pillow):
+            continue
+        try:
+            if os.path.getsize(p) < TAMANHO_MINIMO:
+                continue
+            ext = ".jpg" if tipo == 'imagem' else ".mp4"
+            destino = os.path.join(pasta, f"{hash_arquivo(p)}_{VERSAO_PARAMETROS}{ext}")
+        except OSError:
+            continue
+
+        if os.path.exists(destino):
+            _usar(destino)
+            resultado[i] = destino
+            continue
+        pendentes.setdefault(destino, (tipo, p))
+        indices.setdefault(destino, []).append(i)
+
+    segundos_processamento = 0.0
+    if pendentes:
+        inicio = time.monotonic()
+        workers = max_workers or os.cpu_count() or 1
+        log(f"Pré-processando {len(pendentes)} arquivo(s) em {workers} processo(s)...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futuros = {
+                pool.submit(_processar, tipo, origem, destino): destino
+                for destino, (tipo, origem) in pendentes.items()
+            }
+            for futuro, destino in futuros.items():
+                try:
+                    futuro.result()
+                except Exception as e:
+                    log(f"Falha ao pré-processar {os.path.basename(pendentes[destino][1])}: {e}")
+                    continue
+                for i in indices[destino]:
+                    resultado[i] = destino
+        segundos_processamento = time.monotonic() - inicio
+        # O cache só cresce aqui: é a hora de mantê-lo dentro do limite
+        limpar_cache(logger=logger)
+
+    # Se o processado não ficou menor, o original é melhor (mesma qualidade, mesmo custo)
+    for i, p in enumerate(paths):
+        if resultado[i] != p and os.path.getsize(resultado[i]) >= os.path.getsize(p):
+            resultado[i] = p
+
+    bytes_originais = sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+    bytes_processados = sum(os.path.getsize(p) for p in resultado if os.path.exists(p))
+    economia_upload = (bytes_originais - bytes_processados) / carregar_vazao()
+
+    relatorio = {
+        "bytes_originais": bytes_originais,
+        "bytes_processados": bytes_processados,
+        "segundos_processamento": round(segundos_processamento, 2),
+        "segundos_economizados": round(economia_upload - segundos_processamento, 2),
+    }
+    log(
+        f"Pré-processamento: {bytes_originais / 1e6:.1f} MB → {bytes_processados / 1e6:.1f} MB "
+        f"(~{relatorio['segundos_economizados']:.0f}s economizados)"
+    )
+    return resultado, relatorio
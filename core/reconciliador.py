@@ -0,0 +1,251 @@
+import os
+import re
+import csv
+import sys
+import subprocess
+from datetime import datetime, timedelta
+
+from core.windows_scheduler import get_app_base_path, garantir_lancador, TAREFA_SERVICO
+from core.servico_agendador import vencimento_job
+
+# =============================
+# RECONCILIADOR BANCO x AGENDADOR DO SISTEMA
+# =============================
+# Com o backend "windows", cada job pendente tem uma tarefa AutoMessage_<id> que chama o
+# lançador único scheduled_tasks/executar_job.bat <id>. Tarefa de job excluído fora da GUI,
+# GUI fechada no meio de uma edição, troca de backend... deixam sobras dos dois lados.
+#
+# reconciliar() lista todas as tarefas de uma vez (um único `schtasks /query /fo csv`), compara
+# em memória com os jobs pendentes e aplica só o necessário:
+#   - cria a tarefa dos pendentes futuros que não têm (ou cujo horário não bate); o horário
+#     é o vencimento do job, então uma retentativa (proxima_tentativa) ganha tarefa nova
+#   - remove tarefas AutoMessage_<id> sem job pendente (todas, com o backend "servico")
+#   - migra as tarefas antigas, que apontavam para task_<id>.bat (cópia do job em task_<id>.json),
+#     para o lançador, e apaga todos os task_<id>.json/.bat: o job só existe no banco
+# O acesso ao agendador passa por um backend: BackendSchtasks no Windows, BackendFalso em testes.
+# core/windows_scheduler.py (GUI e tarefa do serviço) também usa o BackendSchtasks.
+PREFIXO_TAREFA = "AutoMessage_"
+_RE_TAREFA_JOB = re.compile(rf"^{PREFIXO_TAREFA}(\d+)$")
+_RE_ARQUIVO_JOB = re.compile(r"^task_(\d+)\.(json|bat)$")
+# "Próxima execução" do schtasks vem no formato regional do Windows
+FORMATOS_PROXIMA_EXECUCAO = ("%d/%m/%Y %H:%M:%S", "%m/%d/%Y %I:%M:%S %p", "%m/%d/%Y %H:%M:%S",
+                             "%Y-%m-%d %H:%M:%S")
+
+
+def _data_proxima_execucao(texto):
+    for formato in FORMATOS_PROXIMA_EXECUCAO:
+        try:
+            return datetime.strptime(texto.strip(), formato)
+        except ValueError:
+            continue
+    return None
+
+
+class BackendSchtasks:
+    """Agendador do Windows via schtasks (sem shell: os argumentos vão como lista)."""
+
+    def listar(self):
+        """
+        Todas as tarefas AutoMessage_* numa única chamada.
+
+        Returns:
+            dict: {nome da tarefa: datetime da próxima execução ou None}
+        """
+        result = subprocess.run(["schtasks", "/query", "/fo", "csv", "/nh"],
+                                capture_output=True, text=True, errors="replace")
+        if result.returncode != 0:
+            raise Exception(f"schtasks /query falhou: {result.stderr.strip()}")
+        tarefas = {}
+        for linha in csv.reader(result.stdout.splitlines()):
+            # TaskName, Next Run Time, Status (o nome vem com a pasta: \AutoMessage_12)
+            if not linha:
+                continue
+            nome = linha[0].rsplit("\\", 1)[-1]
+            if nome.startswith(PREFIXO_TAREFA):
+                tarefas[nome] = _data_proxima_execucao(linha[1]) if len(linha) > 1 else None
+        return tarefas
+
+    def _rodar(self, args):
+        result = subprocess.run(["schtasks"] + args, capture_output=True, text=True, errors="replace")
+        if result.returncode != 0:
+            raise Exception(result.stderr.strip() or f"schtasks {args[0]} falhou ({result.returncode})")
+
+    def criar(self, task, bat_path, quando):
+        self._rodar(["/create", "/tn", f"{PREFIXO_TAREFA}{task['id']}", "/tr", f'"{bat_path}" {task["id"]}',
+                     "/sc", "once", "/st", quando.strftime("%H:%M"), "/sd", quando.strftime("%d/%m/%Y"),
+                     "/rl", "highest", "/f"])
+
+    def criar_no_logon(self, nome, comando):
+        """Tarefa que roda `comando` (lista de argumentos) a cada logon."""
+        self._rodar(["/create", "/tn", nome, "/tr", subprocess.list2cmdline(comando), "/sc", "onlogon", "/f"])
+
+    def existe(self, nome):
+        result = subprocess.run(["schtasks", "/query", "/tn", nome], capture_output=True)
+        return result.returncode == 0
+
+    def remover(self, nome):
+        self._rodar(["/delete", "/tn", nome, "/f"])
+
+
+class BackendFalso:
+    """Agendador em memória, com o mesmo contrato do BackendSchtasks (testes e Linux)."""
+
+    def __init__(self, tarefas=None):
+        self.tarefas = dict(tarefas or {})
+        self.chamadas = []
+
+    def listar(self):
+        self.chamadas.append(("listar",))
+        return dict(self.tarefas)
+
+    def criar(self, task, bat_path, quando):
+        nome = f"{PREFIXO_TAREFA}{task['id']}"
+        self.chamadas.append(("criar", nome))
+        self.tarefas[nome] = quando.replace(second=0, microsecond=0)
+
+    def criar_no_logon(self, nome, comando):
+        self.chamadas.append(("criar_no_logon", nome))
+        self.tarefas[nome] = None
+
+    def existe(self, nome):
+        return nome in self.tarefas
+
+    def remover(self, nome):
+        self.chamadas.append(("remover", nome))
+        self.tarefas.pop(nome, None)
+
+
+def backend_padrao():
+    """Backend do sistema atual, ou None se não houver agendador suportado."""
+    return BackendSchtasks() if sys.platform == "win32" else None
+
+
+class ResultadoReconciliacao:
+    def __init__(self):
+        self.criadas = []
+        self.removidas = []
+        self.arquivos_removidos = []
+        self.erros = []          # (tarefa/arquivo, mensagem)
+
+    def resumo(self):
+        return (f"Reconciliação: {len(self.criadas)} tarefa(s) criada(s), {len(self.removidas)} removida(s), "
+                f"{len(self.arquivos_removidos)} arquivo(s) órfão(s) apagado(s), {len(self.erros)} erro(s).")
+
+
+def planejar(pendentes, tarefas, tarefas_por_job=True, agora=None, legados=()):
+    """
+    Diff em memória entre os jobs pendentes e as tarefas existentes.
+
+    Args:
+        pendentes: dicts dos jobs pendentes (id, scheduled_time, proxima_tentativa, ...)
+        tarefas: {nome: próxima execução ou None}, de backend.listar()
+        tarefas_por_job: False com o backend "servico" (nenhuma tarefa por job deve existir)
+        legados: ids (str) de jobs cuja tarefa ainda chama o antigo task_<id>.bat
+    Returns:
+        tuple: (jobs a criar [(task, datetime)], nomes de tarefas a remover)
+    """
+    agora = agora or datetime.now()
+    desejadas = {}
+    if tarefas_por_job:
+        for task in pendentes:
+            vencimento = vencimento_job(task)
+            if vencimento is None:
+                continue
+            quando = datetime.fromtimestamp(vencimento)
+            if quando.second or quando.microsecond:
+                # A tarefa só tem minuto: arredonda para cima para não sair antes da retentativa
+                quando = quando.replace(second=0, microsecond=0) + timedelta(minutes=1)
+            # Tarefa "once" no passado nunca dispara: o job atrasado não ganha tarefa nova
+            if quando > agora:
+                desejadas[f"{PREFIXO_TAREFA}{task['id']}"] = (task, quando)
+
+    criar = []
+    for nome, (task, quando) in desejadas.items():
+        if nome not in tarefas or str(task['id']) in legados:
+            criar.append((task, quando))
+        elif tarefas[nome] is not None and tarefas[nome] != quando.replace(second=0, microsecond=0):
+            # Horário editado fora daqui: /create /f substitui a tarefa
+            criar.append((task, quando))
+
+    pendentes_ids = {str(t['id']) for t in pendentes}
+    remover = []
+    for nome in tarefas:
+        m = _RE_TAREFA_JOB.match(nome)
+        if not m or nome == TAREFA_SERVICO:
+            continue
+        if nome not in desejadas and (not tarefas_por_job or m.group(1) not in pendentes_ids):
+            remover.append(nome)
+    return criar, sorted(remover)
+
+
+def reconciliar(db=None, backend=None, tarefas_por_job=None, pasta=None, logger=None):
+    """
+    Deixa o agendador do sistema e a pasta scheduled_tasks de acordo com o banco.
+    Também é a migração dos task_<id>.json/.bat antigos: roda quantas vezes for preciso,
+    e depois da primeira não sobra nenhum.
+
+    Args:
+        backend: BackendSchtasks/BackendFalso (padrão: backend_padrao(); None pula o agendador)
+        tarefas_por_job: padrão conforme BACKEND_AGENDAMENTO == "windows"
+        pasta: pasta dos .json/.bat (padrão: scheduled_tasks do app)
+    Returns:
+        ResultadoReconciliacao
+    """
+    if db is None:
+        from core.db import db
+    if backend is None:
+        backend = backend_padrao()
+    if tarefas_por_job is None:
+        from core.servico_agendador import BACKEND_AGENDAMENTO
+        tarefas_por_job = BACKEND_AGENDAMENTO == "windows"
+    pasta = pasta or os.path.join(get_app_base_path(), "scheduled_tasks")
+
+    resultado = ResultadoReconciliacao()
+    colunas = ("id", "task_name", "target", "mode", "message", "file_path", "scheduled_time", "json_path")
+    pendentes = [dict(zip(colunas, row)) for row in db.listar_pendentes()]
+    # Retentativas entram pelo horário da próxima tentativa
+    vencimentos = dict(db.listar_vencimentos())
+    for p in pendentes:
+        p['proxima_tentativa'] = vencimentos.get(p['id'])
+
+    try:
+        arquivos = os.listdir(pasta)
+    except FileNotFoundError:
+        arquivos = []
+    legados = {m.group(1) for m in map(_RE_ARQUIVO_JOB.match, arquivos) if m and m.group(2) == "bat"}
+    manter = set()
+
+    if backend is not None:
+        criar, remover = planejar(pendentes, backend.listar(), tarefas_por_job, legados=legados)
+        for nome in remover:
+            try:
+                backend.remover(nome)
+                resultado.removidas.append(nome)
+            except Exception as e:
+                resultado.erros.append((nome, str(e)))
+        for task, quando in criar:
+            nome = f"{PREFIXO_TAREFA}{task['id']}"
+            try:
+                backend.criar(task, garantir_lancador(), quando)
+                resultado.criadas.append(nome)
+            except Exception as e:
+                resultado.erros.append((nome, str(e)))
+                # A tarefa antiga continua chamando task_<id>.bat: o arquivo fica até a próxima vez
+                manter.add(str(task['id']))
+
+    # .json/.bat por job (formato antigo): só a tarefa antiga usava
+    for arquivo in arquivos:
+        m = _RE_ARQUIVO_JOB.match(arquivo)
+        if m and m.group(1) not in manter:
+            try:
+                os.remove(os.path.join(pasta, arquivo))
+                resultado.arquivos_removidos.append(arquivo)
+            except OSError as e:
+                resultado.erros.append((arquivo, str(e)))
+
+    msg = resultado.resumo()
+    if logger:
+        logger(msg)
+    else:
+        print(msg)
+    return resultado
@@ -0,0 +1,180 @@
+import calendar
+from datetime import datetime, date, time as dtime, timedelta
+
+# =============================
+# AGENDAMENTOS RECORRENTES
+# =============================
+# Uma regra (tabela recorrencias) descreve todas as ocorrências de um lembrete:
+#   frequencia   'diaria' | 'semanal' | 'mensal'
+#   intervalo    a cada N dias/semanas/meses
+#   dias_semana  semanal: dias da semana (0 = segunda ... 6 = domingo)
+#   hora         'HH:MM'
+#   inicio/fim   datas (fim inclusivo, opcional)
+#   excecoes     datas puladas
+# As ocorrências são calculadas sob demanda; só as que caem dentro do HORIZONTE viram linhas
+# em agendamentos (com recorrencia_id), então um ano de lembretes semanais é uma regra,
+# não 52 linhas. O serviço de agendamento chama materializar() periodicamente.
+FREQUENCIAS = ('diaria', 'semanal', 'mensal')
+HORIZONTE_MATERIALIZACAO = timedelta(days=7)
+
+
+def _data(valor):
+    if valor is None or isinstance(valor, date) and not isinstance(valor, datetime):
+        return valor
+    if isinstance(valor, datetime):
+        return valor.date()
+    return date.fromisoformat(str(valor)[:10])
+
+
+def normalizar_regra(regra):
+    """
+    Valida a regra (dict ou linha do banco) e devolve uma cópia com tipos Python:
+    datas como date, hora como time, dias_semana como tupla ordenada, excecoes como set.
+    Levanta ValueError se a regra for inválida.
+    """
+    frequencia = regra.get('frequencia')
+    if frequencia not in FREQUENCIAS:
+        raise ValueError(f"Frequência inválida: {frequencia!r}")
+
+    intervalo = int(regra.get('intervalo') or 1)
+    if intervalo < 1:
+        raise ValueError("intervalo deve ser >= 1")
+
+    hora = regra.get('hora')
+    if not isinstance(hora, dtime):
+        hora = datetime.strptime(str(hora), "%H:%M").time()
+
+    inicio = _data(regra.get('inicio'))
+    if inicio is None:
+        raise ValueError("Regra sem data de início.")
+    fim = _data(regra.get('fim'))
+    if fim and fim < inicio:
+        raise ValueError("A data final é anterior ao início.")
+
+    dias = regra.get('dias_semana') or ()
+    if isinstance(dias, str):
+        dias = [int(d) for d in dias.split(',') if d.strip()]
+    dias = tuple(sorted(set(int(d) for d in dias)))
+    if frequencia == 'semanal':
+        if not dias:
+            dias = (inicio.weekday(),)
+        if any(d < 0 or d > 6 for d in dias):
+            raise ValueError("dias_semana deve conter valores de 0 (segunda) a 6 (domingo).")
+
+    excecoes = regra.get('excecoes') or ()
+    if isinstance(excecoes, str):
+        excecoes = excecoes.split(',')
+    excecoes = {_data(e.strip() if isinstance(e, str) else e) for e in excecoes if e}
+
+    return {
+        'frequencia': frequencia, 'intervalo': intervalo, 'hora': hora,
+        'inicio': inicio, 'fim': fim, 'dias_semana': dias, 'excecoes': excecoes,
+    }
+
+
+def _datas_candidatas(r, desde):
+    """
+    Datas da regra a partir do período que contém `desde`, em ordem.
+    Pula direto para esse período em vez de percorrer tudo desde o início.
+    """
+    inicio, intervalo = r['inicio'], r['intervalo']
+    desde = max(desde, inicio)
+
+    if r['frequencia'] == 'diaria':
+        n = (desde - inicio).days // intervalo
+        while True:
+            yield inicio + timedelta(days=n * intervalo)
+            n += 1
+
+    elif r['frequencia'] == 'semanal':
+        base = inicio - timedelta(days=inicio.weekday())  # segunda da semana do início
+        n = (desde - base).days // 7 // intervalo
+        while True:
+            semana = base + timedelta(weeks=n * intervalo)
+            for dia in r['dias_semana']:
+                yield semana + timedelta(days=dia)
+            n += 1
+
+    else:
+        meses = (desde.year - inicio.year) * 12 + desde.month - inicio.month
+        n = max(0, meses // intervalo)
+        while True:
+            total = inicio.month - 1 + n * intervalo
+            ano, mes = inicio.year + total // 12, total % 12 + 1
+            # Meses sem o dia (ex.: 31 em abril) são pulados
+            if inicio.day <= calendar.monthrange(ano, mes)[1]:
+                yield date(ano, mes, inicio.day)
+            n += 1
+
+
+def ocorrencias(regra, desde, ate=None):
+    """
+    Gera, em ordem, os datetimes das ocorrências em [desde, ate).
+    Sem `ate` e sem data final na regra, o gerador é infinito (use com next()/islice).
+    """
+    r = regra if isinstance(regra.get('hora'), dtime) else normalizar_regra(regra)
+    for dia in _datas_candidatas(r, desde.date()):
+        if r['fim'] and dia > r['fim']:
+            return
+        momento = datetime.combine(dia, r['hora'])
+        if ate is not None and momento >= ate:
+            return
+        if dia < r['inicio'] or momento < desde or dia in r['excecoes']:
+            continue
+        yield momento
+
+
+def proxima_ocorrencia(regra, depois_de=None):
+    """Próxima ocorrência a partir de `depois_de` (inclusive), ou None se a regra terminou."""
+    return next(ocorrencias(regra, depois_de or datetime.now()), None)
+
+
+def ocorrencias_no_periodo(recorrencias, inicio, fim):
+    """
+    Lista as ocorrências de várias regras em [inicio, fim), sem tocar no banco.
+
+    Returns:
+        list[tuple]: (datetime, recorrencia) em ordem cronológica
+    """
+    itens = []
+    for rec in recorrencias:
+        itens.extend((momento, rec) for momento in ocorrencias(rec, inicio, fim))
+    itens.sort(key=lambda item: (item[0], item[1].get('id') or 0))
+    return itens
+
+
+# =============================
+# MATERIALIZAÇÃO
+# =============================
+def materializar(db=None, agora=None, horizonte=HORIZONTE_MATERIALIZACAO, logger=None):
+    """
+    Cria em agendamentos as ocorrências das regras ativas até agora + horizonte.
+    Cada regra continua de onde parou (materializado_ate); ocorrências que passaram
+    com o serviço desligado não são criadas.
+
+    Returns:
+        int: quantos agendamentos foram criados
+    """
+    if db is None:
+        from core.db import db
+    agora = agora or datetime.now()
+    ate = agora + horizonte
+    criados = 0
+
+    for rec in db.listar_recorrencias():
+        try:
+            desde = agora
+            if rec.get('materializado_ate'):
+                desde = max(desde, datetime.fromisoformat(rec['materializado_ate']))
+            if desde >= ate:
+                continue
+            momentos = list(ocorrencias(rec, desde, ate))
+            criados += db.materializar_ocorrencias(rec['id'], momentos, ate)
+        except Exception as e:
+            msg = f"Erro ao materializar recorrência {rec.get('id')}: {e}"
+            if logger:
+                logger(msg)
+            else:
+                print(msg)
+
+    return criados
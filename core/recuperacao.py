@@ -0,0 +1,61 @@
+from datetime import datetime
+
+# =============================
+# RECUPERAÇÃO DE JOBS ATRASADOS
+# =============================
+# Com o computador desligado ou em suspensão, jobs pendentes passam do horário sem sair.
+# Na inicialização do serviço de agendamento, e quando ele percebe que o sistema voltou
+# de uma suspensão, uma única consulta (índice parcial de pendentes) traz os atrasados e
+# cada um é classificado pela TOLERANCIA_ATRASO:
+#   executar  atrasou até a tolerância: continua 'pending' e sai agora; o serviço junta todos
+#             os atrasados numa única sessão do Chrome (janela de coalescência)
+#   perdido   atrasou mais que isso: vira 'missed' (um "bom dia" às 15h não serve mais)
+# As decisões ficam na tabela recuperacoes.
+TOLERANCIA_ATRASO = 3600
+# Um ciclo do serviço que demorou esta quantidade de segundos além do normal indica suspensão
+LIMIAR_SUSPENSAO = 60
+
+
+def classificar(atrasados, agora, tolerancia=TOLERANCIA_ATRASO):
+    """
+    Args:
+        atrasados: linhas (id, scheduled_time, vencimento) de SchedulerDB.listar_atrasados
+    Returns:
+        list[tuple]: (task_id, scheduled_time, atraso em segundos, 'executar' | 'perdido')
+    """
+    decisoes = []
+    for task_id, scheduled_time, vencimento in atrasados:
+        try:
+            atraso = (agora - datetime.fromisoformat(str(vencimento))).total_seconds()
+        except ValueError:
+            continue
+        decisoes.append((task_id, scheduled_time, atraso, 'executar' if atraso <= tolerancia else 'perdido'))
+    return decisoes
+
+
+def recuperar_atrasados(db=None, agora=None, tolerancia=TOLERANCIA_ATRASO, gatilho='inicio', logger=None):
+    """
+    Classifica e registra os jobs atrasados.
+
+    Returns:
+        dict: {'executar': n, 'perdido': n}
+    """
+    if db is None:
+        from core.db import db
+    agora = agora or datetime.now()
+    decisoes = classificar(db.listar_atrasados(agora), agora, tolerancia)
+    contagem = {'executar': 0, 'perdido': 0}
+    if not decisoes:
+        return contagem
+
+    db.registrar_recuperacao(decisoes, gatilho)
+    for *_, decisao in decisoes:
+        contagem[decisao] += 1
+
+    msg = (f"Recuperação de atrasados ({gatilho}): {contagem['executar']} saem agora, "
+           f"{contagem['perdido']} perdido(s) (tolerância {tolerancia / 60:.0f} min).")
+    if logger:
+        logger(msg)
+    else:
+        print(msg)
+    return contagem
@@ -0,0 +1,95 @@
+import random
+from datetime import datetime, timedelta
+
+# =============================
+# POLÍTICA DE RETENTATIVAS
+# =============================
+# Quando um job do SchedulerDB falha, o erro é classificado:
+#   retentável     WhatsApp lento para carregar, elemento não encontrado, Chrome/renderer
+#                  que caiu, ack não confirmado... (tudo que não está na lista abaixo)
+#   definitivo     anexo inválido/alterado/fora do armazém, modo sem mensagem/arquivo:
+#                  tentar de novo daria o mesmo erro
+# Erro retentável com tentativas sobrando volta para 'pending' com proxima_tentativa
+# = agora + backoff, e o serviço de agendamento o dispara como qualquer outro job.
+# Erro definitivo, ou tentativas esgotadas, leva o job para 'dead_letter' (aba de histórico).
+MAX_TENTATIVAS_PADRAO = 3
+# Backoff exponencial: BACKOFF_BASE * 2^(tentativa-1), limitado a BACKOFF_MAXIMO, com jitter
+BACKOFF_BASE = 60
+BACKOFF_MAXIMO = 3600
+
+# Tipos de exceção que nunca se resolvem sozinhos
+TIPOS_DEFINITIVOS = (ValueError, FileNotFoundError, PermissionError, IsADirectoryError)
+# Trechos de mensagem (minúsculos) de erros definitivos levantados como Exception genérica
+ERROS_DEFINITIVOS = (
+    "anexos inválidos",
+    "não está mais no armazém",
+    "foi alterado depois de agendado",
+    "nenhuma mensagem fornecida",
+    "nenhum arquivo fornecido",
+    "nenhum arquivo válido",
+    "arquivo necessário",
+    "modo desconhecido",
+)
+
+
+def eh_retentavel(erro):
+    """True se vale a pena tentar o job de novo depois deste erro (Exception ou mensagem)."""
+    if isinstance(erro, TIPOS_DEFINITIVOS):
+        return False
+    texto = str(erro).lower()
+    return not any(trecho in texto for trecho in ERROS_DEFINITIVOS)
+
+
+def atraso_backoff(tentativa, base=BACKOFF_BASE, maximo=BACKOFF_MAXIMO):
+    """
+    Segundos até a próxima tentativa depois da `tentativa`-ésima falha (1, 2, ...).
+    Metade do atraso é fixa e a outra metade sorteada, para que vários jobs que falharam
+    juntos (ex.: WhatsApp fora do ar) não voltem todos no mesmo segundo.
+    """
+    atraso = min(maximo, base * 2 ** max(0, tentativa - 1))
+    return atraso / 2 + random.uniform(0, atraso / 2)
+
+
+def decidir(tentativas, max_tentativas, erro, agora=None):
+    """
+    Decide o destino de um job que acabou de falhar.
+
+    Args:
+        tentativas: falhas do job contando com esta
+        max_tentativas: limite do job (None = MAX_TENTATIVAS_PADRAO)
+    Returns:
+        datetime da próxima tentativa, ou None se o job vai para dead-letter
+    """
+    limite = max_tentativas or MAX_TENTATIVAS_PADRAO
+    if not eh_retentavel(erro) or tentativas >= limite:
+        return None
+    return (agora or datetime.now()) + timedelta(seconds=atraso_backoff(tentativas))
+
+
+def aplicar_politica(task_id, erro, db=None, logger=None):
+    """
+    Registra a falha do job e aplica a política (reagendar ou dead-letter).
+
+    Returns:
+        str: 'retentar' ou 'dead_letter'
+    """
+    if db is None:
+        from core.db import db
+    task = db.obter_por_id(task_id) or {}
+    tentativas = (task.get('tentativas') or 0) + 1
+    proxima = decidir(tentativas, task.get('max_tentativas'), erro)
+    db.registrar_falha(task_id, str(erro), proxima)
+
+    limite = task.get('max_tentativas') or MAX_TENTATIVAS_PADRAO
+    if proxima:
+        msg = (f"Agendamento {task_id}: tentativa {tentativas}/{limite} falhou; "
+               f"nova tentativa às {proxima:%H:%M:%S}.")
+    elif eh_retentavel(erro):
+        msg = f"Agendamento {task_id}: {tentativas} tentativa(s) esgotada(s), movido para dead-letter."
+    else:
+        msg = f"Agendamento {task_id}: erro definitivo, movido para dead-letter."
+    if logger:
+        logger(msg)
+    else:
+        print(msg)
+    return 'retentar' if proxima else 'dead_letter'
@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+# =============================
+# RITMO DE ENVIO (token bucket + AIMD)
+# =============================
+# Cada conta (perfil do Chrome) tem um balde de tokens para texto e outro para mídia.
+# Cada unidade de envio (mensagem de texto ou lote de anexos) gasta um token; sem token,
+# o envio espera o balde encher em vez de dormir um tempo fixo.
+#
+# A taxa se ajusta sozinha (AIMD): cada envio saudável soma INCREMENTO à taxa,
+# e cada erro, ack lento ou aviso do WhatsApp multiplica a taxa por FATOR_REDUCAO.
+# O "ack" é só o intervalo entre o clique em enviar e a confirmação do WhatsApp
+# (MedicaoEnvio): digitação, esperas fixas e procura de seletores não contam.
+# A taxa aprendida fica em data/ritmo_envio.json para a próxima execução: gravada quando
+# muda mais que LIMIAR_GRAVACAO desde a última gravação e no fim da sessão/processo.
+
+# Envios por minuto
+TAXA_INICIAL = {'texto': 20.0, 'midia': 6.0}
+TAXA_MAXIMA = {'texto': 40.0, 'midia': 15.0}
+TAXA_MINIMA = {'texto': 2.0, 'midia': 1.0}
+INCREMENTO = {'texto': 1.0, 'midia': 0.5}
+FATOR_REDUCAO = 0.5
+# Quantos envios podem sair em rajada depois de um período parado
+CAPACIDADE = 3
+# Ack de texto acima disso conta como sinal de lentidão (mídia depende do tamanho e não entra)
+LIMITE_ACK_LENTO = {'texto': 5.0, 'midia': None}
+
+PESO_ESPERA = 0.3  # média móvel exponencial da espera na fila
+# Variação relativa da taxa que obriga a gravar na hora (reduções sempre passam disso)
+LIMIAR_GRAVACAO = 0.25
+
+
+def _arquivo_ritmo():
+    if getattr(sys, 'frozen', False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    return os.path.join(base_dir, "data", "ritmo_envio.json")
+
+
+class BaldeTokens:
+    """Token bucket thread-safe com reserva: quem chega primeiro sai primeiro."""
+
+    def __init__(self, por_minuto, capacidade=CAPACIDADE):
+        self.por_minuto = por_minuto
+        self.capacidade = capacidade
+        self._tokens = float(capacidade)
+        self._atualizado = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _repor(self, agora):
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._atualizado) * self.por_minuto / 60.0)
+        self._atualizado = agora
+
+    def reservar(self, custo=1):
+        """Reserva `custo` tokens e devolve quantos segundos esperar até poder usá-los."""
+        with self._lock:
+            agora = time.monotonic()
+            self._repor(agora)
+            self._tokens -= custo
+            # Saldo negativo = fila; cada reserva seguinte espera a anterior
+            return max(0.0, -self._tokens * 60.0 / self.por_minuto)
+
+    def ajustar_taxa(self, por_minuto):
+        with self._lock:
+            self._repor(time.monotonic())
+            self.por_minuto = por_minuto
+
+
+class MedicaoEnvio:
+    """
+    Cronômetro do ack de uma unidade de envio, preenchido pelo próprio envio:
+    clique() logo depois de clicar em enviar, ack() quando o WhatsApp confirma.
+    """
+
+    def __init__(self):
+        self._clique = None
+        self.segundos_ack = None
+
+    def clique(self):
+        self._clique = time.monotonic()
+
+    def ack(self):
+        if self._clique is not None:
+            self.segundos_ack = time.monotonic() - self._clique
+
+
+class RitmoConta:
+    """Ritmo de envio de uma conta: um balde por tipo ('texto', 'midia')."""
+
+    def __init__(self, conta, taxas=None):
+        self.conta = conta
+        taxas = taxas or {}
+        self.baldes = {
+            tipo: BaldeTokens(min(TAXA_MAXIMA[tipo], max(TAXA_MINIMA[tipo], taxas.get(tipo, inicial))))
+            for tipo, inicial in TAXA_INICIAL.items()
+        }
+        self.espera_media = {tipo: 0.0 for tipo in TAXA_INICIAL}
+        self.na_fila = {tipo: 0 for tipo in TAXA_INICIAL}
+        self._gravadas = {tipo: b.por_minuto for tipo, b in self.baldes.items()}
+        self._lock = threading.Lock()
+
+    def aguardar(self, tipo):
+        """Bloqueia até haver token para um envio do tipo. Retorna os segundos esperados."""
+        espera = self.baldes[tipo].reservar()
+        if espera > 0:
+            with self._lock:
+                self.na_fila[tipo] += 1
+            try:
+                time.sleep(espera)
+            finally:
+                with self._lock:
+                    self.na_fila[tipo] -= 1
+        with self._lock:
+            self.espera_media[tipo] = (1 - PESO_ESPERA) * self.espera_media[tipo] + PESO_ESPERA * espera
+        return espera
+
+    def registrar(self, tipo, ok, segundos=None, aviso=False):
+        """
+        Resultado de um envio. Erro, aviso do WhatsApp ou ack lento reduzem a taxa
+        (multiplicativo); envio saudável aumenta (aditivo).
+        """
+        limite = LIMITE_ACK_LENTO[tipo]
+        lento = limite is not None and segundos is not None and segundos > limite
+        balde = self.baldes[tipo]
+        if not ok or aviso or lento:
+            nova = max(TAXA_MINIMA[tipo], balde.por_minuto * FATOR_REDUCAO)
+        else:
+            nova = min(TAXA_MAXIMA[tipo], balde.por_minuto + INCREMENTO[tipo])
+        if nova != balde.por_minuto:
+            balde.ajustar_taxa(nova)
+            gravada = self._gravadas[tipo]
+            if abs(nova - gravada) >= LIMIAR_GRAVACAO * gravada:
+                self.salvar()
+        return nova
+
+    def salvar(self):
+        """Grava as taxas atuais se mudaram desde a última gravação."""
+        taxas = {tipo: b.por_minuto for tipo, b in self.baldes.items()}
+        if taxas == self._gravadas:
+            return
+        self._gravadas = taxas
+        _salvar_taxas(self)
+
+    @contextmanager
+    def envio(self, tipo, logger=None):
+        """
+        Envolve uma unidade de envio: espera o token antes e registra o resultado depois.
+        O tempo de ack vem da MedicaoEnvio devolvida (sem clique()/ack(), não conta como lento).
+
+            with ritmo.envio('texto') as medicao:
+                enviar_mensagem_simples(..., ao_enviar=medicao.clique)
+                aguardar_confirmacao_envio(...)
+                medicao.ack()
+        """
+        espera = self.aguardar(tipo)
+        if espera >= 1 and logger:
+            logger(f"Ritmo de envio: aguardou {espera:.1f}s ({self.baldes[tipo].por_minuto:.1f} {tipo}/min).")
+        medicao = MedicaoEnvio()
+        try:
+            yield medicao
+        except Exception:
+            self.registrar(tipo, False)
+            raise
+        self.registrar(tipo, True, medicao.segundos_ack)
+
+    def estado(self):
+        """Taxa atual e espera na fila por tipo, para exibir/monitorar."""
+        with self._lock:
+            return {
+                tipo: {
+                    'por_minuto': round(balde.por_minuto, 2),
+                    'espera_media_s': round(self.espera_media[tipo], 2),
+                    'na_fila': self.na_fila[tipo],
+                }
+                for tipo, balde in self.baldes.items()
+            }
+
+
+# =============================
+# REGISTRO POR CONTA
+# =============================
+_contas = {}
+_contas_lock = threading.Lock()
+
+
+def _chave_conta(userdir):
+    return os.path.normcase(os.path.abspath(userdir or "padrao"))
+
+
+def _carregar_taxas():
+    try:
+        with open(_arquivo_ritmo(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _salvar_taxas(ritmo):
+    try:
+        dados = _carregar_taxas()
+        dados[ritmo.conta] = {tipo: b.por_minuto for tipo, b in ritmo.baldes.items()}
+        caminho = _arquivo_ritmo()
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        tmp = caminho + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(dados, f)
+        os.replace(tmp, caminho)
+    except Exception as e:
+        print(f"Erro ao gravar ritmo de envio: {e}")
+
+
+def ritmo_da_conta(userdir):
+    """RitmoConta compartilhado por todos os envios da conta (perfil do Chrome) neste processo."""
+    conta = _chave_conta(userdir)
+    with _contas_lock:
+        if conta not in _contas:
+            _contas[conta] = RitmoConta(conta, _carregar_taxas().get(conta))
+        return _contas[conta]
+
+
+def salvar_ritmos():
+    """Grava as taxas de todas as contas deste processo (fim de sessão e saída do processo)."""
+    with _contas_lock:
+        ritmos = list(_contas.values())
+    for ritmo in ritmos:
+        ritmo.salvar()
+
+
+atexit.register(salvar_ritmos)
+
+
+def estado_ritmo():
+    """Estado de todas as contas ativas neste processo."""
+    with _contas_lock:
+        return {conta: ritmo.estado() for conta, ritmo in _contas.items()}
@@ -0,0 +1,499 @@
+import os
+import sys
+import time
+import heapq
+import sqlite3
+import threading
+import subprocess
+import traceback
+from datetime import datetime
+
+from core.db import db as db_padrao
+from core.trava_arquivo import TravaArquivo
+from core.recorrencia import materializar
+from core.recuperacao import recuperar_atrasados, TOLERANCIA_ATRASO, LIMIAR_SUSPENSAO
+from core.lease import Lease, DURACAO_LEASE, varrer_leases_vencidos
+from core.fila_envios import FilaEnvios, PedidoEnvio, PRIORIDADE_MANUAL, PRIORIDADE_AGENDADA
+
+# =============================
+# SERVIÇO DE AGENDAMENTO (em processo)
+# =============================
+# Substitui a tarefa do Agendador do Windows por job. Um único processo carrega os jobs
+# pendentes do SchedulerDB num heap ordenado pelo horário e dorme (Condition.wait) até o
+# vencimento do primeiro; o job vencido, junto com os que vencem dentro da JANELA_COALESCENCIA,
+# vai para um worker que atende o grupo numa única sessão do Chrome, sem abrir um processo novo.
+# Funciona igual no Windows e no Linux.
+#
+# Mudanças feitas neste processo (GUI) chamam notificar() e o heap é refeito na hora.
+# Mudanças feitas por outro processo aparecem no PRAGMA data_version, um contador que o SQLite
+# mantém em memória (não lê nenhuma tabela), conferido a cada INTERVALO_VERIFICACAO segundos.
+# O despacho em si não depende desse intervalo: o wait termina no horário exato do job.
+#
+# Na inicialização e ao voltar de uma suspensão, os jobs atrasados passam pela recuperação
+# (core/recuperacao.py): os que estão dentro da tolerância saem juntos numa sessão,
+# os muito atrasados viram 'missed'.
+#
+# Jobs presos em 'running' por um executor que caiu (lease vencido, ver core/lease.py) são
+# devolvidos à política de retentativas a cada INTERVALO_VARREDURA_LEASES segundos.
+#
+# Jobs que falharam com erro retentável voltam como 'pending' com proxima_tentativa
+# (core/retentativas.py) e entram no heap por ela, como qualquer outro job.
+#
+# Os grupos vencidos não vão direto para os workers: entram na FilaEnvios (core/fila_envios.py)
+# com prioridade de agendamento, atrás de qualquer "Enviar Agora" da GUI (enviar_agora()).
+#
+# Só um processo por vez é o serviço (trava em data/servico.lock): a GUI sobe o serviço
+# se ele não estiver rodando, e `app.py --servico` roda o serviço sem interface.
+# Se a GUI abre com um serviço sem interface rodando (o que ela mesma deixou ao fechar), ela
+# pede a vez (data/servico.parar, ver assumir()): o outro processo termina os envios em
+# andamento, solta a trava e sai, e a GUI passa a ser o serviço, com a fila de "Enviar Agora".
+# Processos extras (`app.py --trabalhador`, exclusivo=False) só despacham. O despacho
+# reserva o grupo inteiro (todos os pendentes que vencem até o fim da janela, até
+# MAXIMO_GRUPO) num único UPDATE ... RETURNING atômico (SchedulerDB.reservar), então
+# N processos puxam da mesma fila sem dividir um grupo entre vários Chromes: quem não
+# levou nada não abre sessão. A reserva não muda o status: os jobs seguem 'pending'
+# (editáveis na GUI) até a vez de cada um na sessão, quando são reivindicados um a um
+# (SchedulerDB.reivindicar) e só então ganham o lease de execução. Materialização,
+# recuperação de atrasados e varredura de leases ficam com o serviço principal.
+
+# "servico": este módulo dispara os jobs (padrão)
+# "windows": uma tarefa do Agendador do Windows por job (core/windows_scheduler.py)
+BACKEND_AGENDAMENTO = "servico"
+
+INTERVALO_VERIFICACAO = 5.0
+# Jobs que vencem até esta quantidade de segundos depois do primeiro vão na mesma sessão
+# do Chrome (um navegador para 08:00, 08:01 e 08:03, em vez de três)
+JANELA_COALESCENCIA = 300
+# Máximo de jobs reservados por grupo; o que sobrar sai no despacho seguinte
+MAXIMO_GRUPO = 50
+# De quanto em quanto tempo as regras recorrentes ganham novas ocorrências (ver core/recorrencia.py)
+INTERVALO_MATERIALIZACAO = 3600
+INTERVALO_VARREDURA_LEASES = 60
+# Quanto a GUI espera o serviço sem interface terminar os envios em andamento e soltar a trava
+PRAZO_ASSUMIR = 900
+# Um único perfil do Chrome: dois envios ao mesmo tempo disputariam o mesmo navegador
+WORKERS_PADRAO = 1
+
+
+def _base_dir():
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def _arquivo_trava():
+    return os.path.join(_base_dir(), "data", "servico.lock")
+
+
+def _arquivo_pedido_parada():
+    return os.path.join(_base_dir(), "data", "servico.parar")
+
+
+def pedir_parada_servico():
+    """Pede ao serviço de outro processo para sair (ele confere o pedido a cada INTERVALO_VERIFICACAO)."""
+    caminho = _arquivo_pedido_parada()
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, "w") as f:
+        f.write(str(os.getpid()))
+
+
+def parada_pedida():
+    return os.path.exists(_arquivo_pedido_parada())
+
+
+def _descartar_pedido_parada():
+    try:
+        os.remove(_arquivo_pedido_parada())
+    except FileNotFoundError:
+        pass
+
+
+def epoch_agendamento(scheduled_time):
+    """Converte o scheduled_time do banco (ISO ou datetime) em timestamp; None se inválido."""
+    try:
+        if isinstance(scheduled_time, datetime):
+            return scheduled_time.timestamp()
+        return datetime.fromisoformat(str(scheduled_time)).timestamp()
+    except ValueError:
+        return None
+
+
+def vencimento_job(task):
+    """Epoch em que o job (dict do banco) deve sair: a próxima tentativa, se houver, ou o horário agendado."""
+    return epoch_agendamento(task.get('proxima_tentativa') or task['scheduled_time'])
+
+
+class ServicoAgendador:
+    """
+    Timer heap sobre os jobs pendentes + fila com prioridade + workers.
+
+    Args:
+        executar: função chamada com (lista de task_ids, logger=..., fila=..., reservados=...,
+                  lease=...) para cada grupo de jobs reservados (padrão: core.execucao.executar_sessao)
+        workers: quantas sessões podem rodar ao mesmo tempo
+        janela: segundos de coalescência (0 = uma sessão por job)
+        tolerancia: atraso máximo (segundos) para um job perdido ainda sair na recuperação
+        exclusivo: False para um trabalhador extra (sem a trava do serviço e sem manutenção)
+    """
+
+    def __init__(self, executar=None, workers=WORKERS_PADRAO, db=None, logger=None,
+                 janela=JANELA_COALESCENCIA, tolerancia=TOLERANCIA_ATRASO, exclusivo=True):
+        if executar is None:
+            from core.execucao import executar_sessao as executar
+        self.executar = executar
+        self.workers = workers
+        self.janela = janela
+        self.tolerancia = tolerancia
+        self.exclusivo = exclusivo
+        self.db = db or db_padrao
+        self.logger = logger
+
+        self._heap = []              # (vencimento em epoch, task_id)
+        self._cond = threading.Condition()
+        self._sujo = True
+        self._ativo = False
+        self._thread = None
+        self._trabalhadores = []
+        self.fila = FilaEnvios()
+        self._conn_versao = None
+        self._versao = None
+        self._proxima_materializacao = 0.0
+        self._ultimo_ciclo = None
+        self._proxima_varredura = 0.0
+        self._leases_recuperados = 0
+        self._trava = TravaArquivo(_arquivo_trava())
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger(msg)
+        else:
+            print(msg)
+
+    # =============================
+    # CICLO DE VIDA
+    # =============================
+    def iniciar(self):
+        """
+        Sobe o serviço numa thread de fundo.
+        Retorna False se outro processo já é o serviço de agendamento.
+        """
+        if self._ativo:
+            return True
+        if self.exclusivo and not self._trava.adquirir():
+            self._log("Serviço de agendamento já está rodando em outro processo.")
+            return False
+        if self.exclusivo:
+            # Pedido de parada que sobrou de uma troca anterior não derruba este serviço
+            _descartar_pedido_parada()
+
+        self.fila = FilaEnvios()
+        self._trabalhadores = [
+            threading.Thread(target=self._trabalhador, name=f"servico_envio_{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._trabalhadores:
+            t.start()
+        self._conn_versao = sqlite3.connect(str(self.db.db_path), check_same_thread=False)
+        self._versao = None
+        self._ultimo_ciclo = None
+        self._sujo = True
+        self._ativo = True
+        self._thread = threading.Thread(target=self._loop, name="servico_agendador", daemon=True)
+        self._thread.start()
+        self._log("✓ Serviço de agendamento iniciado." if self.exclusivo else "✓ Trabalhador de envio iniciado.")
+        return True
+
+    def parar(self, esperar=True):
+        """Para o despacho. Com esperar=True, aguarda os envios em andamento terminarem."""
+        if not self._ativo:
+            return
+        with self._cond:
+            self._ativo = False
+            self._cond.notify_all()
+        self._thread.join()
+        self.fila.fechar()
+        if esperar:
+            for t in self._trabalhadores:
+                t.join()
+        # Envios manuais que não chegaram a sair não ficam esperando para sempre
+        while True:
+            pedido = self.fila.retirar(timeout=0)
+            if pedido is None:
+                break
+            if pedido.tipo == 'sessao':
+                self._liberar(pedido)
+            pedido.concluir(erro=Exception("Serviço de agendamento parado antes do envio."))
+        self._conn_versao.close()
+        self._trava.liberar()
+        self._log("Serviço de agendamento parado.")
+
+    def assumir(self, prazo=PRAZO_ASSUMIR):
+        """
+        Sobe o serviço neste processo; se outro processo já for o serviço, pede que ele saia
+        e espera a trava ser solta (bloqueia até `prazo` segundos, rode fora da thread da GUI).
+        Retorna False se o outro serviço não saiu a tempo.
+        """
+        if self.iniciar():
+            return True
+        pedir_parada_servico()
+        limite = time.monotonic() + prazo
+        while time.monotonic() < limite:
+            if self._trava.adquirir():
+                return self.iniciar()
+            time.sleep(1.0)
+        _descartar_pedido_parada()
+        self._log("O serviço de agendamento em outro processo não saiu a tempo.")
+        return False
+
+    @property
+    def ativo(self):
+        return self._ativo
+
+    def notificar(self):
+        """Avisa que os agendamentos mudaram (novo, editado, excluído)."""
+        with self._cond:
+            self._sujo = True
+            self._cond.notify_all()
+
+    def enviar_agora(self, target, mode, message=None, file_path=None):
+        """
+        Coloca um envio manual na frente da fila. Se houver uma sessão aberta, ele é
+        atendido no próximo ponto seguro dela; senão, o próximo worker livre abre o Chrome.
+
+        Returns:
+            PedidoEnvio: use .concluido / .aguardar() para acompanhar
+        """
+        dados = {'target': target, 'mode': mode, 'message': message, 'file_path': file_path}
+        return self.fila.colocar(PedidoEnvio('manual', dados, PRIORIDADE_MANUAL))
+
+    def estatisticas_fila(self):
+        """Espera na fila por classe de prioridade (ver FilaEnvios.estatisticas)."""
+        return self.fila.estatisticas()
+
+    def metricas_leases(self):
+        """Jobs 'running' com lease vencido agora e total devolvido pelo varredor desde que o serviço subiu."""
+        return {
+            'vencidos': len(self.db.listar_leases_vencidos(datetime.now())),
+            'recuperados': self._leases_recuperados,
+        }
+
+    def proximo(self):
+        """(datetime, task_id) do próximo job a vencer, ou None."""
+        with self._cond:
+            if not self._heap:
+                return None
+            vencimento, task_id = self._heap[0]
+            return datetime.fromtimestamp(vencimento), task_id
+
+    # =============================
+    # LAÇO PRINCIPAL
+    # =============================
+    def _db_mudou(self):
+        try:
+            versao = self._conn_versao.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            self._log(f"Erro ao consultar versão do banco: {e}")
+            return True
+        mudou = versao != self._versao
+        self._versao = versao
+        return mudou
+
+    def _montar_heap(self):
+        """Novo heap a partir dos jobs pendentes do banco (não mexe no heap atual)."""
+        heap = []
+        # Job reservado por uma sessão (deste ou de outro processo) só volta a ser despachado
+        # se a reserva vencer sem ele ter saído
+        reservas = self.db.listar_reservas(datetime.now())
+        for task_id, horario in self.db.listar_vencimentos():
+            vencimento = epoch_agendamento(horario)
+            if vencimento is None:
+                self._log(f"Agendamento {task_id} com horário inválido: {horario!r}")
+                continue
+            if task_id in reservas:
+                vencimento = max(vencimento, epoch_agendamento(reservas[task_id]) or vencimento)
+            heap.append((vencimento, task_id))
+        heapq.heapify(heap)
+        return heap
+
+    def _gatilho_recuperacao(self):
+        """'inicio' no primeiro ciclo, 'retomada' se o último ciclo foi há muito tempo (suspensão)."""
+        agora = time.time()
+        anterior, self._ultimo_ciclo = self._ultimo_ciclo, agora
+        if anterior is None:
+            return 'inicio'
+        if agora - anterior > INTERVALO_VERIFICACAO + LIMIAR_SUSPENSAO:
+            return 'retomada'
+        return None
+
+    def _manutencao(self):
+        """
+        Varredura de leases, recuperação de atrasados e materialização (só no serviço principal).
+        Retorna True se algo mudou nos pendentes (o heap precisa ser refeito).
+        """
+        mudou = False
+        if time.time() >= self._proxima_varredura:
+            self._proxima_varredura = time.time() + INTERVALO_VARREDURA_LEASES
+            recuperados = varrer_leases_vencidos(self.db, logger=self.logger)
+            if recuperados:
+                self._leases_recuperados += recuperados
+                mudou = True
+
+        gatilho = self._gatilho_recuperacao()
+        if gatilho:
+            recuperar_atrasados(self.db, tolerancia=self.tolerancia, gatilho=gatilho,
+                                logger=self.logger)
+            mudou = True
+
+        if time.time() >= self._proxima_materializacao:
+            self._proxima_materializacao = time.time() + INTERVALO_MATERIALIZACAO
+            if materializar(self.db, logger=self.logger):
+                mudou = True
+        return mudou
+
+    def _loop(self):
+        # O lock (self._cond) só protege o heap e a espera. Banco e manutenção rodam fora dele:
+        # notificar() e proximo(), chamados pela thread da GUI, nunca esperam por I/O.
+        while True:
+            with self._cond:
+                if not self._ativo:
+                    break
+                sujo, self._sujo = self._sujo, False
+            espera = INTERVALO_VERIFICACAO
+            try:
+                if self.exclusivo and self._manutencao():
+                    sujo = True
+                if self._db_mudou() or sujo:
+                    heap = self._montar_heap()
+                    with self._cond:
+                        self._heap = heap
+
+                agora = time.time()
+                grupo = None
+                with self._cond:
+                    if self._heap and self._heap[0][0] <= agora:
+                        # Venceu um job: leva junto os que vencem dentro da janela
+                        fim_janela = agora + self.janela
+                        grupo = (self._heap[0][0], fim_janela)
+                        while self._heap and self._heap[0][0] <= fim_janela:
+                            heapq.heappop(self._heap)
+                if grupo:
+                    self._despachar(*grupo)
+
+                with self._cond:
+                    if self._heap:
+                        espera = min(espera, self._heap[0][0] - agora)
+            except Exception as e:
+                self._log(f"Erro no serviço de agendamento: {e}")
+                traceback.print_exc()
+            with self._cond:
+                # Mudança avisada enquanto o ciclo rodava sem o lock: refaz na hora, sem dormir
+                if self._ativo and not self._sujo:
+                    self._cond.wait(timeout=max(0.0, espera))
+
+    def _despachar(self, prazo, fim_janela):
+        """
+        Reserva de uma vez os pendentes que vencem até fim_janela e põe o grupo na fila.
+        O heartbeat do lease mantém a reserva enquanto o grupo espera atrás de envios manuais;
+        os jobs continuam 'pending' até a sessão reivindicar cada um na hora de enviá-lo.
+        """
+        lease = Lease(self.db).iniciar()
+        jobs = self.db.reservar(lease.dono, DURACAO_LEASE, ate=datetime.fromtimestamp(fim_janela),
+                                limite=MAXIMO_GRUPO)
+        # O que ficou de fora (outro processo levou, ou passou de MAXIMO_GRUPO) volta pelo heap
+        with self._cond:
+            self._sujo = True
+        if not jobs:
+            lease.parar()
+            return
+        for job in jobs:
+            lease.adicionar(job['id'])
+        self.fila.colocar(PedidoEnvio('sessao', {'jobs': jobs, 'lease': lease}, PRIORIDADE_AGENDADA, prazo))
+
+    def _liberar(self, pedido):
+        """Grupo reservado que não vai mais sair (serviço parando): solta as reservas."""
+        lease = pedido.dados['lease']
+        lease.parar()
+        self.db.liberar_reservas([job['id'] for job in pedido.dados['jobs']], lease.dono)
+
+    def _trabalhador(self):
+        while True:
+            pedido = self.fila.retirar()
+            if pedido is None:
+                return
+            if not self._ativo:
+                # Serviço parando: grupos agendados continuam 'pending' no banco para a próxima vez
+                if pedido.tipo == 'manual':
+                    pedido.concluir(erro=Exception("Serviço de agendamento parado antes do envio."))
+                else:
+                    self._liberar(pedido)
+                return
+            if pedido.tipo == 'manual':
+                from core.execucao import executar_manual
+                self._log(f"Envio manual (esperou {pedido.espera:.1f}s na fila)...")
+                executar_manual(pedido, logger=self.logger)
+            else:
+                self._rodar(pedido.dados, pedido.espera)
+
+    def _rodar(self, grupo, espera=0.0):
+        task_ids = [job['id'] for job in grupo['jobs']]
+        self._log(f"Disparando agendamento(s) {', '.join(map(str, task_ids))} (esperou {espera:.1f}s na fila)...")
+        try:
+            self.executar(task_ids, logger=self.logger, fila=self.fila,
+                          reservados=grupo['jobs'], lease=grupo['lease'])
+        except Exception as e:
+            self._log(f"Sessão dos agendamentos {task_ids} falhou: {e}")
+        finally:
+            with self._cond:
+                self._sujo = True
+                self._cond.notify_all()
+
+
+# =============================
+# PONTOS DE ENTRADA
+# =============================
+def rodar_em_primeiro_plano(logger=None, exclusivo=True, userdir=None):
+    """
+    Roda o serviço até Ctrl+C (usado por `app.py --servico` e `app.py --trabalhador`).
+    Com userdir, as sessões usam esse perfil do Chrome (outra conta). Retorna o código de saída.
+    """
+    executar = None
+    if userdir:
+        from functools import partial
+        from core.execucao import executar_sessao
+        executar = partial(executar_sessao, userdir=userdir)
+    servico = ServicoAgendador(executar=executar, logger=logger, exclusivo=exclusivo)
+    if not servico.iniciar():
+        return 1
+    try:
+        while servico.ativo:
+            if exclusivo and parada_pedida():
+                # A GUI abriu e vai assumir o serviço (ver ServicoAgendador.assumir)
+                servico._log("Interface aberta: passando o serviço de agendamento para ela...")
+                break
+            time.sleep(INTERVALO_VERIFICACAO)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servico.parar()
+    return 0
+
+
+def comando_servico():
+    """Linha de comando que sobe o serviço sem interface."""
+    if getattr(sys, 'frozen', False):
+        return [sys.executable, "--servico"]
+    return [sys.executable, os.path.join(_base_dir(), "app.py"), "--servico"]
+
+
+def iniciar_servico_destacado():
+    """Sobe o serviço num processo independente (continua depois que a GUI fecha)."""
+    kwargs = {}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    subprocess.Popen(
+        comando_servico(), cwd=_base_dir(),
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        **kwargs
+    )
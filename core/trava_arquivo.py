@@ -0,0 +1,69 @@
+import os
+import sys
+
+
+# =============================
+# TRAVA DE ARQUIVO ENTRE PROCESSOS
+# =============================
+# Trava exclusiva do SO sobre um arquivo (msvcrt no Windows, fcntl no Linux).
+# O SO solta a trava sozinho se o processo morrer, então não sobra trava órfã.
+
+class TravaArquivo:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._arquivo = None
+
+    def adquirir(self, bloquear=False):
+        """Tenta pegar a trava. Retorna True se conseguiu."""
+        if self._arquivo:
+            return True
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        f = open(self.caminho, "a+")
+        try:
+            if sys.platform == "win32":
+                import msvcrt
+                f.seek(0)
+                modo = msvcrt.LK_LOCK if bloquear else msvcrt.LK_NBLCK
+                msvcrt.locking(f.fileno(), modo, 1)
+            else:
+                import fcntl
+                flags = fcntl.LOCK_EX if bloquear else fcntl.LOCK_EX | fcntl.LOCK_NB
+                fcntl.flock(f.fileno(), flags)
+        except OSError:
+            f.close()
+            return False
+        self._arquivo = f
+        return True
+
+    def liberar(self):
+        if not self._arquivo:
+            return
+        try:
+            if sys.platform == "win32":
+                import msvcrt
+                self._arquivo.seek(0)
+                msvcrt.locking(self._arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._arquivo.fileno(), fcntl.LOCK_UN)
+        except OSError:
+            pass
+        finally:
+            self._arquivo.close()
+            self._arquivo = None
+
+    @property
+    def adquirida(self):
+        return self._arquivo is not None
+
+    def __enter__(self):
+        # No Windows o LK_LOCK desiste depois de ~10 tentativas de 1 s: insiste até conseguir.
+        # No Linux o flock bloqueante só falha por erro de verdade (permissão, disco...).
+        while not self.adquirir(bloquear=True):
+            if sys.platform != "win32":
+                raise Exception(f"Não foi possível travar {self.caminho}.")
+        return self
+
+    def __exit__(self, *exc):
+        self.liberar()
+        return False
@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import time
+import uuid
+import hashlib
+
+from core.trava_arquivo import TravaArquivo
+
+# =============================
+# TRAVA DO PERFIL DO CHROME (entre processos)
+# =============================
+# Um perfil (user-data-dir) só aguenta um Chrome por vez. Antes de abrir o navegador,
+# quem vai usar o perfil (GUI, serviço, app.py --auto, executor_cli.py) pega a trava
+# data/travas/<perfil>.lock; quem chega depois entra numa fila de admissão FIFO e espera
+# a vez, até TIMEOUT_ADMISSAO, em vez de falhar ou disputar o Chrome.
+#
+# A fila é o arquivo <perfil>.fila.json (bilhetes em ordem de chegada), sempre alterado sob
+# a trava curta <perfil>.fila.lock. Só o primeiro bilhete tenta a trava do perfil.
+# Cada bilhete é renovado enquanto espera; bilhete sem renovação há VALIDADE_BILHETE segundos
+# (processo morto) sai da fila. A trava do perfil em si é do SO e some junto com o processo.
+TIMEOUT_ADMISSAO = 600
+INTERVALO_FILA = 0.25
+VALIDADE_BILHETE = 15
+
+
+def _pasta_travas():
+    if getattr(sys, 'frozen', False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    return os.path.join(base_dir, "data", "travas")
+
+
+def _nome_perfil(userdir):
+    caminho = os.path.normcase(os.path.abspath(userdir))
+    digest = hashlib.sha1(caminho.encode("utf-8")).hexdigest()[:10]
+    return f"{os.path.basename(caminho.rstrip(os.sep)) or 'perfil'}_{digest}"
+
+
+class TravaPerfil:
+    """
+    Trava de um perfil do Chrome com fila de admissão justa entre processos.
+
+        trava = TravaPerfil(userdir)
+        espera = trava.adquirir()      # segundos na fila
+        ...
+        trava.liberar()
+    """
+
+    def __init__(self, userdir, timeout=TIMEOUT_ADMISSAO, pasta=None):
+        pasta = pasta or _pasta_travas()
+        nome = _nome_perfil(userdir)
+        self.userdir = userdir
+        self.timeout = timeout
+        self.espera = None
+        self._trava = TravaArquivo(os.path.join(pasta, f"{nome}.lock"))
+        self._mutex_fila = TravaArquivo(os.path.join(pasta, f"{nome}.fila.lock"))
+        self._arquivo_fila = os.path.join(pasta, f"{nome}.fila.json")
+
+    # -------- fila (sempre sob _mutex_fila) --------
+    def _ler_fila(self):
+        try:
+            with open(self._arquivo_fila, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _gravar_fila(self, fila):
+        tmp = self._arquivo_fila + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(fila, f)
+        os.replace(tmp, self._arquivo_fila)
+
+    def _na_fila(self, bilhete, acao):
+        """Aplica `acao(fila, agora)` sob a trava da fila e devolve o resultado."""
+        with self._mutex_fila:
+            agora = time.time()
+            fila = [b for b in self._ler_fila()
+                    if b["id"] == bilhete or agora - b["visto"] <= VALIDADE_BILHETE]
+            resultado = acao(fila, agora)
+            self._gravar_fila(fila)
+            return resultado
+
+    # -------- API --------
+    def adquirir(self, logger=None):
+        """
+        Espera a vez na fila e pega a trava do perfil.
+
+        Returns:
+            float: segundos de espera
+        Raises:
+            TimeoutError: se a vez não chegou em `timeout` segundos
+        """
+        if self._trava.adquirida:
+            return 0.0
+        inicio = time.monotonic()
+        bilhete = uuid.uuid4().hex
+
+        def entrar(fila, agora):
+            fila.append({"id": bilhete, "pid": os.getpid(), "visto": agora})
+            return len(fila) - 1
+
+        def tentar(fila, agora):
+            meu = next((b for b in fila if b["id"] == bilhete), None)
+            if meu is None:
+                # Ficou sem renovar (ex.: suspensão) e outro processo tirou o bilhete: volta ao fim
+                entrar(fila, agora)
+            else:
+                meu["visto"] = agora
+            if fila and fila[0]["id"] == bilhete and self._trava.adquirir():
+                fila.pop(0)
+                return True
+            return False
+
+        def sair(fila, agora):
+            fila[:] = [b for b in fila if b["id"] != bilhete]
+
+        na_frente = self._na_fila(bilhete, entrar)
+        if na_frente and logger:
+            logger(f"Perfil do Chrome em uso: aguardando a vez ({na_frente} na frente).")
+        try:
+            while not self._na_fila(bilhete, tentar):
+                if time.monotonic() - inicio > self.timeout:
+                    raise TimeoutError(
+                        f"Perfil do Chrome ocupado por outro envio há mais de {self.timeout}s."
+                    )
+                time.sleep(INTERVALO_FILA)
+        except BaseException:
+            self._na_fila(bilhete, sair)
+            raise
+
+        self.espera = time.monotonic() - inicio
+        if self.espera >= 1 and logger:
+            logger(f"Perfil do Chrome liberado após {self.espera:.1f}s de espera.")
+        return self.espera
+
+    def liberar(self):
+        self._trava.liberar()
+
+    @property
+    def adquirida(self):
+        return self._trava.adquirida
+
+    def __enter__(self):
+        self.adquirir()
+        return self
+
+    def __exit__(self, *exc):
+        self.liberar()
+        return False
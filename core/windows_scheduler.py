@@ -1,7 +1,5 @@
 import os
 import sys
-import json
-import subprocess
 from pathlib import Path
 from datetime import datetime
 
@@ -14,39 +12,34 @@ def get_app_base_path():
         # Se for script, aponta para a raiz do projeto (meu-teste)
         return Path(__file__).parent.parent.absolute()
 
-def create_task_bat(task_id, task_name, json_config):
-    """Cria um arquivo .bat para ser executado pelo Agendador do Windows"""
+# Lançador único em scheduled_tasks: a tarefa de cada job chama `executar_job.bat <id>`
+# e o app carrega o job do banco (nada de .json/.bat por job)
+LANCADOR = "executar_job.bat"
+
+def garantir_lancador():
+    """Cria (ou atualiza) o lançador compartilhado pelas tarefas dos jobs. Retorna o caminho."""
     app_path = get_app_base_path()
     scheduled_tasks_dir = app_path / "scheduled_tasks"
     scheduled_tasks_dir.mkdir(exist_ok=True)
+    bat_path = scheduled_tasks_dir / LANCADOR
     
-    json_filename = f"task_{task_id}.json"
-    bat_filename = f"task_{task_id}.bat"
-    
-    json_path = scheduled_tasks_dir / json_filename
-    bat_path = scheduled_tasks_dir / bat_filename
-    
-    # 1. Salva a configuração da tarefa em JSON
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(json_config, f, indent=2, ensure_ascii=False)
-    
-    # 2. Cria o arquivo .bat dinâmico com aspas duplas em todos os caminhos
     if getattr(sys, 'frozen', False):
-        exe_path = app_path / "Study Practices.exe" 
-        bat_content = f"""@echo off
-chcp 65001 >nul
-cd /d "{app_path}"
-"{exe_path}" --auto "{json_path}" --task_id {task_id}
-"""
+        comando = f'"{app_path / "Study Practices.exe"}" --auto --task_id %1'
     else:
-        python_path = sys.executable
-        script_path = app_path / "app.py"
-        bat_content = f"""@echo off
+        comando = f'"{sys.executable}" "{app_path / "app.py"}" --auto --task_id %1'
+    bat_content = f"""@echo off
 chcp 65001 >nul
 cd /d "{app_path}"
-"{python_path}" "{script_path}" --auto "{json_path}" --task_id {task_id}
+{comando}
 """
     
+    # Só regrava se mudou (ex.: pasta do app ou Python diferentes)
+    try:
+        with open(bat_path, 'r', encoding='utf-8') as f:
+            if f.read() == bat_content:
+                return str(bat_path)
+    except OSError:
+        pass
     # Grava o BAT com UTF-8 para suportar o comando chcp 65001
     with open(bat_path, 'w', encoding='utf-8') as f:
         f.write(bat_content)
@@ -58,8 +51,9 @@ def create_windows_task(task_id, task_name, schedule_time, schedule_date=None):
     Cria uma tarefa no Agendador do Windows.
     Retorna (True, "Mensagem") para a interface conseguir 'desempacotar'.
     """
-    app_path = get_app_base_path()
-    bat_path = app_path / "scheduled_tasks" / f"task_{task_id}.bat"
+    from core.reconciliador import BackendSchtasks
+
+    bat_path = garantir_lancador()
     
     if len(schedule_time.split(':')) > 2:
         schedule_time = ':'.join(schedule_time.split(':')[:2])
@@ -67,14 +61,13 @@ def create_windows_task(task_id, task_name, schedule_time, schedule_date=None):
     if not schedule_date:
         schedule_date = datetime.now().strftime("%d/%m/%Y")
 
-    # Comando com aspas para o seu caminho 'CAIO MAXIMUS' e privilégio administrativo
-    cmd = f'schtasks /create /tn "AutoMessage_{task_id}" /tr "\\"{bat_path}\\"" /sc once /st {schedule_time} /sd {schedule_date} /rl highest /f'    
-    
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    
-    if result.returncode != 0:
+    try:
+        quando = datetime.strptime(f"{schedule_date} {schedule_time}", "%d/%m/%Y %H:%M")
+        # Argumentos em lista (sem shell): caminhos com espaço não quebram o comando
+        BackendSchtasks().criar({'id': task_id}, bat_path, quando)
+    except Exception as e:
         # Retorna False e o erro para a interface
-        return False, result.stderr
+        return False, str(e)
     
     # Retorna True e sucesso para a interface
     return True, "Agendamento criado com sucesso!"
@@ -83,6 +76,32 @@ def create_windows_task(task_id, task_name, schedule_time, schedule_date=None):
 
 def delete_windows_task(task_id):
     """Remove a tarefa do agendador usando o padrão de nome correto"""
-    task_name = f"AutoMessage_{task_id}"
-    cmd = f'schtasks /delete /tn "{task_name}" /f'
-    subprocess.run(cmd, shell=True, capture_output=True)
\ No newline at end of file
+    from core.reconciliador import BackendSchtasks, PREFIXO_TAREFA
+
+    try:
+        BackendSchtasks().remover(f"{PREFIXO_TAREFA}{task_id}")
+    except Exception:
+        # Tarefa que já não existe não é erro
+        pass
+
+# Tarefa única que sobe o serviço de agendamento (core/servico_agendador.py) no logon
+TAREFA_SERVICO = "AutoMessage_Servico"
+
+def garantir_tarefa_servico(backend=None):
+    """
+    Cria, se ainda não existir, a tarefa que inicia o serviço de agendamento no logon.
+    Substitui a tarefa por job: os horários ficam só no banco.
+    Retorna (True/False, "Mensagem") como create_windows_task.
+    """
+    from core.servico_agendador import comando_servico
+    from core.reconciliador import BackendSchtasks
+
+    backend = backend or BackendSchtasks()
+    if backend.existe(TAREFA_SERVICO):
+        return True, "Agendamento criado com sucesso!"
+
+    try:
+        backend.criar_no_logon(TAREFA_SERVICO, comando_servico())
+    except Exception as e:
+        return False, str(e)
+    return True, "Agendamento criado com sucesso!"
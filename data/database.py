@@ -28,6 +28,11 @@ def init_db(conn):
             last_error TEXT
         )
     """)
+    # get_pending_tasks: status + faixa de horário direto no índice
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_agendamentos_status_horario
+        ON agendamentos (status, scheduled_time)
+    """)
     conn.commit()
 
 
@@ -1,33 +1,19 @@
 # executor_cli.py
 import sys
-from core.db import db
-from core import automation
+from core.execucao import executar_job
 
 def run_task(task_id):
-    try:
-        # 1. Busca dados no banco
-        task = db.obter_por_id(task_id) 
-        if not task: return
+    """
+    Executa o agendamento `task_id` do banco, pelo mesmo caminho do `app.py --auto`:
+    reivindica o job (lease; já concluído ou com outro executor não abre o navegador),
+    envia com checkpoints e chaves de envio e, se falhar, aplica a política de retentativas.
 
-        db.atualizar_status(task_id, "processando")
-
-        # 2. Executa a automação
-        automation.executar_envio(
-            userdir=task['userdir'], 
-            target=task['target'],
-            mode=task['mode'],
-            message=task['message'],
-            file_path=task['file_path'],
-            modo_execucao='background' 
-        )
-
-        # 3. Sucesso
-        db.atualizar_status(task_id, "sucesso")
-        
-    except Exception as e:
-        db.registrar_erro(task_id, str(e))
-        db.atualizar_status(task_id, "falha")
+    Returns:
+        str: 'completed' | 'retentar' | 'dead_letter' | 'ignorado'
+    """
+    return executar_job(task_id, modo_execucao='auto')
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
-        run_task(sys.argv[1])
\ No newline at end of file
+        resultado = run_task(int(sys.argv[1]))
+        sys.exit(0 if resultado in ('completed', 'ignorado') else 1)
@@ -0,0 +1,49 @@
+import os
+import sys
+import datetime
+
+import pytest
+
+# Os módulos do app são importados como no app.py (a partir da raiz do projeto)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+@pytest.fixture(autouse=True, scope="session")
+def banco_padrao_temporario(tmp_path_factory):
+    """
+    O `db` global de core.db é criado no primeiro uso, em DB_PATH. Apontar DB_PATH para um
+    arquivo temporário antes disso garante que código chamado sem db= também não grava no
+    data/scheduler.db do projeto.
+    """
+    from core import db as modulo_db
+    modulo_db.DB_PATH = tmp_path_factory.mktemp("banco_padrao") / "scheduler.db"
+    yield
+    if modulo_db._padrao is not None:
+        modulo_db._padrao.fechar()
+
+
+@pytest.fixture
+def banco(tmp_path):
+    """SchedulerDB num arquivo temporário, próprio de cada teste."""
+    from core.db import SchedulerDB
+    db = SchedulerDB(tmp_path / "scheduler.db")
+    yield db
+    db.fechar()
+
+
+@pytest.fixture
+def novo_job(banco):
+    """Cria um job de texto pendente e devolve o id: novo_job(quando, **campos)."""
+    contador = iter(range(1, 1_000_000))
+
+    def criar(quando, **campos):
+        dados = dict(task_name=f"teste_{next(contador)}", target="5511999999999", mode="text",
+                     message="teste", scheduled_time=quando)
+        dados.update(campos)
+        return banco.adicionar(**dados)
+    return criar
+
+
+@pytest.fixture
+def agora():
+    return datetime.datetime.now().replace(microsecond=0)
@@ -0,0 +1,137 @@
+import os
+
+import pytest
+
+from core import anexos
+from core.anexos import (
+    planejar_lotes, tipo_envio, TAMANHO_MAXIMO_MIDIA,
+    prazo_upload, prazo_preview, registrar_vazao, carregar_vazao,
+    erros_por_arquivo, verificar_anexos, exigir_anexos_validos,
+    VAZAO_PADRAO, PESO_MEDICAO, MARGEM_PRAZO, PRAZO_MINIMO, PRAZO_MAXIMO, PRAZO_MINIMO_ACK, VAZAO_PREVIEW,
+)
+
+
+@pytest.fixture(autouse=True)
+def vazao_temporaria(tmp_path, monkeypatch):
+    monkeypatch.setattr(anexos, "_arquivo_vazao", lambda: str(tmp_path / "upload_stats.json"))
+
+
+def _arquivos(tmp_path, *nomes):
+    caminhos = []
+    for nome in nomes:
+        caminho = tmp_path / nome
+        caminho.write_bytes(b"x")
+        caminhos.append(str(caminho))
+    return caminhos
+
+
+def test_midia_e_documento_vao_em_lotes_separados_na_ordem_da_selecao(tmp_path):
+    doc, foto, planilha, video = _arquivos(tmp_path, "a.pdf", "b.jpg", "c.xlsx", "d.mp4")
+
+    lotes = planejar_lotes("\n".join([doc, foto, planilha, video]), "legenda")
+
+    assert [(l['tipo'], l['arquivos']) for l in lotes] == [
+        ('documento', [doc, planilha]),
+        ('midia', [foto, video]),
+    ]
+    # A legenda vai no álbum de mídia, mesmo que os documentos saiam antes
+    assert [l['legenda'] for l in lotes] == [None, "legenda"]
+
+
+def test_sem_midia_a_legenda_vai_no_primeiro_lote_de_documentos(tmp_path):
+    lotes = planejar_lotes(_arquivos(tmp_path, "a.pdf", "b.docx"), "oi")
+    assert len(lotes) == 1 and lotes[0]['legenda'] == "oi"
+
+
+def test_lotes_respeitam_o_limite_de_arquivos_por_envio(tmp_path):
+    fotos = _arquivos(tmp_path, *(f"{i}.png" for i in range(7)))
+
+    lotes = planejar_lotes(fotos, "oi", limite=3)
+
+    assert [len(l['arquivos']) for l in lotes] == [3, 3, 1]
+    assert [l['arquivos'] for l in lotes] == [fotos[0:3], fotos[3:6], fotos[6:]]
+    assert [l['legenda'] for l in lotes] == ["oi", None, None]
+    with pytest.raises(ValueError):
+        planejar_lotes(fotos, limite=0)
+
+
+def test_midia_acima_do_limite_vai_como_documento(tmp_path, monkeypatch):
+    pequena, grande = _arquivos(tmp_path, "p.jpg", "g.mp4")
+    tamanhos = {pequena: 10, grande: TAMANHO_MAXIMO_MIDIA + 1}
+    monkeypatch.setattr(anexos.os.path, "getsize", lambda p: tamanhos[p])
+
+    assert tipo_envio(pequena) == 'midia'
+    assert tipo_envio(grande) == 'documento'
+
+
+def test_linhas_vazias_sao_ignoradas(tmp_path):
+    foto, = _arquivos(tmp_path, "a.jpg")
+    lotes = planejar_lotes(f"\n{foto}\n  \n")
+    assert lotes == [{'tipo': 'midia', 'arquivos': [os.path.abspath(foto)], 'legenda': None}]
+    assert planejar_lotes(None, "oi") == []
+
+
+def test_prazo_de_upload_cresce_com_o_tamanho_e_a_vazao():
+    assert prazo_upload(0) == PRAZO_MINIMO_ACK
+    assert prazo_upload(10_000_000, vazao=1_000_000) == PRAZO_MINIMO_ACK + 10 * MARGEM_PRAZO
+    # Link mais rápido, prazo menor; nunca passa do teto
+    assert prazo_upload(10_000_000, vazao=2_000_000) < prazo_upload(10_000_000, vazao=1_000_000)
+    assert prazo_upload(10 ** 12, vazao=1_000_000) == PRAZO_MAXIMO
+
+
+def test_prazo_do_preview_nao_depende_da_rede():
+    registrar_vazao(10_000_000, 100)   # rede lenta medida
+    assert prazo_preview(0) == PRAZO_MINIMO
+    assert prazo_preview(VAZAO_PREVIEW) == PRAZO_MINIMO + MARGEM_PRAZO
+    assert prazo_preview(10 ** 12) == PRAZO_MAXIMO
+
+
+def test_vazao_medida_entra_na_media_e_persiste():
+    assert carregar_vazao() == VAZAO_PADRAO
+
+    esperada = (1 - PESO_MEDICAO) * VAZAO_PADRAO + PESO_MEDICAO * 5_000_000
+    assert registrar_vazao(10_000_000, 2) == pytest.approx(esperada)
+    assert carregar_vazao() == pytest.approx(esperada)
+    # Com a vazão maior, o mesmo upload ganha prazo menor
+    assert prazo_upload(10_000_000) < prazo_upload(10_000_000, vazao=VAZAO_PADRAO)
+
+
+def test_upload_pequeno_ou_instantaneo_nao_mexe_na_estimativa():
+    assert registrar_vazao(1024, 1) == VAZAO_PADRAO
+    assert registrar_vazao(10_000_000, 0) == VAZAO_PADRAO
+    assert carregar_vazao() == VAZAO_PADRAO
+
+
+def _gravar(tmp_path, nome, conteudo):
+    caminho = tmp_path / nome
+    caminho.write_bytes(conteudo)
+    return str(caminho)
+
+
+def test_preflight_aponta_cada_problema_na_ordem_da_selecao(tmp_path):
+    ok_pdf = _gravar(tmp_path, "ok.pdf", b"%PDF-1.4")
+    ok_png = _gravar(tmp_path, "ok.png", b"\x89PNG\r\n\x1a\n" + b"0" * 8)
+    vazio = _gravar(tmp_path, "vazio.pdf", b"")
+    falso = _gravar(tmp_path, "falso.jpg", b"isto nao e um jpeg")
+    bloqueado = _gravar(tmp_path, "setup.exe", b"MZ")
+    sumiu = str(tmp_path / "sumiu.pdf")
+
+    erros = verificar_anexos([ok_pdf, vazio, falso, ok_png, bloqueado, sumiu])
+
+    assert len(erros) == 4
+    assert erros[0].startswith("vazio.pdf: arquivo vazio")
+    assert erros[1].startswith("falso.jpg: conteúdo não corresponde")
+    assert erros[2].startswith("setup.exe: tipo de arquivo não permitido")
+    assert erros[3].startswith("sumiu.pdf: arquivo não encontrado")
+    assert set(erros_por_arquivo([ok_pdf, ok_png, vazio])) == {vazio}
+
+
+def test_exigir_anexos_validos_junta_todos_os_erros(tmp_path):
+    ok = _gravar(tmp_path, "ok.pdf", b"%PDF")
+    assert exigir_anexos_validos(ok) is True
+
+    with pytest.raises(Exception) as erro:
+        exigir_anexos_validos("\n".join([ok, str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")]))
+    assert "a.pdf: arquivo não encontrado" in str(erro.value)
+    assert "b.pdf: arquivo não encontrado" in str(erro.value)
+    assert verificar_anexos(None) == [] and erros_por_arquivo([]) == {}
@@ -0,0 +1,66 @@
+import os
+import time
+
+import pytest
+
+from core import armazem_anexos
+from core.armazem_anexos import armazenar, armazenar_lista, resolver_lista, coletar_lixo, CARENCIA_COLETA
+
+
+@pytest.fixture(autouse=True)
+def armazem_temporario(tmp_path, monkeypatch):
+    monkeypatch.setattr(armazem_anexos, "_pasta_armazem", lambda: str(tmp_path / "anexos"))
+
+
+def _arquivo(tmp_path, nome, conteudo):
+    caminho = tmp_path / nome
+    caminho.write_bytes(conteudo)
+    return str(caminho)
+
+
+def _objetos(tmp_path):
+    pasta = tmp_path / "anexos" / "objetos"
+    return sorted(d for sub in pasta.iterdir() for d in os.listdir(sub)) if pasta.exists() else []
+
+
+def test_mesmo_conteudo_vira_um_objeto(tmp_path):
+    a = armazenar(_arquivo(tmp_path, "a.pdf", b"igual"))
+    b = armazenar(_arquivo(tmp_path, "b.pdf", b"igual"))
+    assert a != b and a.split("/")[0] == b.split("/")[0]
+    assert len(_objetos(tmp_path)) == 1
+
+
+def test_resolve_com_o_nome_original_mesmo_se_o_original_sumir(tmp_path):
+    original = _arquivo(tmp_path, "relatorio.pdf", b"conteudo")
+    ref = armazenar_lista(original)
+    os.remove(original)
+
+    caminho = resolver_lista(ref)
+    assert os.path.basename(caminho) == "relatorio.pdf"
+    with open(caminho, "rb") as f:
+        assert f.read() == b"conteudo"
+
+
+def test_coleta_remove_so_o_que_nenhum_job_referencia(tmp_path):
+    usado = armazenar(_arquivo(tmp_path, "usado.pdf", b"usado"))
+    armazenar(_arquivo(tmp_path, "orfao.pdf", b"orfao"))
+    depois_da_carencia = time.time() + CARENCIA_COLETA + 1
+
+    liberados = coletar_lixo([usado, None], logger=lambda m: None, agora=depois_da_carencia)
+
+    assert liberados == len(b"orfao")
+    assert _objetos(tmp_path) == [usado[len("cas:"):].split("/")[0]]
+    assert os.path.exists(resolver_lista(usado))
+
+
+def test_recem_armazenado_sobrevive_a_coleta_ate_a_carencia(tmp_path):
+    # Anexo já no armazém, mas o job ainda não foi gravado no banco
+    armazenar(_arquivo(tmp_path, "novo.pdf", b"novo"))
+
+    assert coletar_lixo([], logger=lambda m: None) == 0
+    assert len(_objetos(tmp_path)) == 1
+
+    assert coletar_lixo([], logger=lambda m: None, agora=time.time() + CARENCIA_COLETA + 1) == len(b"novo")
+    assert _objetos(tmp_path) == []
+    # A marca vencida foi apagada junto
+    assert os.listdir(tmp_path / "anexos" / "recentes") == []
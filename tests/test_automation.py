@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+pytest.importorskip("undetected_chromedriver")
+pytest.importorskip("selenium")
+pytest.importorskip("pyperclip")
+
+from core import automation  # noqa: E402
+
+
+class DriverFalso:
+    espera_trava = 0.0
+
+
+@pytest.fixture
+def envio(monkeypatch):
+    """executar_envio com Chrome, WhatsApp e preparo falsos; devolve o que o envio recebeu."""
+    chamadas = {}
+    monkeypatch.setattr(automation, "validar_anexos_job", lambda file_path, mode, logger=None: file_path)
+    monkeypatch.setattr(automation, "procurar_contato_grupo", lambda driver, target, logger=None: None)
+    monkeypatch.setattr(automation, "encerrar_driver", lambda driver, logger=None: None)
+    monkeypatch.setattr(automation.time, "sleep", lambda s: None)
+
+    def enviar_conteudo(driver, mode, message, file_path, **kwargs):
+        chamadas['file_path'] = file_path
+    monkeypatch.setattr(automation, "enviar_conteudo", enviar_conteudo)
+    return chamadas
+
+
+def test_preparo_roda_enquanto_o_chrome_abre(envio, monkeypatch, tmp_path):
+    chrome_abrindo, preparo_rodando = threading.Event(), threading.Event()
+
+    def iniciar_driver(**kwargs):
+        chrome_abrindo.set()
+        # Em série, o preparo só começaria depois daqui e a espera estouraria
+        assert preparo_rodando.wait(5)
+        return DriverFalso()
+
+    def preprocessar(file_path, mode, **kwargs):
+        preparo_rodando.set()
+        assert chrome_abrindo.wait(5)
+        return "reduzido.jpg"
+
+    monkeypatch.setattr(automation, "iniciar_driver", iniciar_driver)
+    monkeypatch.setattr(automation, "preprocessar_se_ativo", preprocessar)
+
+    assert automation.executar_envio(str(tmp_path), "Ana", "file", file_path="foto.jpg",
+                                     logger=lambda m: None, preprocessar=True)
+    # O envio usa o resultado do preparo feito em paralelo
+    assert envio['file_path'] == "reduzido.jpg"
+
+
+def test_preflight_reprovado_nao_abre_o_chrome(envio, monkeypatch, tmp_path):
+    def reprovar(file_path, mode, logger=None):
+        raise Exception("Anexos inválidos:\nfoto.jpg: arquivo vazio")
+    monkeypatch.setattr(automation, "validar_anexos_job", reprovar)
+    monkeypatch.setattr(automation, "iniciar_driver", lambda **kwargs: pytest.fail("Chrome aberto"))
+
+    with pytest.raises(Exception, match="arquivo vazio"):
+        automation.executar_envio(str(tmp_path), "Ana", "file", file_path="foto.jpg", logger=lambda m: None)
+    assert envio == {}
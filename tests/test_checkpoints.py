@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+from core.checkpoints import Checkpoints, etapa_texto, etapa_lote
+
+
+def test_unidade_disparada_nunca_e_reenviada_na_proxima_tentativa(banco, novo_job):
+    task_id = novo_job(datetime.now())
+    etapa = etapa_texto("bom dia")
+    Checkpoints(task_id, db=banco).marcar_enviado(etapa)
+
+    # Ack não veio: a tentativa seguinte carrega os checkpoints do zero
+    assert Checkpoints(task_id, db=banco).feito(etapa)
+    assert not Checkpoints(task_id, db=banco).feito(etapa_texto("boa tarde"))
+
+
+def test_chave_de_envio_vale_entre_executores(banco, novo_job):
+    task_id = novo_job(datetime.now())
+    etapa = etapa_lote(0, {'arquivos': ["a.pdf", "b.pdf"], 'legenda': None})
+    primeiro = Checkpoints(task_id, destinatario="Ana", db=banco)
+    # Outro executor carregou o progresso antes do primeiro enviar
+    segundo = Checkpoints(task_id, destinatario="ana ", db=banco)
+
+    primeiro.marcar_enviado(etapa)
+
+    assert segundo.feito(etapa)
+
+
+def test_editar_o_conteudo_descarta_o_progresso(banco, novo_job):
+    quando = datetime.now() + timedelta(hours=1)
+    task_id = novo_job(quando, message="versão 1")
+    etapa = etapa_texto("versão 1")
+    Checkpoints(task_id, destinatario="Ana", db=banco).marcar(etapa)
+
+    # Só o horário: o progresso continua valendo
+    banco.atualizar_agendamento_completo(task_id, "5511999999999", "text", "versão 1", None,
+                                         quando + timedelta(hours=1))
+    assert Checkpoints(task_id, destinatario="Ana", db=banco).feito(etapa)
+
+    banco.atualizar_agendamento_completo(task_id, "5511999999999", "text", "versão 2", None, quando)
+    assert not Checkpoints(task_id, destinatario="Ana", db=banco).feito(etapa)
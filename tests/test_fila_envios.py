@@ -0,0 +1,45 @@
+from core.fila_envios import FilaEnvios, PedidoEnvio, PRIORIDADE_MANUAL, PRIORIDADE_AGENDADA
+
+AGORA = 1_800_000_000.0
+
+
+def _agendado(nome, prazo):
+    return PedidoEnvio('sessao', nome, PRIORIDADE_AGENDADA, prazo=AGORA + prazo)
+
+
+def test_manual_fura_a_fila_e_os_agendados_seguem_pelo_prazo():
+    fila = FilaEnvios()
+    fila.colocar(_agendado("depois", 60))
+    fila.colocar(_agendado("antes", 10))
+    fila.colocar(_agendado("empate_1", 30))
+    fila.colocar(_agendado("empate_2", 30))
+    # Chega por último e com prazo posterior a todos, mas é manual
+    fila.colocar(PedidoEnvio('manual', "manual", PRIORIDADE_MANUAL, prazo=AGORA + 999))
+
+    ordem = [fila.retirar(timeout=0).dados for _ in range(5)]
+
+    assert ordem == ["manual", "antes", "empate_1", "empate_2", "depois"]
+    assert fila.retirar(timeout=0) is None
+
+
+def test_sessao_so_retira_manuais_entre_um_job_e_outro():
+    fila = FilaEnvios()
+    fila.colocar(_agendado("grupo", 0))
+
+    assert fila.retirar(timeout=0, prioridade_max=PRIORIDADE_MANUAL) is None
+    fila.colocar(PedidoEnvio('manual', "manual", PRIORIDADE_MANUAL))
+    assert fila.retirar(timeout=0, prioridade_max=PRIORIDADE_MANUAL).dados == "manual"
+    assert fila.retirar(timeout=0).dados == "grupo"
+
+
+def test_estatisticas_separam_a_espera_por_classe():
+    fila = FilaEnvios()
+    fila.colocar(_agendado("a", 0))
+    fila.colocar(_agendado("b", 0))
+    fila.colocar(PedidoEnvio('manual', "m", PRIORIDADE_MANUAL))
+    fila.retirar(timeout=0)
+
+    est = fila.estatisticas()
+
+    assert est['manual']['atendidos'] == 1 and est['manual']['na_fila'] == 0
+    assert est['agendado']['atendidos'] == 0 and est['agendado']['na_fila'] == 2
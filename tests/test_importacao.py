@@ -0,0 +1,111 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.importacao import importar_agendamentos
+
+
+@pytest.fixture(autouse=True)
+def armazem_temporario(tmp_path, monkeypatch):
+    monkeypatch.setattr("core.armazem_anexos._pasta_armazem", lambda: str(tmp_path / "anexos"))
+
+
+def _amanha(hora="08:00"):
+    return (datetime.now() + timedelta(days=1)).strftime(f"%Y-%m-%d {hora}")
+
+
+def test_csv_importa_validas_e_relata_cada_linha_invalida(banco, tmp_path):
+    ontem = (datetime.now() - timedelta(days=1)).strftime("%d/%m/%Y 08:00")
+    csv = tmp_path / "agenda.csv"
+    csv.write_text(
+        "target,scheduled_time,mode,message,task_name,max_tentativas\n"
+        f"Ana,{_amanha()},text,oi,,\n"                  # 2: ok
+        f",{_amanha()},text,oi,,\n"                     # 3: sem target
+        f"Bia,{ontem},text,oi,,\n"                      # 4: passado
+        f"Caio,{_amanha()},video,oi,,\n"                # 5: modo inválido
+        f"Davi,{_amanha()},text,,,\n"                   # 6: texto sem mensagem
+        f"Eva,amanhã cedo,text,oi,,\n"                  # 7: data inválida
+        f"Fabi,{_amanha()},file,,,\n"                   # 8: arquivo sem file_path
+        f"Gil,{_amanha()},text,oi,lembrete,0\n"         # 9: max_tentativas inválido
+        f"Hugo,{_amanha('09:00')},text,oi,lembrete,2\n"  # 10: ok
+        f"Ivo,{_amanha()},text,oi,lembrete,\n",         # 11: task_name repetido no arquivo
+        encoding="utf-8"
+    )
+
+    resultado = importar_agendamentos(str(csv), db=banco, logger=lambda m: None)
+
+    assert resultado.importados == 2
+    assert [linha for linha, _ in resultado.erros] == [3, 4, 5, 6, 7, 8, 9, 11]
+    erros = dict(resultado.erros)
+    assert "target vazio" in erros[3]
+    assert "passado" in erros[4]
+    assert "mode inválido" in erros[5]
+    assert "task_name repetido" in erros[11]
+    assert {linha[2] for linha in banco.listar_pendentes()} == {"Ana", "Hugo"}
+    assert banco.obter_detalhes("lembrete")['max_tentativas'] == 2
+
+
+def test_jsonl_relata_json_invalido_e_nome_que_ja_existe_no_banco(banco, novo_job, tmp_path):
+    novo_job(datetime.now() + timedelta(days=2), task_name="existente")
+    jsonl = tmp_path / "agenda.jsonl"
+    jsonl.write_text("\n".join([
+        json.dumps({"target": "Ana", "scheduled_time": _amanha(), "message": "oi"}),
+        "{isto não é json",
+        "",
+        json.dumps({"target": "Bia", "scheduled_time": _amanha(), "message": "oi", "task_name": "existente"}),
+        json.dumps({"target": "Caio", "scheduled_time": _amanha(), "file_path": ["nao_existe.pdf"]}),
+    ]), encoding="utf-8")
+
+    resultado = importar_agendamentos(str(jsonl), db=banco, logger=lambda m: None)
+
+    assert resultado.importados == 1
+    assert [linha for linha, _ in resultado.erros] == [2, 4, 5]
+    assert "JSON inválido" in resultado.erros[0][1]
+    assert "task_name repetido" in resultado.erros[1][1]
+
+
+def test_anexos_vao_para_o_armazem_uma_vez(banco, tmp_path):
+    pdf = tmp_path / "contrato.pdf"
+    pdf.write_bytes(b"%PDF-1.4 teste")
+    csv = tmp_path / "agenda.csv"
+    csv.write_text(
+        "target,scheduled_time,message,file_path\n"
+        f"Ana,{_amanha()},segue,{pdf}\n"
+        f"Bia,{_amanha()},segue,{pdf}\n",
+        encoding="utf-8"
+    )
+
+    resultado = importar_agendamentos(str(csv), db=banco, logger=lambda m: None)
+
+    assert resultado.importados == 2 and not resultado.erros
+    refs = {linha[5] for linha in banco.listar_pendentes()}
+    assert len(refs) == 1 and refs.pop().startswith("cas:")
+
+
+def test_linha_recusada_pelo_banco_nao_aborta_a_importacao(banco, novo_job, tmp_path):
+    novo_job(datetime.now() + timedelta(days=2), task_name="existente")
+    # Nome criado por outro processo depois da validação do lote: só o INSERT percebe
+    banco.task_names_existentes = lambda nomes: set()
+    gravacoes = []
+    adicionar_lote = banco.adicionar_lote
+    banco.adicionar_lote = lambda linhas: gravacoes.append(len(linhas)) or adicionar_lote(linhas)
+    csv = tmp_path / "agenda.csv"
+    csv.write_text(
+        "target,scheduled_time,message,task_name\n"
+        f"Ana,{_amanha()},oi,\n"
+        f"Bia,{_amanha()},oi,existente\n"
+        f"Caio,{_amanha()},oi,\n"
+        f"Davi,{_amanha()},oi,\n"
+        f",{_amanha()},oi,\n",
+        encoding="utf-8"
+    )
+
+    resultado = importar_agendamentos(str(csv), db=banco, logger=lambda m: None, lote=2)
+
+    assert resultado.importados == 3
+    assert [linha for linha, _ in resultado.erros] == [3, 6]
+    assert "UNIQUE" in resultado.erros[0][1]
+    # Um INSERT por lote validado, não um no fim com o arquivo inteiro
+    assert gravacoes == [2, 2]
+    assert {linha[2] for linha in banco.listar_pendentes()} == {"Ana", "Caio", "Davi", "5511999999999"}
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+
+def _todas_as_paginas(banco, **filtros):
+    paginas, cursor = [], None
+    while True:
+        linhas, cursor = banco.listar_pagina(apos=cursor, **filtros)
+        paginas.append([linha[0] for linha in linhas])
+        if cursor is None:
+            return paginas
+
+
+def test_paginas_cobrem_tudo_sem_repetir(banco, novo_job, agora):
+    # Dois jobs no mesmo horário: o id desempata o cursor
+    ids = [novo_job(agora + timedelta(hours=h)) for h in (1, 2, 2, 3, 4, 5, 6)]
+
+    paginas = _todas_as_paginas(banco, limite=3)
+
+    assert [len(p) for p in paginas] == [3, 3, 1]
+    esperado = sorted(ids, key=lambda i: (banco.obter_por_id(i)['scheduled_time'], i), reverse=True)
+    assert sum(paginas, []) == esperado
+
+
+def test_ordem_crescente(banco, novo_job, agora):
+    ids = [novo_job(agora + timedelta(hours=h)) for h in range(5)]
+    assert sum(_todas_as_paginas(banco, limite=2, crescente=True), []) == ids
+
+
+def test_filtros_de_status_e_periodo(banco, novo_job, agora):
+    ids = [novo_job(agora + timedelta(days=d)) for d in range(6)]
+    banco.atualizar_status(ids[1], 'completed')
+    banco.atualizar_status(ids[4], 'completed')
+
+    linhas, cursor = banco.listar_pagina(status='completed')
+    assert [l[0] for l in linhas] == [ids[4], ids[1]] and cursor is None
+
+    linhas, _ = banco.listar_pagina(status=['pending'], de=agora + timedelta(days=2),
+                                    ate=agora + timedelta(days=5), crescente=True)
+    assert [l[0] for l in linhas] == [ids[2], ids[3]]
+
+
+def test_linhas_no_formato_de_listar_todos(banco, novo_job, agora):
+    novo_job(agora + timedelta(hours=1))
+    linhas, _ = banco.listar_pagina()
+    assert len(linhas[0]) == len(banco.listar_todos()[0])
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from core import planejador
+from core.planejador import (
+    simular, registrar_duracao, carregar_duracoes, prever_novo, resumo_previsao, DURACOES_PADRAO,
+)
+
+AGORA = datetime(2026, 5, 4, 8, 0)
+DURACOES = {'abertura': 30.0, 'encerramento': 10.0, 'text': 5.0, 'file': 10.0, 'file_text': 10.0}
+
+
+@pytest.fixture(autouse=True)
+def arquivos_temporarios(tmp_path, monkeypatch):
+    monkeypatch.setattr(planejador, "_arquivo_duracoes", lambda: str(tmp_path / "duracoes_jobs.json"))
+    monkeypatch.setattr("core.anexos._arquivo_vazao", lambda: str(tmp_path / "upload_stats.json"))
+
+
+def _job(task_id, minutos, target="a", **campos):
+    return dict(id=task_id, target=target, mode='text', file_path=None,
+                scheduled_time=(AGORA + timedelta(minutes=minutos)).isoformat(), **campos)
+
+
+def test_grupo_da_janela_abre_o_chrome_uma_vez():
+    previsoes = simular([_job(1, 0), _job(2, 1)], agora=AGORA, janela=300, duracoes=DURACOES)
+
+    assert [p['id'] for p in previsoes] == [1, 2]
+    assert previsoes[0]['inicio'] == AGORA + timedelta(seconds=30)
+    assert previsoes[0]['fim'] == AGORA + timedelta(seconds=35)
+    # O segundo espera o próprio horário na mesma sessão
+    assert previsoes[1]['inicio'] == AGORA + timedelta(minutes=1)
+    assert not any(p['atrasado'] for p in previsoes)
+
+
+def test_sessoes_em_serie_acumulam_atraso():
+    # Fila de 100 textos vencidos agora: o último sai bem depois do orçamento
+    jobs = [_job(i, 0) for i in range(100)]
+    previsoes = simular(jobs, agora=AGORA, janela=300, orcamento=300, duracoes=DURACOES)
+
+    assert previsoes[-1]['inicio'] == AGORA + timedelta(seconds=30 + 99 * 5)
+    assert [p['atrasado'] for p in previsoes].index(True) == 55
+
+
+def test_proxima_tentativa_e_job_vencido_saem_agora():
+    jobs = [_job(1, -120), _job(2, -240, proxima_tentativa=(AGORA + timedelta(hours=1)).isoformat())]
+    previsoes = simular(jobs, agora=AGORA, janela=300, duracoes=DURACOES)
+
+    assert [p['id'] for p in previsoes] == [1, 2]
+    assert previsoes[0]['inicio'] == AGORA + timedelta(seconds=30)
+    assert previsoes[0]['atrasado']
+    assert previsoes[1]['inicio'] == AGORA + timedelta(hours=1, seconds=30)
+
+
+def test_registrar_duracao_faz_media_movel():
+    registrar_duracao('text', 18.0)
+    esperado = (1 - planejador.PESO_MEDICAO) * DURACOES_PADRAO['text'] + planejador.PESO_MEDICAO * 18.0
+    assert carregar_duracoes()['text'] == pytest.approx(esperado, abs=0.01)
+    # Etapa desconhecida ou medição inválida não grava nada
+    registrar_duracao('outra', 5.0)
+    registrar_duracao('file', 0)
+    assert carregar_duracoes()['file'] == DURACOES_PADRAO['file']
+
+
+def test_previsao_do_novo_job_aponta_quem_passa_a_atrasar(banco, novo_job):
+    # Durações padrão: abertura 35s, texto 8s
+    quando = AGORA + timedelta(hours=1)
+    novo_job(quando, target="b")
+    ultimo = novo_job(quando, target="c")
+
+    # Sozinhos, os dois começam em 35s e 43s: dentro do orçamento de 50s
+    novo, afetados = prever_novo(quando, 'text', target="a", db=banco, agora=AGORA, orcamento=50)
+
+    assert novo['inicio'] == quando + timedelta(seconds=35) and not novo['atrasado']
+    # O novo entra antes (mesmo horário, destino "a") e empurra o último para 51s
+    assert [p['id'] for p in afetados] == [ultimo]
+
+    texto = resumo_previsao(novo, afetados)
+    assert texto.startswith(f"Previsão de envio: {quando:%d/%m} {novo['inicio']:%H:%M}")
+    assert "1 agendamento(s) já existente(s) passam a atrasar" in texto
+
+
+def test_resumo_mostra_o_atraso_em_minutos():
+    # Sessão anterior ocupa o perfil: o job de 10 min depois só começa depois dela
+    ocupado = dict(DURACOES, text=900.0)
+    previsao = simular([_job(1, 0), _job(2, 10)], agora=AGORA, janela=0, duracoes=ocupado)[1]
+
+    texto = resumo_previsao(previsao)
+    assert texto.endswith(f"({previsao['atraso'] / 60:.0f} min depois do horário)")
+    assert previsao['atraso'] >= 60 and "atrasar" not in texto
@@ -0,0 +1,96 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core import preprocessamento
+from core.anexos import hash_arquivo
+from core.preprocessamento import preprocessar_anexos, limpar_cache, TAMANHO_MINIMO, VERSAO_PARAMETROS
+
+
+@pytest.fixture(autouse=True)
+def cache_temporario(tmp_path, monkeypatch):
+    pasta = tmp_path / "cache_midia"
+    pasta.mkdir()
+    monkeypatch.setattr(preprocessamento, "_pasta_cache", lambda: str(pasta))
+    monkeypatch.setattr("core.anexos._arquivo_vazao", lambda: str(tmp_path / "upload_stats.json"))
+    monkeypatch.setattr(preprocessamento, "_pillow_disponivel", lambda: True)
+    # Workers em threads, com um "processamento" que só grava um arquivo menor
+    monkeypatch.setattr(preprocessamento, "ProcessPoolExecutor", ThreadPoolExecutor)
+    processados = []
+
+    def processar(tipo, origem, destino):
+        processados.append(origem)
+        with open(destino, "wb") as f:
+            f.write(b"p" * 10)
+    monkeypatch.setattr(preprocessamento, "_processar", processar)
+    return processados
+
+
+def _imagem(tmp_path, nome, tamanho=TAMANHO_MINIMO + 1, byte=b"x"):
+    caminho = tmp_path / nome
+    caminho.write_bytes(byte * tamanho)
+    return str(caminho)
+
+
+def _log(msg):
+    pass
+
+
+def test_mesmo_conteudo_e_processado_uma_vez(tmp_path, cache_temporario):
+    a = _imagem(tmp_path, "a.jpg")
+    b = _imagem(tmp_path, "b.jpg")   # mesmo conteúdo, outro nome
+
+    primeiro, _ = preprocessar_anexos([a, b], logger=_log)
+    assert cache_temporario == [a]
+    assert primeiro[0] == primeiro[1] and os.path.getsize(primeiro[0]) == 10
+
+    # Acerto: nada é processado de novo
+    segundo, relatorio = preprocessar_anexos([b], logger=_log)
+    assert cache_temporario == [a]
+    assert segundo == [primeiro[0]] and relatorio['segundos_processamento'] == 0
+
+
+def test_arquivo_pequeno_ou_nao_suportado_nao_passa_pelo_cache(tmp_path, cache_temporario):
+    pequeno = _imagem(tmp_path, "p.jpg", tamanho=10)
+    pdf = _imagem(tmp_path, "d.pdf")
+
+    assert preprocessar_anexos([pequeno, pdf], logger=_log)[0] == [pequeno, pdf]
+    assert cache_temporario == []
+
+
+def _no_cache(nome, tamanho, idade, agora):
+    caminho = os.path.join(preprocessamento._pasta_cache(), nome)
+    with open(caminho, "wb") as f:
+        f.write(b"c" * tamanho)
+    os.utime(caminho, (agora - idade, agora - idade))
+    return caminho
+
+
+def test_limpeza_por_idade_versao_e_tamanho():
+    agora = time.time()
+    dia = 24 * 3600
+    velho = _no_cache(f"velho_{VERSAO_PARAMETROS}.jpg", 10, 60 * dia, agora)
+    antigo = _no_cache("antigo_i1280q70.jpg", 10, 2 * dia, agora)
+    menos_usado = _no_cache(f"a_{VERSAO_PARAMETROS}.jpg", 100, 3 * dia, agora)
+    mais_usado = _no_cache(f"b_{VERSAO_PARAMETROS}.jpg", 100, 2 * dia, agora)
+    em_uso = _no_cache(f"c_{VERSAO_PARAMETROS}.jpg", 100, 60, agora)
+
+    liberados = limpar_cache(limite=200, logger=_log, agora=agora)
+
+    assert liberados == 120
+    assert [os.path.exists(c) for c in (velho, antigo, menos_usado, mais_usado, em_uso)] == \
+        [False, False, False, True, True]
+
+
+def test_acerto_renova_o_arquivo_na_ordem_de_limpeza(tmp_path):
+    a = _imagem(tmp_path, "a.jpg")
+    destino = os.path.join(preprocessamento._pasta_cache(), f"{hash_arquivo(a)}_{VERSAO_PARAMETROS}.jpg")
+    with open(destino, "wb") as f:
+        f.write(b"p" * 10)
+    os.utime(destino, (time.time() - 40 * 24 * 3600,) * 2)
+
+    assert preprocessar_anexos([a], logger=_log)[0] == [destino]
+    assert limpar_cache(logger=_log) == 0
+    assert os.path.exists(destino)
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+from core.reconciliador import planejar, reconciliar, BackendFalso, PREFIXO_TAREFA
+from core.windows_scheduler import TAREFA_SERVICO, garantir_tarefa_servico
+
+AGORA = datetime(2026, 5, 4, 12, 0)
+
+
+def _job(task_id, horario, proxima=None):
+    return {'id': task_id, 'scheduled_time': horario.isoformat(), 'proxima_tentativa': proxima and proxima.isoformat()}
+
+
+def test_cria_so_os_futuros_sem_tarefa_ou_com_horario_diferente():
+    futuro = AGORA + timedelta(hours=1)
+    pendentes = [_job(1, futuro), _job(2, futuro), _job(3, AGORA - timedelta(hours=1)), _job(4, futuro)]
+    tarefas = {f"{PREFIXO_TAREFA}2": futuro, f"{PREFIXO_TAREFA}4": futuro + timedelta(hours=1)}
+
+    criar, remover = planejar(pendentes, tarefas, agora=AGORA)
+
+    assert [(t['id'], quando) for t, quando in criar] == [(1, futuro), (4, futuro)]
+    assert remover == []
+
+
+def test_retentativa_ganha_tarefa_pelo_vencimento():
+    # Horário original já passou; a próxima tentativa (com segundos) arredonda para o minuto seguinte
+    pendentes = [_job(7, AGORA - timedelta(hours=2), proxima=AGORA + timedelta(minutes=5, seconds=20))]
+
+    criar, _ = planejar(pendentes, {}, agora=AGORA)
+
+    assert [(t['id'], quando) for t, quando in criar] == [(7, AGORA + timedelta(minutes=6))]
+
+
+def test_remove_orfas_e_preserva_a_tarefa_do_servico():
+    tarefas = {f"{PREFIXO_TAREFA}9": AGORA, TAREFA_SERVICO: None, "OutraTarefa": None}
+
+    _, remover = planejar([], tarefas, agora=AGORA)
+    assert remover == [f"{PREFIXO_TAREFA}9"]
+
+    # Backend "servico": nenhuma tarefa por job deve sobrar, nem de job pendente
+    futuro = AGORA + timedelta(hours=1)
+    criar, remover = planejar([_job(9, futuro)], tarefas, tarefas_por_job=False, agora=AGORA)
+    assert criar == [] and remover == [f"{PREFIXO_TAREFA}9"]
+
+
+def test_legado_e_recriado_apontando_para_o_lancador():
+    futuro = AGORA + timedelta(hours=1)
+    criar, _ = planejar([_job(5, futuro)], {f"{PREFIXO_TAREFA}5": futuro}, agora=AGORA, legados={"5"})
+    assert [t['id'] for t, _ in criar] == [5]
+
+
+def test_reconciliar_com_backend_falso(banco, novo_job, tmp_path, monkeypatch):
+    monkeypatch.setattr("core.reconciliador.garantir_lancador", lambda: str(tmp_path / "executar_job.bat"))
+    futuro = datetime.now().replace(second=0, microsecond=0) + timedelta(hours=2)
+    pendente = novo_job(futuro)
+    concluido = novo_job(futuro)
+    banco.atualizar_status(concluido, 'completed')
+    (tmp_path / f"task_{pendente}.json").write_text("{}")
+    backend = BackendFalso({f"{PREFIXO_TAREFA}{concluido}": futuro})
+
+    resultado = reconciliar(db=banco, backend=backend, tarefas_por_job=True, pasta=str(tmp_path), logger=lambda m: None)
+
+    assert resultado.criadas == [f"{PREFIXO_TAREFA}{pendente}"]
+    assert resultado.removidas == [f"{PREFIXO_TAREFA}{concluido}"]
+    assert resultado.arquivos_removidos == [f"task_{pendente}.json"]
+    assert backend.tarefas == {f"{PREFIXO_TAREFA}{pendente}": futuro}
+
+    # Segunda passada: nada a fazer
+    backend.chamadas.clear()
+    resultado = reconciliar(db=banco, backend=backend, tarefas_por_job=True, pasta=str(tmp_path), logger=lambda m: None)
+    assert not resultado.criadas and not resultado.removidas
+    assert backend.chamadas == [("listar",)]
+
+
+def test_tarefa_do_servico_criada_uma_vez():
+    backend = BackendFalso()
+    assert garantir_tarefa_servico(backend)[0]
+    assert garantir_tarefa_servico(backend)[0]
+    assert backend.chamadas == [("criar_no_logon", TAREFA_SERVICO)]
@@ -0,0 +1,100 @@
+from datetime import datetime, date, timedelta
+
+import pytest
+
+from core.recorrencia import (
+    ocorrencias, proxima_ocorrencia, normalizar_regra, materializar, ocorrencias_no_periodo,
+)
+
+
+def test_semanal_nos_dias_escolhidos():
+    # 05/01/2026 é segunda
+    regra = {'frequencia': 'semanal', 'dias_semana': [0, 2], 'hora': '08:30', 'inicio': '2026-01-05'}
+    momentos = list(ocorrencias(regra, datetime(2026, 1, 5), datetime(2026, 1, 19)))
+    assert momentos == [datetime(2026, 1, 5, 8, 30), datetime(2026, 1, 7, 8, 30),
+                        datetime(2026, 1, 12, 8, 30), datetime(2026, 1, 14, 8, 30)]
+
+
+def test_intervalo_excecoes_e_fim():
+    regra = {'frequencia': 'diaria', 'intervalo': 2, 'hora': '07:00', 'inicio': '2026-03-01',
+             'fim': '2026-03-09', 'excecoes': '2026-03-05'}
+    dias = [m.day for m in ocorrencias(regra, datetime(2026, 3, 1))]
+    assert dias == [1, 3, 7, 9]
+
+
+def test_semanal_a_cada_duas_semanas_com_excecao_e_fim():
+    regra = {'frequencia': 'semanal', 'intervalo': 2, 'dias_semana': '1,4', 'hora': '18:00',
+             'inicio': '2026-01-05', 'fim': '2026-02-03', 'excecoes': ['2026-01-20']}
+    # Semanas de 05/01, 19/01 e 02/02; terça 20/01 é exceção e a sexta 06/02 passa do fim
+    assert [m.date() for m in ocorrencias(regra, datetime(2026, 1, 1))] == \
+        [date(2026, 1, 6), date(2026, 1, 9), date(2026, 1, 23), date(2026, 2, 3)]
+
+
+def test_mensal_pula_meses_sem_o_dia():
+    regra = {'frequencia': 'mensal', 'hora': '09:00', 'inicio': '2026-01-31'}
+    momentos = list(ocorrencias(regra, datetime(2026, 1, 1), datetime(2026, 6, 1)))
+    assert [m.date() for m in momentos] == [date(2026, 1, 31), date(2026, 3, 31), date(2026, 5, 31)]
+
+
+def test_comeca_no_periodo_de_desde_sem_percorrer_do_inicio():
+    regra = {'frequencia': 'diaria', 'hora': '10:00', 'inicio': '2000-01-01'}
+    # Já passou das 10h do dia 10: a próxima é no dia seguinte
+    assert proxima_ocorrencia(regra, datetime(2026, 2, 10, 11, 0)) == datetime(2026, 2, 11, 10, 0)
+
+
+@pytest.mark.parametrize("regra", [
+    {'frequencia': 'anual', 'hora': '08:00', 'inicio': '2026-01-01'},
+    {'frequencia': 'diaria', 'hora': '08:00', 'inicio': '2026-01-10', 'fim': '2026-01-01'},
+    {'frequencia': 'semanal', 'dias_semana': [7], 'hora': '08:00', 'inicio': '2026-01-01'},
+    {'frequencia': 'diaria', 'hora': '08:00'},
+])
+def test_regra_invalida(regra):
+    with pytest.raises(ValueError):
+        normalizar_regra(regra)
+
+
+def test_materializar_cria_so_o_horizonte_e_continua_de_onde_parou(banco, agora):
+    inicio = agora.date()
+    banco.adicionar_recorrencia("lembrete", "5511999999999", "text",
+                                {'frequencia': 'diaria', 'hora': '23:59', 'inicio': inicio.isoformat()},
+                                message="bom dia")
+
+    assert materializar(banco, agora=agora, horizonte=timedelta(days=3)) == 3
+    # Mesma janela de novo: nada duplicado
+    assert materializar(banco, agora=agora, horizonte=timedelta(days=3)) == 0
+    # Horizonte maior: só as ocorrências novas
+    assert materializar(banco, agora=agora, horizonte=timedelta(days=5)) == 2
+
+    pendentes = banco.listar_pendentes()
+    assert len(pendentes) == 5
+    assert len({linha[6] for linha in pendentes}) == 5
+
+
+def test_ocorrencias_no_periodo_intercala_as_regras():
+    diaria = {'id': 1, 'frequencia': 'diaria', 'hora': '09:00', 'inicio': '2026-04-01'}
+    semanal = {'id': 2, 'frequencia': 'semanal', 'dias_semana': [2], 'hora': '08:00', 'inicio': '2026-04-01'}
+
+    itens = ocorrencias_no_periodo([diaria, semanal], datetime(2026, 4, 1), datetime(2026, 4, 3))
+
+    # 01/04/2026 é quarta
+    assert [(m, rec['id']) for m, rec in itens] == [
+        (datetime(2026, 4, 1, 8, 0), 2), (datetime(2026, 4, 1, 9, 0), 1), (datetime(2026, 4, 2, 9, 0), 1),
+    ]
+
+
+def test_ocorrencia_excluida_nao_volta_e_regra_parada_nao_gera_mais(banco, agora):
+    rec_id = banco.adicionar_recorrencia("lembrete", "5511999999999", "text",
+                                         {'frequencia': 'diaria', 'hora': '23:59', 'inicio': agora.date().isoformat()},
+                                         message="bom dia")
+    materializar(banco, agora=agora, horizonte=timedelta(days=3))
+    primeira = min(banco.listar_pendentes(), key=lambda linha: linha[6])
+    banco.deletar(primeira[0])
+
+    # materializado_ate já passou da ocorrência excluída: ela não é recriada
+    assert materializar(banco, agora=agora, horizonte=timedelta(days=3)) == 0
+    assert len(banco.listar_pendentes()) == 2
+
+    banco.desativar_recorrencia(rec_id)
+    assert banco.listar_pendentes() == []
+    assert materializar(banco, agora=agora, horizonte=timedelta(days=10)) == 0
+    assert banco.listar_recorrencias() == []
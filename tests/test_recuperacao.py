@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+from core.recuperacao import classificar, recuperar_atrasados
+
+
+def test_classificar_pela_tolerancia():
+    agora = datetime(2026, 5, 4, 12, 0)
+    atrasados = [
+        (1, "2026-05-04T11:30:00", "2026-05-04T11:30:00"),
+        (2, "2026-05-04T08:00:00", "2026-05-04T08:00:00"),
+        (3, "2026-05-04T08:00:00", "2026-05-04T11:50:00"),   # retentativa: conta o vencimento
+        (4, "lixo", "lixo"),
+    ]
+    decisoes = classificar(atrasados, agora, tolerancia=3600)
+    assert [(t, d) for t, _, _, d in decisoes] == [(1, 'executar'), (2, 'perdido'), (3, 'executar')]
+    assert decisoes[1][2] == 4 * 3600
+
+
+def test_perdidos_viram_missed_e_os_demais_continuam_pendentes(banco, novo_job):
+    agora = datetime.now()
+    recente = novo_job(agora - timedelta(minutes=10))
+    antigo = novo_job(agora - timedelta(hours=3))
+    futuro = novo_job(agora + timedelta(hours=1))
+
+    contagem = recuperar_atrasados(banco, agora=agora, tolerancia=3600, logger=lambda m: None)
+
+    assert contagem == {'executar': 1, 'perdido': 1}
+    assert banco.obter_por_id(recente)['status'] == 'pending'
+    assert banco.obter_por_id(futuro)['status'] == 'pending'
+    job = banco.obter_por_id(antigo)
+    assert job['status'] == 'missed' and "180 min" in job['error_message']
+
+    # Nada novo atrasou: a segunda passada só vê o que continua pendente
+    assert recuperar_atrasados(banco, agora=agora, tolerancia=3600, logger=lambda m: None) == \
+        {'executar': 1, 'perdido': 0}
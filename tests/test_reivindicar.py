@@ -0,0 +1,113 @@
+import threading
+from datetime import timedelta
+
+from core.db import SchedulerDB
+
+
+def test_dois_processos_nunca_recebem_o_mesmo_job(banco, novo_job, agora, tmp_path):
+    ids = {novo_job(agora - timedelta(minutes=1)) for _ in range(40)}
+    # Segunda instância no mesmo arquivo: conexões e thread escritora próprias, como outro processo
+    outro = SchedulerDB(tmp_path / "scheduler.db")
+    recebidos = {'a': [], 'b': []}
+
+    def executor(nome, db):
+        while True:
+            lote = db.reivindicar(nome, 60, limite=3)
+            if not lote:
+                return
+            recebidos[nome].extend(job['id'] for job in lote)
+
+    try:
+        threads = [threading.Thread(target=executor, args=('a', banco)),
+                   threading.Thread(target=executor, args=('b', outro))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        outro.fechar()
+
+    assert not set(recebidos['a']) & set(recebidos['b'])
+    assert sorted(recebidos['a'] + recebidos['b']) == sorted(ids)
+
+
+def test_reserva_o_grupo_da_janela_sem_tirar_de_pending(banco, novo_job, agora):
+    primeiro = novo_job(agora)
+    segundo = novo_job(agora + timedelta(minutes=3))
+    depois = novo_job(agora + timedelta(minutes=10))
+
+    grupo = banco.reservar("a", 60, ate=agora + timedelta(minutes=5))
+
+    assert [job['id'] for job in grupo] == [primeiro, segundo]
+    assert all(job['status'] == 'pending' and job['lease_dono'] == "a" for job in grupo)
+    assert set(banco.listar_reservas(agora)) == {primeiro, segundo}
+    # Outro processo não reserva nem reivindica o grupo; o dono reivindica cada job na vez dele
+    assert banco.reservar("b", 60, ate=agora + timedelta(minutes=5)) == []
+    assert banco.reivindicar("b", 60, ids=[primeiro]) == []
+    assert [job['id'] for job in banco.reivindicar("a", 60, ids=[primeiro])] == [primeiro]
+    assert banco.obter_por_id(segundo)['status'] == 'pending'
+    assert banco.obter_por_id(depois)['lease_dono'] is None
+
+
+def test_reserva_vencida_ou_solta_volta_a_ser_de_todos(banco, novo_job, agora):
+    solta = novo_job(agora - timedelta(minutes=1))
+    banco.reservar("a", 60, ate=agora)
+    vencida = novo_job(agora)
+    banco.reservar("a", -1, ate=agora)
+
+    assert banco.liberar_reservas([solta], "b") == 0
+    assert banco.liberar_reservas([solta], "a") == 1
+    assert {job['id'] for job in banco.reivindicar("b", 60, ate=agora)} == {vencida, solta}
+
+
+def test_editar_solta_a_reserva(banco, novo_job, agora):
+    task_id = novo_job(agora)
+    banco.reservar("a", 60, ate=agora)
+
+    banco.atualizar_agendamento_completo(task_id, "5511999999999", "text", "outro", None, agora)
+
+    assert banco.obter_por_id(task_id)['lease_dono'] is None
+    assert [job['id'] for job in banco.reivindicar("b", 60, ids=[task_id])] == [task_id]
+
+
+def test_proxima_tentativa_decide_o_vencimento(banco, novo_job, agora):
+    task_id = novo_job(agora - timedelta(hours=1))
+    banco.registrar_falha(task_id, "lento", agora + timedelta(minutes=30))
+
+    assert banco.reivindicar("a", 60, ate=agora) == []
+    assert [job['id'] for job in banco.reivindicar("a", 60, ate=agora + timedelta(hours=1))] == [task_id]
+
+
+def test_lista_de_ids_vazia_nao_reivindica_nada(banco, novo_job, agora):
+    novo_job(agora)
+    assert banco.reivindicar("a", 60, ids=[]) == []
+    assert banco.contar_por_status().get('pending') == 1
+
+
+def _plano(banco, sql, params):
+    conn = banco._get_conn()
+    try:
+        return [linha[-1] for linha in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+    finally:
+        conn.close()
+
+
+def test_reivindicar_percorre_o_indice_de_vencimento(banco, novo_job, agora):
+    for minutos in range(20):
+        novo_job(agora + timedelta(minutes=minutos))
+    sql, params = banco._sql_reivindicar(agora + timedelta(minutes=5), None, "a", agora)
+
+    plano = _plano(banco, sql, [agora.isoformat(), "a", agora.isoformat()] + params + [50])
+
+    assert any("idx_agendamentos_vencimento" in passo for passo in plano), plano
+    assert not any(passo.startswith("SCAN agendamentos") for passo in plano), plano
+    # A ordem do índice já é a do despacho: sem ordenação extra
+    assert not any("TEMP B-TREE" in passo for passo in plano), plano
+
+
+def test_vencimento_acompanha_a_retentativa(banco, novo_job, agora):
+    task_id = novo_job(agora)
+    assert banco.obter_por_id(task_id)['vencimento_epoch'] == int(agora.timestamp())
+
+    banco.registrar_falha(task_id, "lento", agora + timedelta(minutes=30))
+    assert banco.obter_por_id(task_id)['vencimento_epoch'] == int((agora + timedelta(minutes=30)).timestamp())
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.retentativas import (
+    decidir, eh_retentavel, atraso_backoff, aplicar_politica, BACKOFF_BASE, BACKOFF_MAXIMO,
+)
+from core.lease import varrer_leases_vencidos, ERRO_LEASE_VENCIDO
+
+AGORA = datetime(2026, 5, 4, 12, 0)
+
+
+@pytest.mark.parametrize("erro, retentavel", [
+    (Exception("WhatsApp não carregou a tempo"), True),
+    (Exception("Lote enviado mas não confirmado pelo WhatsApp"), True),
+    (FileNotFoundError("contrato.pdf"), False),
+    (Exception("Anexo cas:ab/x.pdf não está mais no armazém"), False),
+    (Exception("Modo 'text' selecionado mas nenhuma mensagem fornecida."), False),
+])
+def test_classificacao_do_erro(erro, retentavel):
+    assert eh_retentavel(erro) is retentavel
+
+
+def test_backoff_cresce_com_jitter_e_limite():
+    for tentativa in range(1, 12):
+        cheio = min(BACKOFF_MAXIMO, BACKOFF_BASE * 2 ** (tentativa - 1))
+        assert cheio / 2 <= atraso_backoff(tentativa) <= cheio
+
+
+def test_decidir():
+    proxima = decidir(1, 3, Exception("timeout"), AGORA)
+    assert AGORA + timedelta(seconds=BACKOFF_BASE / 2) <= proxima <= AGORA + timedelta(seconds=BACKOFF_BASE)
+    assert decidir(3, 3, Exception("timeout"), AGORA) is None
+    assert decidir(1, 3, ValueError("anexos inválidos"), AGORA) is None
+
+
+def test_retentavel_volta_para_pending_ate_esgotar(banco, novo_job):
+    task_id = novo_job(datetime.now() - timedelta(minutes=1), max_tentativas=2)
+    banco.reivindicar("a", 60, ids=[task_id])
+
+    assert aplicar_politica(task_id, Exception("timeout"), db=banco, logger=lambda m: None) == 'retentar'
+    job = banco.obter_por_id(task_id)
+    assert job['status'] == 'pending' and job['tentativas'] == 1
+    assert datetime.fromisoformat(job['proxima_tentativa']) > datetime.now()
+
+    assert aplicar_politica(task_id, Exception("timeout"), db=banco, logger=lambda m: None) == 'dead_letter'
+    job = banco.obter_por_id(task_id)
+    assert job['status'] == 'dead_letter' and job['tentativas'] == 2 and job['proxima_tentativa'] is None
+
+
+def test_erro_definitivo_vai_direto_para_dead_letter(banco, novo_job):
+    task_id = novo_job(datetime.now())
+    assert aplicar_politica(task_id, FileNotFoundError("x.pdf"), db=banco, logger=lambda m: None) == 'dead_letter'
+    assert banco.obter_por_id(task_id)['tentativas'] == 1
+
+
+def test_editar_zera_as_tentativas(banco, novo_job):
+    quando = datetime.now() + timedelta(hours=1)
+    task_id = novo_job(quando)
+    aplicar_politica(task_id, FileNotFoundError("x.pdf"), db=banco, logger=lambda m: None)
+
+    banco.atualizar_agendamento_completo(task_id, "5511999999999", "text", "novo texto", None, quando)
+
+    job = banco.obter_por_id(task_id)
+    assert job['status'] == 'pending' and job['tentativas'] == 0
+
+
+def test_lease_vencido_passa_pela_politica(banco, novo_job):
+    vivo, morto = novo_job(datetime.now()), novo_job(datetime.now())
+    banco.reivindicar("vivo", 600, ids=[vivo])
+    banco.reivindicar("morto", -1, ids=[morto])
+
+    assert varrer_leases_vencidos(banco, logger=lambda m: None) == 1
+
+    assert banco.obter_por_id(vivo)['status'] == 'running'
+    job = banco.obter_por_id(morto)
+    assert job['status'] == 'pending' and job['error_message'] == ERRO_LEASE_VENCIDO
+
+
+def test_reserva_abandonada_nao_conta_tentativa(banco, novo_job):
+    task_id = novo_job(datetime.now())
+    banco.reservar("caiu", -1, ate=datetime.now())
+
+    # Sessão que morreu antes da vez do job: nada para o varredor, e o job segue livre
+    assert varrer_leases_vencidos(banco, logger=lambda m: None) == 0
+    assert [job['id'] for job in banco.reivindicar("outro", 60, ids=[task_id])] == [task_id]
+    assert banco.obter_por_id(task_id)['tentativas'] == 0
+
+
+def test_falha_solta_o_lease_para_a_retentativa(banco, novo_job):
+    task_id = novo_job(datetime.now() - timedelta(minutes=1), max_tentativas=3)
+    banco.reivindicar("a", 600, ids=[task_id])
+
+    aplicar_politica(task_id, Exception("timeout"), db=banco, logger=lambda m: None)
+
+    job = banco.obter_por_id(task_id)
+    assert job['lease_dono'] is None and job['lease_ate'] is None
+    # Vencida a espera, outro executor pega sem aguardar os 600s do lease antigo
+    assert banco.reivindicar("b", 60, ate=datetime.fromisoformat(job['proxima_tentativa']), ids=[task_id])
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from core import ritmo
+from core.ritmo import (
+    BaldeTokens, RitmoConta, ritmo_da_conta, estado_ritmo,
+    TAXA_INICIAL, TAXA_MAXIMA, TAXA_MINIMA, INCREMENTO, FATOR_REDUCAO, CAPACIDADE, LIMITE_ACK_LENTO,
+)
+
+
+@pytest.fixture(autouse=True)
+def arquivo_temporario(tmp_path, monkeypatch):
+    monkeypatch.setattr(ritmo, "_arquivo_ritmo", lambda: str(tmp_path / "ritmo_envio.json"))
+    monkeypatch.setattr(ritmo, "_contas", {})
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    r = Relogio()
+    monkeypatch.setattr(ritmo.time, "monotonic", r)
+    return r
+
+
+def test_balde_cheio_libera_a_rajada_e_depois_espera_a_reposicao(relogio):
+    balde = BaldeTokens(por_minuto=60)
+
+    assert [balde.reservar() for _ in range(CAPACIDADE)] == [0.0] * CAPACIDADE
+    # Sem token: espera um token (1s a 60/min); a reserva seguinte espera atrás dela
+    assert balde.reservar() == pytest.approx(1.0)
+    assert balde.reservar() == pytest.approx(2.0)
+
+    # O tempo repõe os tokens, sem passar da capacidade
+    relogio.agora += 600
+    assert [balde.reservar() for _ in range(CAPACIDADE)] == [0.0] * CAPACIDADE
+    assert balde.reservar() == pytest.approx(1.0)
+
+
+def test_erro_ou_aviso_reduzem_a_taxa_pela_metade(relogio):
+    conta = RitmoConta("a")
+    inicial = TAXA_INICIAL['texto']
+
+    assert conta.registrar('texto', False) == inicial * FATOR_REDUCAO
+    assert conta.registrar('texto', True, aviso=True) == inicial * FATOR_REDUCAO ** 2
+    # Ack lento conta como sinal de lentidão
+    assert conta.registrar('texto', True, segundos=LIMITE_ACK_LENTO['texto'] + 1) == inicial * FATOR_REDUCAO ** 3
+
+    for _ in range(20):
+        conta.registrar('texto', False)
+    assert conta.baldes['texto'].por_minuto == TAXA_MINIMA['texto']
+
+
+def test_envios_saudaveis_recuperam_a_taxa_aos_poucos(relogio):
+    conta = RitmoConta("a", {'midia': TAXA_MINIMA['midia']})
+
+    assert conta.registrar('midia', True) == TAXA_MINIMA['midia'] + INCREMENTO['midia']
+    # Mídia não tem limite de ack lento: um upload demorado não reduz
+    assert conta.registrar('midia', True, segundos=600) == TAXA_MINIMA['midia'] + 2 * INCREMENTO['midia']
+
+    for _ in range(100):
+        conta.registrar('midia', True)
+    assert conta.baldes['midia'].por_minuto == TAXA_MAXIMA['midia']
+
+
+def test_taxa_reduzida_fica_gravada_para_a_proxima_execucao(tmp_path, relogio, monkeypatch):
+    conta = ritmo_da_conta("perfil")
+    conta.registrar('texto', False)
+
+    with open(tmp_path / "ritmo_envio.json", encoding="utf-8") as f:
+        assert json.load(f)[conta.conta]['texto'] == TAXA_INICIAL['texto'] * FATOR_REDUCAO
+
+    monkeypatch.setattr(ritmo, "_contas", {})
+    assert ritmo_da_conta("perfil").baldes['texto'].por_minuto == TAXA_INICIAL['texto'] * FATOR_REDUCAO
+
+
+def test_estado_mostra_taxa_e_espera_de_cada_conta(relogio, monkeypatch):
+    monkeypatch.setattr(ritmo.time, "sleep", lambda s: None)
+    conta = ritmo_da_conta("perfil")
+    for _ in range(CAPACIDADE + 1):
+        conta.aguardar('texto')
+
+    estado = estado_ritmo()[conta.conta]
+    assert estado['texto']['por_minuto'] == TAXA_INICIAL['texto']
+    assert estado['texto']['espera_media_s'] > 0
+    assert estado['midia'] == {'por_minuto': TAXA_INICIAL['midia'], 'espera_media_s': 0.0, 'na_fila': 0}
@@ -0,0 +1,28 @@
+import time
+import threading
+
+from core.servico_agendador import ServicoAgendador
+
+
+def test_notificar_nao_espera_o_banco(banco):
+    # Leitura dos pendentes presa (banco ocupado, manutenção longa...)
+    liberar, dentro = threading.Event(), threading.Event()
+    listar = banco.listar_vencimentos
+
+    def listar_lento():
+        dentro.set()
+        liberar.wait(5)
+        return listar()
+
+    banco.listar_vencimentos = listar_lento
+    servico = ServicoAgendador(executar=lambda *a, **k: None, db=banco, exclusivo=False, logger=lambda m: None)
+    servico.iniciar()
+    try:
+        assert dentro.wait(5)
+        inicio = time.monotonic()
+        servico.notificar()
+        servico.proximo()
+        assert time.monotonic() - inicio < 0.5
+    finally:
+        liberar.set()
+        servico.parar()
@@ -0,0 +1,76 @@
+import json
+import threading
+import time
+
+import pytest
+
+from core import trava_perfil
+from core.trava_perfil import TravaPerfil, VALIDADE_BILHETE
+
+
+@pytest.fixture(autouse=True)
+def fila_rapida(monkeypatch):
+    monkeypatch.setattr(trava_perfil, "INTERVALO_FILA", 0.01)
+
+
+def _trava(tmp_path, **kwargs):
+    return TravaPerfil(str(tmp_path / "perfil"), pasta=str(tmp_path / "travas"), **kwargs)
+
+
+def _bilhetes(trava):
+    with open(trava._arquivo_fila, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _esperar(condicao, limite=5):
+    fim = time.monotonic() + limite
+    while not condicao():
+        assert time.monotonic() < fim
+        time.sleep(0.01)
+
+
+def test_quem_chega_depois_espera_e_desiste_no_timeout(tmp_path):
+    dono = _trava(tmp_path)
+    assert dono.adquirir() < 1
+
+    with pytest.raises(TimeoutError):
+        _trava(tmp_path, timeout=0.2).adquirir()
+    # O bilhete de quem desistiu sai da fila
+    assert _bilhetes(dono) == []
+    dono.liberar()
+    assert _trava(tmp_path).adquirir() < 1
+
+
+def test_fila_de_admissao_respeita_a_ordem_de_chegada(tmp_path):
+    dono = _trava(tmp_path)
+    dono.adquirir()
+    ordem = []
+
+    def usar(nome):
+        with _trava(tmp_path) as trava:
+            ordem.append((nome, trava.espera))
+
+    primeiro = threading.Thread(target=usar, args=("primeiro",))
+    primeiro.start()
+    _esperar(lambda: len(_bilhetes(dono)) == 1)
+    segundo = threading.Thread(target=usar, args=("segundo",))
+    segundo.start()
+    _esperar(lambda: len(_bilhetes(dono)) == 2)
+
+    time.sleep(0.1)
+    dono.liberar()
+    primeiro.join(5)
+    segundo.join(5)
+
+    assert [nome for nome, _ in ordem] == ["primeiro", "segundo"]
+    assert all(espera >= 0.1 for _, espera in ordem)
+
+
+def test_bilhete_de_processo_morto_sai_da_fila(tmp_path):
+    trava = _trava(tmp_path)
+    with trava._mutex_fila:
+        trava._gravar_fila([{"id": "morto", "pid": 0, "visto": time.time() - VALIDADE_BILHETE - 1}])
+
+    assert trava.adquirir() < 1
+    assert trava.adquirida and _bilhetes(trava) == []
+    trava.liberar()
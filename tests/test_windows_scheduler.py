@@ -0,0 +1,77 @@
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from core import windows_scheduler
+from core.windows_scheduler import garantir_lancador, create_windows_task, LANCADOR
+from core.reconciliador import reconciliar, BackendFalso, PREFIXO_TAREFA
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(windows_scheduler, "get_app_base_path", lambda: Path(tmp_path))
+    return tmp_path
+
+
+def test_um_lancador_carrega_o_job_pelo_id(app):
+    caminho = garantir_lancador()
+
+    assert caminho == str(app / "scheduled_tasks" / LANCADOR)
+    with open(caminho, encoding="utf-8") as f:
+        conteudo = f.read()
+    assert "--auto --task_id %1" in conteudo and f'cd /d "{app}"' in conteudo
+    assert os.listdir(app / "scheduled_tasks") == [LANCADOR]
+
+
+def test_lancador_so_e_regravado_se_mudou(app):
+    caminho = garantir_lancador()
+    os.utime(caminho, (0, 0))
+
+    garantir_lancador()
+    assert os.path.getmtime(caminho) == 0
+
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("@echo off\n")
+    garantir_lancador()
+    with open(caminho, encoding="utf-8") as f:
+        assert "--task_id %1" in f.read()
+
+
+def test_criar_tarefa_nao_grava_arquivo_por_job(app, monkeypatch):
+    backend = BackendFalso()
+    monkeypatch.setattr("core.reconciliador.BackendSchtasks", lambda: backend)
+    amanha = datetime.now().replace(second=0, microsecond=0) + timedelta(days=1)
+
+    ok, _ = create_windows_task(42, "ZapTask_1", amanha.strftime("%H:%M:%S"), amanha.strftime("%d/%m/%Y"))
+
+    assert ok and backend.tarefas == {f"{PREFIXO_TAREFA}42": amanha}
+    assert os.listdir(app / "scheduled_tasks") == [LANCADOR]
+
+
+class BackendQueFalha(BackendFalso):
+    def criar(self, task, bat_path, quando):
+        raise Exception("Acesso negado")
+
+
+def test_arquivos_antigos_so_saem_depois_que_a_tarefa_aponta_para_o_lancador(banco, novo_job, app):
+    futuro = datetime.now().replace(second=0, microsecond=0) + timedelta(hours=2)
+    task_id = novo_job(futuro)
+    pasta = app / "scheduled_tasks"
+    pasta.mkdir()
+    for extensao in ("json", "bat"):
+        (pasta / f"task_{task_id}.{extensao}").write_text("legado")
+    tarefas = {f"{PREFIXO_TAREFA}{task_id}": futuro}
+
+    # Sem conseguir recriar, a tarefa antiga ainda chama o task_<id>.bat: os arquivos ficam
+    resultado = reconciliar(db=banco, backend=BackendQueFalha(tarefas), tarefas_por_job=True,
+                            pasta=str(pasta), logger=lambda m: None)
+    assert resultado.erros and resultado.arquivos_removidos == []
+
+    backend = BackendFalso(tarefas)
+    resultado = reconciliar(db=banco, backend=backend, tarefas_por_job=True, pasta=str(pasta),
+                            logger=lambda m: None)
+    assert resultado.criadas == [f"{PREFIXO_TAREFA}{task_id}"]
+    assert sorted(resultado.arquivos_removidos) == [f"task_{task_id}.bat", f"task_{task_id}.json"]
+    assert os.listdir(pasta) == [LANCADOR]
@@ -4,18 +4,35 @@ import os
 import sys
 import customtkinter as ctk
 import traceback
+import threading
 from datetime import datetime, timedelta
 from tkinter import filedialog, messagebox
 from tkcalendar import Calendar
 from core.db import db
-from core import automation, windows_scheduler
+from core import windows_scheduler
+from core.armazem_anexos import armazenar_lista, coletar_lixo, resolver_lista
+from core.anexos import verificar_anexos
 from core.automation import contador_execucao 
+from core.servico_agendador import BACKEND_AGENDAMENTO, ServicoAgendador, iniciar_servico_destacado
+from core.fila_envios import PedidoEnvio, PRIORIDADE_MANUAL
+from core.execucao import executar_manual
+from core.recorrencia import materializar, ocorrencias_no_periodo
+from core.importacao import importar_agendamentos
+from core.reconciliador import reconciliar
+from core.planejador import prever_novo, resumo_previsao
+from core.lease import varrer_leases_vencidos
+from core.ritmo import estado_ritmo
 import pyperclip
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PROFILE_DIR = os.path.join(BASE_DIR, "perfil_bot_whatsapp")
 THEME_FILE = os.path.join(BASE_DIR, "data", "theme_pref.txt")
 GEOMETRY_FILE = os.path.join(BASE_DIR, "data", "window_pos.txt")
+# Opções de repetição -> frequência da regra (semanal repete no dia da semana da data escolhida)
+REPETICOES = {"Não repetir": None, "Diariamente": "diaria", "Semanalmente": "semanal", "Mensalmente": "mensal"}
+FREQUENCIAS_TEXTO = {"diaria": "todo dia", "semanal": "toda semana", "mensal": "todo mês"}
+# Quanto à frente a lista de recorrências mostra as próximas ocorrências (inclusive as ainda não materializadas)
+PERIODO_RECORRENCIAS = timedelta(days=14)
 
 class App(ctk.CTk):
     def __init__(self):
@@ -37,6 +54,8 @@ class App(ctk.CTk):
 
         self.file_path = None
         self.cards_agendamentos = {}
+        self.chave_recorrencias = None
+        self.paginas_historico = 1
         self.primary_color = "#b39ddb"
         self.hover_color = "#9575cd"
 
@@ -55,11 +74,28 @@ class App(ctk.CTk):
         self.atualizar_contador_exibicao()
         self._carregar_agendamentos()
         
+        # Serviço de agendamento roda dentro da GUI enquanto ela está aberta
+        # (se houver um `app.py --servico` rodando, ele termina os envios em andamento e sai)
+        self.servico = ServicoAgendador()
+        if BACKEND_AGENDAMENTO == "servico":
+            if not self.servico.iniciar():
+                threading.Thread(target=self.servico.assumir, daemon=True).start()
+        else:
+            # Sem serviço, os jobs presos em 'running' por um --auto que caiu são liberados aqui
+            varrer_leases_vencidos()
+        # Tarefas/arquivos por job que ficaram para trás (job excluído, troca de backend...)
+        if sys.platform == "win32":
+            threading.Thread(target=self._reconciliar_agendador, daemon=True).start()
+
         self.protocol("WM_DELETE_WINDOW", self._ao_fechar)
         
         # INÍCIO DO LOOP: Atualização a cada 5 segundos
         self.after(5000, self._loop_atualizacao)
 
+    def _reconciliar_agendador(self):
+        try: reconciliar()
+        except Exception as e: print(f"Erro ao reconciliar o Agendador do Windows: {e}")
+
     def _restaurar_geometria(self):
         if os.path.exists(GEOMETRY_FILE):
             try:
@@ -77,6 +113,12 @@ class App(ctk.CTk):
                 f.write(self.geometry())
         except: pass
         self.destroy()
+        if self.servico.ativo:
+            # Termina o envio em andamento e passa os pendentes para um serviço sem interface
+            self.servico.parar(esperar=True)
+            if db.listar_pendentes():
+                try: iniciar_servico_destacado()
+                except Exception as e: print(f"Erro ao iniciar serviço de agendamento: {e}")
 
     def _carregar_tema_salvo(self):
         if os.path.exists(THEME_FILE):
@@ -122,6 +164,14 @@ class App(ctk.CTk):
                 msg_erro = "Para o modo 'Arquivo + Texto', você precisa:\n" + "\n".join(erros)
                 messagebox.showerror("Dados Insuficientes", msg_erro)
                 return False
+        if mode in ("file", "file_text"):
+            try:
+                erros = verificar_anexos(resolver_lista(file_path))
+            except Exception as e:
+                erros = [str(e)]
+            if erros:
+                messagebox.showerror("Anexos Inválidos", "Corrija os arquivos abaixo:\n\n" + "\n".join(erros))
+                return False
         return True
 
     def _loop_atualizacao(self):
@@ -129,6 +179,7 @@ class App(ctk.CTk):
         try:
             self._carregar_agendamentos()
             self.atualizar_contador_exibicao()
+            self._atualizar_status_servico()
         except Exception as e:
             print(f"Erro no loop: {e}")
         finally:
@@ -151,7 +202,7 @@ class App(ctk.CTk):
         self.theme_btn.pack(side="right", padx=15)
 
         ctk.CTkLabel(tab, text="Contato / Número:", font=("Roboto", 12)).pack(anchor="w", padx=15, pady=(5, 0))
-        self.target_input = ctk.CTkEntry(tab, placeholder_text="Ex: 5511999999999", height=35)
+        self.target_input = ctk.CTkEntry(tab, placeholder_text="Ex: 5511999999999 (vários: separe com ;)", height=35)
         self.target_input.pack(fill="x", padx=10, pady=5)
 
         self.mode_select = ctk.CTkOptionMenu(tab, values=["Somente texto", "Somente arquivo", "Arquivo + texto"], 
@@ -186,6 +237,11 @@ class App(ctk.CTk):
         self.time_input.bind("<KeyRelease>", self._aplicar_mascara_hora)
         self._reset_time()
 
+        self.repeat_select = ctk.CTkOptionMenu(dt_frame, values=list(REPETICOES), width=140,
+                                               fg_color=self.primary_color, button_color=self.primary_color,
+                                               button_hover_color=self.hover_color)
+        self.repeat_select.pack(side="left", padx=(10, 0))
+
         actions_frame = ctk.CTkFrame(tab, fg_color="transparent")
         actions_frame.pack(fill="x", padx=10, pady=10)
         ctk.CTkButton(actions_frame, text="Enviar Agora", height=45, fg_color=self.primary_color, hover_color=self.hover_color, command=self._send_now).pack(side="left", expand=True, padx=5)
@@ -221,19 +277,101 @@ class App(ctk.CTk):
         self._on_mode_change("Somente texto")
         self._reset_time()
         self.date_button.configure(text=datetime.now().strftime("%d/%m/%Y"))
+        self.repeat_select.set("Não repetir")
 
     def atualizar_contador_exibicao(self):
         try: self.count_label.configure(text=f"🚀 Execuções: {contador_execucao(False)}")
         except: pass
 
+    def _atualizar_status_servico(self):
+        """Linha de estado do serviço de agendamento (só quando ele roda nesta janela)."""
+        if not self.servico.ativo:
+            self.status_servico_label.configure(text="")
+            return
+        partes = []
+        # Espera na fila de envios por classe de prioridade (manual fura os agendados)
+        partes.append("Fila: " + " · ".join(
+            f"{classe} {e['na_fila']} aguardando, espera média {e['espera_media_s']:.1f}s (máx {e['espera_max_s']:.0f}s)"
+            for classe, e in self.servico.estatisticas_fila().items()))
+        leases = self.servico.metricas_leases()
+        partes.append(f"Leases vencidos: {leases['vencidos']} · recuperados: {leases['recuperados']}")
+        # Taxa atual (AIMD) e espera média pelo token, por conta que já enviou nesta janela
+        for estado in estado_ritmo().values():
+            partes.append("Ritmo: " + " · ".join(
+                f"{tipo} {e['por_minuto']:.1f}/min (espera {e['espera_media_s']:.1f}s)" for tipo, e in estado.items()))
+        self.status_servico_label.configure(text="  |  ".join(partes))
+
     def _setup_gestao_tab(self):
         tab = self.tabview.tab("Meus Agendamentos")
+        ctk.CTkButton(tab, text="📥 Importar CSV/JSONL", height=32, fg_color=self.primary_color,
+                      hover_color=self.hover_color, command=self._importar_arquivo).pack(anchor="e", padx=10, pady=(10, 0))
+        self.status_servico_label = ctk.CTkLabel(tab, text="", font=("Roboto", 10), text_color="gray",
+                                                 justify="left", anchor="w")
+        self.status_servico_label.pack(fill="x", padx=10)
+        # Regras recorrentes ativas, com as próximas ocorrências e o botão para parar cada uma
+        self.recorrencias_frame = ctk.CTkFrame(tab, border_width=1)
         self.scrollable_frame = ctk.CTkScrollableFrame(tab, label_text="Histórico")
         self.scrollable_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        self.btn_mais_historico = ctk.CTkButton(self.scrollable_frame, text="Carregar mais", height=28,
+                                                fg_color=self.primary_color, hover_color=self.hover_color,
+                                                command=self._carregar_mais_historico)
+
+    def _carregar_recorrencias(self):
+        """Atualiza a lista de regras recorrentes (só refaz os widgets se algo mudou)."""
+        regras = db.listar_recorrencias()
+        agora = datetime.now()
+        chave = (tuple((r['id'], r['materializado_ate']) for r in regras), agora.strftime("%Y%m%d%H"))
+        if chave == self.chave_recorrencias: return
+        self.chave_recorrencias = chave
+
+        for filho in self.recorrencias_frame.winfo_children(): filho.destroy()
+        if not regras:
+            self.recorrencias_frame.pack_forget()
+            return
+        self.recorrencias_frame.pack(fill="x", padx=10, pady=(10, 0), after=self.status_servico_label)
+        ctk.CTkLabel(self.recorrencias_frame, text="🔁 Recorrências", font=("Roboto", 12, "bold")).pack(anchor="w", padx=10, pady=(5, 0))
+
+        proximas = {}
+        for momento, rec in ocorrencias_no_periodo(regras, agora, agora + PERIODO_RECORRENCIAS):
+            proximas.setdefault(rec['id'], []).append(momento)
+        for rec in regras:
+            linha = ctk.CTkFrame(self.recorrencias_frame, fg_color="transparent")
+            linha.pack(fill="x", padx=10, pady=2)
+            info = ctk.CTkFrame(linha, fg_color="transparent")
+            info.pack(side="left", fill="x", expand=True)
+            ctk.CTkLabel(info, text=f"📱 {rec['target']} · {FREQUENCIAS_TEXTO.get(rec['frequencia'], rec['frequencia'])} às {rec['hora']}",
+                         font=("Roboto", 11, "bold")).pack(anchor="w")
+            momentos = proximas.get(rec['id'], [])
+            texto = ", ".join(m.strftime("%d/%m %H:%M") for m in momentos[:4]) + (" ..." if len(momentos) > 4 else "")
+            ctk.CTkLabel(info, text=f"Próximas: {texto}" if momentos else f"Nenhuma nos próximos {PERIODO_RECORRENCIAS.days} dias",
+                         font=("Roboto", 10), text_color="gray").pack(anchor="w")
+            ctk.CTkButton(linha, text="⏹ Parar", width=70, fg_color="#FF5252", hover_color="#ff1744",
+                          command=lambda r=rec: self._parar_recorrencia(r)).pack(side="right")
+
+    def _parar_recorrencia(self, rec):
+        if not messagebox.askyesno("Parar repetição", f"Parar a repetição para {rec['target']}?\n"
+                                   "As próximas ocorrências já agendadas também serão removidas."):
+            return
+        try:
+            db.desativar_recorrencia(rec['id'])
+            self.servico.notificar()
+            self._carregar_agendamentos()
+            coletar_lixo(db.listar_anexos_ativos())
+        except Exception as e: messagebox.showerror("Erro", str(e))
+
+    def _carregar_mais_historico(self):
+        self.paginas_historico += 1
+        self._carregar_agendamentos()
 
     def _carregar_agendamentos(self):
         """Atualiza a lista de cards de forma inteligente sem 'piscar' a tela."""
-        agendamentos = db.listar_todos()
+        self._carregar_recorrencias()
+        # Só as páginas já abertas do histórico (as mais recentes), não a tabela inteira
+        agendamentos, cursor = [], None
+        for _ in range(self.paginas_historico):
+            pagina, cursor = db.listar_pagina(apos=cursor)
+            agendamentos += pagina
+            if cursor is None: break
         ids_atuais = [row[0] for row in agendamentos]
         
         # 1. Remover cards que não estão mais no banco
@@ -242,7 +380,8 @@ class App(ctk.CTk):
                 self.cards_agendamentos[t_id]['frame'].destroy()
                 del self.cards_agendamentos[t_id]
         
-        status_colors = {"pending": "#808080", "running": "#2196F3", "completed": "#4CAF50", "failed": "#F44336"}
+        status_colors = {"pending": "#808080", "running": "#2196F3", "completed": "#4CAF50", "failed": "#F44336",
+                         "dead_letter": "#8E24AA", "missed": "#FF9800"}
 
         for row in agendamentos:
             t_id, _, target, _, sched_time, status = row[0], row[1], row[2], row[3], row[4], row[5]
@@ -309,6 +448,10 @@ class App(ctk.CTk):
                     'btn_del': b_del
                 }
 
+        # Botão sempre depois do último card
+        self.btn_mais_historico.pack_forget()
+        if cursor is not None: self.btn_mais_historico.pack(pady=5)
+
     def _abrir_edicao(self, row):
         task_data = db.obter_por_id(row[0])
         if not task_data: return
@@ -382,19 +525,20 @@ class App(ctk.CTk):
                 t_val = target_ent.get().strip()
                 m_val = rev_map.get(mode_edit_select.get())
                 msg_val = msg_txt.get("1.0", "end-1c").strip()
-                f_val = self.temp_edit_file
+                f_val = self.temp_edit_file if m_val != "text" else None
                 h_val = time_ent_edit.get().strip()
                 if not self._validar_campos(t_val, m_val, msg_val, f_val): return
                 if len(h_val) != 5: return messagebox.showerror("Erro", "Hora incompleta. Use HH:MM")
                 nova_dt = datetime.strptime(f"{btn_date_edit.cget('text')} {h_val}", "%d/%m/%Y %H:%M")
                 if nova_dt < datetime.now(): return messagebox.showerror("Erro", "O horário deve ser no futuro.")
 
-                windows_scheduler.delete_windows_task(task_data['id'])
+                f_val = armazenar_lista(f_val)
+                if BACKEND_AGENDAMENTO == "windows":
+                    windows_scheduler.delete_windows_task(task_data['id'])
                 db.atualizar_agendamento_completo(task_data['id'], t_val, m_val, msg_val, f_val, nova_dt)
+                coletar_lixo(db.listar_anexos_ativos())
                 
-                json_cfg = {"target": t_val, "mode": m_val, "message": msg_val, "file_path": f_val}
-                windows_scheduler.create_task_bat(task_data['id'], task_data['task_name'], json_cfg)
-                windows_scheduler.create_windows_task(task_data['id'], task_data['task_name'], h_val, btn_date_edit.cget('text'))
+                self._registrar_no_agendador(task_data['id'], task_data['task_name'], h_val, btn_date_edit.cget('text'))
 
                 messagebox.showinfo("Sucesso", "Atualizado!"); edit_win.destroy(); self._carregar_agendamentos()
             except Exception as e: messagebox.showerror("Erro", str(e))
@@ -404,23 +548,78 @@ class App(ctk.CTk):
     def _excluir_agendamento(self, row):
         if messagebox.askyesno("Excluir", f"Remover {row[2]}?"):
             try:
-                windows_scheduler.delete_windows_task(row[0])
+                task_data = db.obter_por_id(row[0])
+                # Ocorrência de uma regra: excluir só esta não impede as próximas
+                if task_data and task_data.get('recorrencia_id') and messagebox.askyesno(
+                        "Repetição", "Este envio se repete. Parar também as próximas ocorrências?"):
+                    db.desativar_recorrencia(task_data['recorrencia_id'])
+                if BACKEND_AGENDAMENTO == "windows":
+                    windows_scheduler.delete_windows_task(row[0])
                 db.deletar(row[0]); self._carregar_agendamentos()
+                self.servico.notificar()
+                coletar_lixo(db.listar_anexos_ativos())
             except Exception as e: messagebox.showerror("Erro", str(e))
 
+    def _registrar_no_agendador(self, t_id, task_name, hora, data):
+        """Entrega o job ao backend de agendamento (os dados ficam só no banco). Retorna (ok, mensagem)."""
+        if BACKEND_AGENDAMENTO == "windows":
+            return windows_scheduler.create_windows_task(t_id, task_name, hora, data)
+        self.servico.notificar()
+        # No Windows, uma única tarefa de logon garante o serviço depois de reiniciar o PC
+        if sys.platform == "win32":
+            return windows_scheduler.garantir_tarefa_servico()
+        return True, "Agendamento criado com sucesso!"
+
     def _get_mode_key(self):
         m = {"Somente texto": "text", "Somente arquivo": "file", "Arquivo + texto": "file_text"}
         return m.get(self.mode_select.get(), "text")
 
+    def _destinos(self):
+        """Contatos do campo de destino, separados por ';' (vários = um job por contato)."""
+        vistos = []
+        for d in self.target_input.get().split(";"):
+            d = d.strip()
+            if d and d.lower() not in (v.lower() for v in vistos): vistos.append(d)
+        return vistos
+
     def _send_now(self):
         target = self.target_input.get().strip()
         message = self.message_input.get("1.0", "end-1c").strip()
         mode = self._get_mode_key()
         if not self._validar_campos(target, mode, message, self.file_path): return
-        try:
-            automation.executar_envio(userdir=PROFILE_DIR, target=target, mode=mode, message=message, file_path=self.file_path, modo_execucao='manual')
-            contador_execucao(True); self.atualizar_contador_exibicao(); messagebox.showinfo("Sucesso", "Enviado"); self._reset_fields()
-        except Exception as e: messagebox.showerror("Erro", str(e))
+        destinos = self._destinos()
+        if len(destinos) > 1:
+            # Vários contatos viram jobs vencidos: a sessão do serviço faz um upload e encaminha aos demais
+            if not self.servico.ativo:
+                return messagebox.showerror("Erro", "Enviar para vários contatos precisa do serviço de agendamento.")
+            file_ref = armazenar_lista(self.file_path) if mode != "text" else None
+            nome = f"ZapTask_{int(datetime.now().timestamp())}"
+            agora = datetime.now()
+            for i, destino in enumerate(destinos):
+                db.adicionar(task_name=f"{nome}_{i}", target=destino, mode=mode, message=message, file_path=file_ref, scheduled_time=agora)
+            self.servico.notificar()
+            messagebox.showinfo("Enviando", f"Envio para {len(destinos)} contatos entrou na fila.")
+            self._carregar_agendamentos(); self._reset_fields()
+            return
+        if self.servico.ativo:
+            # Passa pela fila do serviço: fura os agendados e usa a sessão do Chrome se houver uma aberta
+            pedido = self.servico.enviar_agora(target, mode, message, self.file_path)
+            self._reset_fields()
+            return self._acompanhar_envio(pedido)
+        # Sem serviço (backend "windows" ou ainda assumindo do serviço sem interface):
+        # envia numa thread à parte para a janela não travar esperando o perfil do Chrome
+        dados = {'target': target, 'mode': mode, 'message': message, 'file_path': self.file_path}
+        pedido = PedidoEnvio('manual', dados, PRIORIDADE_MANUAL)
+        threading.Thread(target=executar_manual, args=(pedido,), daemon=True).start()
+        self._reset_fields()
+        self._acompanhar_envio(pedido)
+
+    def _acompanhar_envio(self, pedido):
+        """Confere o envio manual a cada 500 ms sem travar a janela."""
+        if not pedido.concluido:
+            return self.after(500, lambda: self._acompanhar_envio(pedido))
+        if pedido.erro: messagebox.showerror("Erro", str(pedido.erro))
+        else: self.atualizar_contador_exibicao(); messagebox.showinfo("Sucesso", f"Enviado (aguardou {pedido.espera or 0:.0f}s na fila)")
 
     def _schedule_task(self):
         target = self.target_input.get().strip()
@@ -433,15 +632,64 @@ class App(ctk.CTk):
             dt = datetime.strptime(f"{d} {t}", "%d/%m/%Y %H:%M")
             if dt < datetime.now(): return messagebox.showerror("Erro", "O horário deve ser no futuro.")
             task_name = f"ZapTask_{int(datetime.now().timestamp())}"
-            t_id = db.adicionar(task_name=task_name, target=target, mode=mode, message=message, file_path=self.file_path, scheduled_time=dt)
+            # Copia os anexos para o armazém agora: mover/editar o original depois não afeta o envio
+            file_ref = armazenar_lista(self.file_path) if mode != "text" else None
+            destinos = self._destinos()
+            if len(destinos) > 1 and BACKEND_AGENDAMENTO == "windows":
+                return messagebox.showerror("Erro", "Agendar para vários contatos precisa do serviço de agendamento.")
+            frequencia = REPETICOES.get(self.repeat_select.get())
+            if frequencia:
+                return self._agendar_recorrente(task_name, destinos, mode, message, file_ref, frequencia, dt)
+            # Previsão de quando o job sai de fato, com a fila atual do perfil
+            previsao = ""
+            try:
+                novo, afetados = prever_novo(dt, mode, file_ref, destinos[0])
+                previsao = resumo_previsao(novo, afetados)
+                if (novo['atrasado'] or afetados) and not messagebox.askyesno(
+                        "Capacidade", f"{previsao}\n\nAgendar mesmo assim?"): return
+            except Exception as e: print(f"Erro no planejador de capacidade: {e}")
+            if len(destinos) > 1:
+                # Um job por contato, mesmo conteúdo e horário: saem juntos pelo fan-out da sessão
+                for i, destino in enumerate(destinos):
+                    t_id = db.adicionar(task_name=f"{task_name}_{i}", target=destino, mode=mode, message=message, file_path=file_ref, scheduled_time=dt)
+            else:
+                t_id = db.adicionar(task_name=task_name, target=target, mode=mode, message=message, file_path=file_ref, scheduled_time=dt)
             if t_id:
-                json_cfg = {"target": target, "mode": mode, "message": message, "file_path": self.file_path}
-                windows_scheduler.create_task_bat(t_id, task_name, json_cfg)
-                suc, msg = windows_scheduler.create_windows_task(t_id, task_name, t, d)
-                if suc: messagebox.showinfo("Agendado", "Tarefa criada!"); self._carregar_agendamentos(); self._reset_fields()
+                suc, msg = self._registrar_no_agendador(t_id, task_name, t, d)
+                if suc: messagebox.showinfo("Agendado", f"Tarefa criada!\n\n{previsao}".strip()); self._carregar_agendamentos(); self._reset_fields()
                 else: messagebox.showerror("Erro", msg)
         except Exception as e: messagebox.showerror("Erro", str(e))
 
+    def _importar_arquivo(self):
+        caminho = filedialog.askopenfilename(filetypes=[("CSV ou JSONL", "*.csv *.jsonl *.ndjson"), ("Todos", "*.*")])
+        if not caminho: return
+        if BACKEND_AGENDAMENTO == "windows":
+            return messagebox.showerror("Erro", "A importação em lote precisa do serviço de agendamento.")
+        try:
+            resultado = importar_agendamentos(caminho)
+        except Exception as e: return messagebox.showerror("Erro", str(e))
+        # Uma única sincronização com o agendador para o lote inteiro
+        if resultado.importados: self._registrar_no_agendador(None, None, None, None)
+        self._carregar_agendamentos()
+        texto = resultado.resumo()
+        if resultado.erros:
+            texto += "\n\n" + "\n".join(f"Linha {n}: {e}" for n, e in resultado.erros[:15])
+            if len(resultado.erros) > 15: texto += f"\n... e mais {len(resultado.erros) - 15}"
+            messagebox.showwarning("Importação", texto)
+        else: messagebox.showinfo("Importação", texto)
+
+    def _agendar_recorrente(self, nome, destinos, mode, message, file_ref, frequencia, dt):
+        """Grava uma regra recorrente por contato: só as ocorrências dos próximos dias viram agendamentos."""
+        if BACKEND_AGENDAMENTO == "windows":
+            return messagebox.showerror("Erro", "Agendamentos recorrentes precisam do serviço de agendamento.")
+        regra = {"frequencia": frequencia, "hora": dt.strftime("%H:%M"), "inicio": dt.date()}
+        for destino in destinos:
+            db.adicionar_recorrencia(nome, destino, mode, regra, message=message, file_path=file_ref)
+        materializar(db)
+        suc, msg = self._registrar_no_agendador(None, nome, None, None)
+        if suc: messagebox.showinfo("Agendado", "Agendamento recorrente criado!"); self._carregar_agendamentos(); self._reset_fields()
+        else: messagebox.showerror("Erro", msg)
+
     def _abrir_calendario_custom(self, target_btn):
         top = ctk.CTkToplevel(self)
         top.title("Data")